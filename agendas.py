@@ -0,0 +1,87 @@
+""" Meeting agenda points are addressed by a stable `_id`.
+
+    Single points are added, changed and removed with `$push`, positional `$set`
+    and `$pull`. A batch of edits is applied to the current agenda here and
+    written back in one update that only matches the meeting version it was read
+    at. Points saved before they had ids get them from `backfill` after startup.
+"""
+from bson import ObjectId
+from pymongo import UpdateOne
+
+import versions
+from metrics import metrics
+
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def new_point(text: str, level: int) -> dict:
+    return {"_id": ObjectId(), "text": text, "level": level}
+
+
+def _index(agenda: list[dict], point_id) -> int:
+    for i, point in enumerate(agenda):
+        if str(point.get("_id")) == str(point_id):
+            return i
+    raise KeyError(point_id)
+
+
+def apply_ops(agenda: list[dict], ops: list[dict]) -> list[dict]:
+    """ Returns the agenda after applying insert/update/move/delete ops in order.
+        Positions are indexes into the agenda at the time of the op, a missing
+        position appends. Raises KeyError for points that don't exist.
+    """
+    agenda = list(agenda)
+    for op in ops:
+        kind, position = op["op"], op.get("position")
+        if position is None:
+            position = len(agenda)
+        if kind == "insert":
+            agenda.insert(position, new_point(op["text"], op["level"]))
+        elif kind == "update":
+            i = _index(agenda, op["id"])
+            agenda[i] = {
+                **agenda[i],
+                **{k: op[k] for k in ["text", "level"] if op.get(k) is not None},
+            }
+        elif kind == "move":
+            agenda.insert(position, agenda.pop(_index(agenda, op["id"])))
+        elif kind == "delete":
+            agenda.pop(_index(agenda, op["id"]))
+    return agenda
+
+
+def with_ids(agenda: list[dict]) -> list[dict]:
+    """Keeps the ids points have, gives new ones to the others."""
+    return [{**point, "_id": ObjectId(point["_id"]) if point.get("_id") else ObjectId()} for point in agenda]
+
+
+async def _backfill_batch(meetings) -> int:
+    documents = await meetings.find(
+        {"agenda": {"$elemMatch": {"_id": {"$exists": False}}}}, {"agenda": 1}
+    ).limit(BACKFILL_BATCH_SIZE).to_list(BACKFILL_BATCH_SIZE)
+    if not documents:
+        return 0
+
+    # Matching the old agenda leaves meetings edited in between for the next batch
+    await meetings.bulk_write(
+        [
+            UpdateOne(
+                {"_id": document["_id"], "agenda": document["agenda"]},
+                versions.bump({"$set": {"agenda": with_ids(document["agenda"])}}),
+            )
+            for document in documents
+        ],
+        ordered=False,
+    )
+    return len(documents)
+
+
+async def backfill(db):
+    """Gives ids to all agenda points that don't have one yet."""
+    converted = 0
+    while count := await _backfill_batch(db.meetings):
+        converted += count
+        metrics.incr("agendas.backfilled", count)
+    if converted:
+        print(f"Added agenda point ids to {converted} meetings")
@@ -1,15 +1,16 @@
 import os
 import time
-from typing import Type
+import hashlib
+from collections import OrderedDict
 
 import jwt
-import bcrypt
 from dotenv import load_dotenv
 from fastapi import Request, HTTPException
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
 import models
 import schemas
+from metrics import metrics
 
 
 load_dotenv()
@@ -20,6 +21,44 @@ JWT_VALID_TIME_PWD_RESET = int(os.environ["JWT_VALID_TIME_PWD_RESET"])
 JWT_VALID_TIME_ACTIVATE_ACCOUNT = int(os.environ["JWT_VALID_TIME_ACTIVATE_ACCOUNT"])
 JWT_SECRET = os.environ["JWT_SECRET"]
 JWT_ALGORITHM = os.environ["JWT_ALGORITHM"]
+JWT_CACHE_SIZE = int(os.environ.get("JWT_CACHE_SIZE", 10000))
+
+
+class VerifiedTokenCache:
+    """ LRU cache of tokens that already passed signature verification.
+        Entries are keyed by the token digest and dropped once the token expires.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.entries: OrderedDict[bytes, tuple[float, schemas.AuthSchema]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> schemas.AuthSchema | None:
+        key = hashlib.sha256(token.encode("utf-8")).digest()
+        entry = self.entries.get(key)
+        if entry is None or entry[0] < time.time():
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            metrics.incr("token_cache.misses")
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        metrics.incr("token_cache.hits")
+        return entry[1]
+
+    def put(self, token: str, expires: float, decoded: schemas.AuthSchema):
+        key = hashlib.sha256(token.encode("utf-8")).digest()
+        self.entries[key] = (expires, decoded)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+        metrics.gauge("token_cache.size", len(self.entries))
+
+
+token_cache = VerifiedTokenCache(JWT_CACHE_SIZE)
 
 
 class JWTBearer(HTTPBearer):
@@ -62,14 +101,18 @@ def createToken(id: str, valid_time: int, is_access_token: bool):
     return token
 
 
-def decodeJWT(token: str) -> Type[schemas.AuthSchema] | None:
+def decodeJWT(token: str) -> schemas.AuthSchema | None:
+    if (cached := token_cache.get(token)) is not None:
+        return cached
     try:
         decoded_token = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
         if decoded_token["expires"] < time.time():
             return None
-        ret = schemas.AuthSchema
-        ret.id = decoded_token["id"]
-        ret.is_access_token = decoded_token["is_access_token"]
+        ret = schemas.AuthSchema(
+            id=decoded_token["id"],
+            is_access_token=decoded_token["is_access_token"],
+        )
+        token_cache.put(token, decoded_token["expires"], ret)
         return ret
     except:
         return None
@@ -90,7 +133,7 @@ def generateToken(account: schemas.AccountOut):
     return reponse
 
 
-def generate_refresh_token(old_token: str, decoded_token: Type[schemas.AuthSchema]):
+def generate_refresh_token(old_token: str, decoded_token: schemas.AuthSchema):
     reponse = schemas.TokenSchema
     reponse.access_token = createToken(
         id=decoded_token.id,
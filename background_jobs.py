@@ -0,0 +1,56 @@
+import time
+import asyncio
+import contextvars
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+from metrics import metrics
+
+
+class DebouncedJobs:
+    """ Fire-and-forget jobs keyed by e.g. a user id.
+        A job for a key is skipped while another one for the same key is running
+        or if one was started less than `interval` seconds ago.
+    """
+
+    def __init__(self, name: str, interval: float):
+        self.name = name
+        self.interval = interval
+        self.tasks: set[asyncio.Task] = set()
+        self.running: set[str] = set()
+        self.last_started: OrderedDict[str, float] = OrderedDict()
+
+    def submit(self, key: str, job: Callable[[], Awaitable]) -> bool:
+        """Schedules `job()` on the running loop, returns False if it was debounced."""
+        now = time.monotonic()
+        self._prune(now)
+        if key in self.running or key in self.last_started:
+            metrics.incr(f"{self.name}.debounced")
+            return False
+
+        self.running.add(key)
+        self.last_started[key] = now
+        # A fresh context so the job is not attributed to the request that started it
+        task = asyncio.create_task(self._run(key, job), context=contextvars.Context())
+        # The loop only keeps weak references to tasks
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return True
+
+    async def _run(self, key: str, job: Callable[[], Awaitable]):
+        try:
+            with metrics.timer(self.name):
+                await job()
+        except Exception as e:
+            metrics.incr(f"{self.name}.failed")
+            print(f"{self.name} failed for {key}: {e}")
+        finally:
+            self.running.discard(key)
+
+    def _prune(self, now: float):
+        # Keys are ordered by start time, so expired ones are at the front
+        while self.last_started:
+            key, started = next(iter(self.last_started.items()))
+            if now - started < self.interval:
+                break
+            self.last_started.popitem(last=False)
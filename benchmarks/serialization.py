@@ -0,0 +1,119 @@
+""" Compares FastAPI's default response serialization with FastJSONResponse.
+
+    python benchmarks/serialization.py
+"""
+import sys
+import json
+import time
+import asyncio
+from pathlib import Path
+
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import models
+import schemas
+from fast_json import FastJSONResponse
+
+
+ROUNDS = 20
+
+
+def group_document(chat_size: int) -> dict:
+    users = [{"_id": str(ObjectId()), "username": f"user{i}"} for i in range(50)]
+    messages = [{"user_id": u["_id"], "text": "hello " * 20} for u in users] * (chat_size // 8000)
+    return {
+        "_id": ObjectId(),
+        "admin": users[0],
+        "name": "group",
+        "description": "description",
+        "users": users,
+        "meetings": [
+            {"_id": str(ObjectId()), "title": f"meeting {i}", "start": "2024-01-01T12:00:00", "length": 60}
+            for i in range(100)
+        ],
+        "chat_messages": json.dumps(messages),
+    }
+
+
+def meeting_documents(count: int) -> list[dict]:
+    return [
+        {
+            "_id": ObjectId(),
+            "group_id": ObjectId(),
+            "admin_id": ObjectId(),
+            "title": f"meeting {i}",
+            "start": "2024-01-01T12:00:00",
+            "length": 60,
+            "time_slot_id": ObjectId(),
+            "description": "description",
+            "participants": [
+                {"user_id": str(ObjectId()), "username": f"user{j}", "status": "accepted"}
+                for j in range(10)
+            ],
+            "agenda": [{"text": "point", "level": 0}] * 5,
+        }
+        for i in range(count)
+    ]
+
+
+async def default_path(model, content) -> bytes:
+    """What FastAPI does for a handler returning `content` with response_model=model."""
+    field = create_response_field(name="response", type_=model, mode="serialization")
+    if isinstance(content, dict):
+        content = dict(content)
+    serialized = await serialize_response(field=field, response_content=content, by_alias=False)
+    return JSONResponse(serialized).body
+
+
+async def fast_path(model, content) -> bytes:
+    if isinstance(content, dict):
+        content = model.model_validate(content)
+    return FastJSONResponse(content).body
+
+
+async def measure(path, model, make_content) -> float:
+    best = float("inf")
+    for _ in range(ROUNDS):
+        content = make_content()
+        start = time.perf_counter()
+        await path(model, content)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+async def main():
+    group = group_document(chat_size=4_000_000)
+    meetings = meeting_documents(1000)
+    users = [
+        {"_id": ObjectId(), "username": f"user{i}", "email": f"user{i}@mail.com", "password": "x" * 60}
+        for i in range(1000)
+    ]
+    cases = [
+        ("GET /groups/{id} (4 MB chat)", models.GroupModel, lambda: group),
+        (
+            "GET /meetings/all?limit=1000",
+            schemas.MeetingCollection,
+            lambda: schemas.MeetingCollection(meetings=meetings, next_cursor=None),
+        ),
+        (
+            "GET /users?limit=1000",
+            models.UserCollection,
+            lambda: models.UserCollection(users=users, next_cursor=None),
+        ),
+    ]
+    for name, model, make_content in cases:
+        assert json.loads(await default_path(model, make_content())) == json.loads(
+            await fast_path(model, make_content())
+        )
+        default = await measure(default_path, model, make_content)
+        fast = await measure(fast_path, model, make_content)
+        print(f"{name:32} default {1000 * default:8.2f} ms   fast {1000 * fast:8.2f} ms   x{default / fast:.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
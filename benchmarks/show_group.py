@@ -0,0 +1,68 @@
+""" GET /groups/{id} latency and database reads against group size.
+
+    Runs against a live API with DEBUG_DB_STATS=1:
+        python benchmarks/show_group.py [base_url]
+"""
+import sys
+import time
+import datetime
+import statistics
+
+import requests
+
+
+BASE_URL = sys.argv[1] if len(sys.argv) > 1 else "http://localhost:8000"
+GROUP_SIZES = [1, 10, 50, 300]
+MEETINGS = 20
+ROUNDS = 5
+
+
+def call(method, uri, token=None, **kwargs):
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    resp = requests.request(method, BASE_URL + uri, headers=headers, **kwargs)
+    resp.raise_for_status()
+    return resp
+
+
+def create_user(i):
+    body = {"username": f"bench{i}", "email": f"bench{i}@mail.com", "password": "password"}
+    requests.post(BASE_URL + "/register", json=body)
+    token = call("POST", "/login", json=body).json()["access_token"]
+    return call("GET", "/me", token).json()["id"], token
+
+
+def main():
+    users = [create_user(i) for i in range(max(GROUP_SIZES))]
+    admin_token = users[0][1]
+
+    print(f"{'members':>8} {'p50 ms':>8} {'max ms':>8} {'reads':>6}")
+    for size in GROUP_SIZES:
+        group = call("POST", "/groups", admin_token, json={"name": "bench", "description": "bench"}).json()
+        for _, token in users[1:size]:
+            call("POST", f"/groups/{group['id']}/join", token)
+
+        for _ in range(MEETINGS):
+            body = {
+                "group_id": group["id"],
+                "title": "bench",
+                "start": (datetime.datetime.now(datetime.UTC) + datetime.timedelta(days=1)).isoformat(),
+                "description": "bench",
+            }
+            call("POST", "/meetings", admin_token, json=body)
+
+        latencies = []
+        for _ in range(ROUNDS):
+            start = time.perf_counter()
+            resp = call("GET", f"/groups/{group['id']}?chat=false", admin_token)
+            latencies.append(time.perf_counter() - start)
+        reads = resp.headers.get("x-db-reads", "?")
+        print(f"{size:>8} {1000 * statistics.median(latencies):>8.1f} {1000 * max(latencies):>8.1f} {reads:>6}")
+
+        call("DELETE", f"/groups/{group['id']}", admin_token)
+
+    for user_id, token in users:
+        call("DELETE", f"/users/{user_id}", token)
+
+
+if __name__ == "__main__":
+    main()
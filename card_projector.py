@@ -0,0 +1,181 @@
+""" Keeps denormalized cards in sync with the documents they copy.
+
+    Groups embed meeting cards (`group.meetings`) and user cards (`group.users`,
+    `group.admin`), meetings embed participant names and users embed group cards
+    (`user.groups`). Write handlers only update the source document, this
+    projector follows the MongoDB change stream and rewrites the copies after the
+    write committed. Change streams need a replica set, a single node one is enough.
+
+    Every handler sets the copies to the current values of the source document, so
+    applying an event twice or out of order converges to the same state. The resume
+    token is saved after each event, after a restart the projector replays from there.
+
+    Membership itself (creating a meeting, joining or leaving a group) is still
+    written by the handlers, only the copied fields are projected.
+"""
+import os
+import asyncio
+import datetime
+
+from bson import ObjectId
+from dotenv import load_dotenv
+from pymongo.errors import OperationFailure, PyMongoError
+
+import meeting_times
+import versions
+from metrics import metrics
+
+
+load_dotenv()
+
+CARD_PROJECTOR_RETRY_INTERVAL = int(os.environ.get("CARD_PROJECTOR_RETRY_INTERVAL", 5))
+
+# Source collection -> fields copied into cards
+CARD_FIELDS = {
+    "meetings": ["title", "start", "length"],
+    "users": ["username"],
+    "groups": ["name"],
+}
+
+STATE_ID = "card_projector"
+CHANGE_STREAM_HISTORY_LOST = 286
+
+
+def _any_id(value) -> dict:
+    return {"$in": [str(value), ObjectId(value)]}
+
+
+def pipeline() -> list[dict]:
+    """Only updates that touch a copied field reach the projector."""
+    matches = []
+    for collection, fields in CARD_FIELDS.items():
+        matches.append({"ns.coll": collection, "operationType": "replace"})
+        matches.append(
+            {
+                "ns.coll": collection,
+                "operationType": "update",
+                "$or": [{f"updateDescription.updatedFields.{f}": {"$exists": True}} for f in fields],
+            }
+        )
+    return [{"$match": {"$or": matches}}]
+
+
+async def project_meeting(db, meeting: dict):
+    card_id = _any_id(meeting["_id"])
+    await db.groups.update_many(
+        {"meetings._id": card_id},
+        versions.bump(
+            {
+                "$set": {
+                    "meetings.$[card].title": meeting["title"],
+                    # Group cards keep the ISO string
+                    "meetings.$[card].start": meeting_times.to_utc(meeting["start"]).isoformat(),
+                    "meetings.$[card].length": meeting["length"],
+                }
+            }
+        ),
+        array_filters=[{"card._id": card_id}],
+    )
+
+
+async def project_user(db, user: dict):
+    user_id = _any_id(user["_id"])
+    await db.groups.update_many(
+        {"users._id": user_id},
+        versions.bump({"$set": {"users.$[card].username": user["username"]}}),
+        array_filters=[{"card._id": user_id}],
+    )
+    await db.groups.update_many(
+        {"admin._id": user_id}, versions.bump({"$set": {"admin.username": user["username"]}})
+    )
+    await db.meetings.update_many(
+        {"participants.user_id": user_id},
+        versions.bump({"$set": {"participants.$[participant].username": user["username"]}}),
+        array_filters=[{"participant.user_id": user_id}],
+    )
+
+
+async def project_group(db, group: dict):
+    group_id = _any_id(group["_id"])
+    await db.users.update_many(
+        {"groups._id": group_id},
+        {"$set": {"groups.$[card].name": group["name"]}},
+        array_filters=[{"card._id": group_id}],
+    )
+
+
+PROJECTIONS = {
+    "meetings": project_meeting,
+    "users": project_user,
+    "groups": project_group,
+}
+
+
+async def apply(db, event: dict):
+    document = event.get("fullDocument")
+    if document is None:
+        # Deleted before the update was looked up, nothing left to copy
+        return
+    await PROJECTIONS[event["ns"]["coll"]](db, document)
+
+
+def lag(event: dict, now: datetime.datetime | None = None) -> float:
+    """Seconds between the write and its projection."""
+    now = now or datetime.datetime.now(datetime.UTC)
+    # wallTime has millisecond precision but is only sent by MongoDB 6.0+
+    written = event.get("wallTime") or event["clusterTime"].as_datetime()
+    return (now - meeting_times.to_utc(written)).total_seconds()
+
+
+async def load_resume_token(db):
+    state = await db.projector_state.find_one({"_id": STATE_ID})
+    return state and state.get("resume_token")
+
+
+async def save_resume_token(db, token):
+    await db.projector_state.update_one(
+        {"_id": STATE_ID}, {"$set": {"resume_token": token}}, upsert=True
+    )
+
+
+async def follow(db):
+    """Projects change events until cancelled or the stream fails."""
+    resume_token = await load_resume_token(db)
+    async with db.watch(
+        pipeline(), full_document="updateLookup", resume_after=resume_token
+    ) as stream:
+        async for event in stream:
+            try:
+                with metrics.timer("card_projector"):
+                    await apply(db, event)
+            except PyMongoError:
+                # The stream is reopened and the event projected again
+                raise
+            except Exception as e:
+                # A document the cards can't be built from, e.g. a legacy start that doesn't parse.
+                # Skipped, retrying would block every event after it.
+                metrics.incr("card_projector.failed")
+                print(f"Card projector skipped {event['ns']['coll']} {event.get('documentKey')}: {e!r}")
+            else:
+                metrics.observe("card_projector.lag", lag(event))
+                metrics.incr(f"card_projector.projected.{event['ns']['coll']}")
+            await save_resume_token(db, stream.resume_token)
+
+
+async def run(db, retry_interval: float = CARD_PROJECTOR_RETRY_INTERVAL):
+    """Follows the change stream, restarts from the saved resume token on errors."""
+    while True:
+        try:
+            await follow(db)
+        except OperationFailure as e:
+            metrics.incr("card_projector.failed")
+            if e.code == CHANGE_STREAM_HISTORY_LOST:
+                # The oplog moved past the saved token, changes in between are not projected
+                print(f"Card projector lost its change stream position: {e}")
+                await save_resume_token(db, None)
+            else:
+                print(f"Card projector failed: {e}")
+        except PyMongoError as e:
+            metrics.incr("card_projector.failed")
+            print(f"Card projector failed: {e}")
+        await asyncio.sleep(retry_interval)
@@ -0,0 +1,171 @@
+""" Group chat messages, one document per message in `chat_messages`.
+
+    Messages are stored as the JSON the client sent, other text as a JSON string,
+    with the group, the sender and the server time `ts`, and read newest first through the (group_id, ts, _id) index.
+    Groups used to keep the whole history as a JSON string in `chat_messages`,
+    `migrate` moves it to the collection the first time a group's chat is used.
+"""
+import json
+import asyncio
+import datetime
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+import cursors
+import versions
+from metrics import metrics
+
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+# Groups this process has already migrated
+_migrated: set[str] = set()
+
+
+async def migrate(db, group_id):
+    """ Moves a group's legacy chat history to the messages collection.
+        Messages get timestamps just after the group was created, in their order.
+        Upserts keyed by their position make a repeated or concurrent run harmless.
+    """
+    if str(group_id) in _migrated:
+        return
+    group = await db.groups.find_one(
+        {"_id": ObjectId(group_id), "chat_messages": {"$type": "string"}}, {"chat_messages": 1}
+    )
+    if group is not None:
+        try:
+            history = json.loads(group["chat_messages"] or "[]")
+        except ValueError:
+            # Clients could append any text, the history can't be split into messages then
+            print(f"group {group_id} has an invalid chat history, it is kept as one message")
+            history = [group["chat_messages"]]
+        if not isinstance(history, list):
+            history = [history]
+        created = ObjectId(group_id).generation_time
+        updates = [
+            UpdateOne(
+                {"group_id": ObjectId(group_id), "legacy_index": i},
+                {
+                    "$setOnInsert": {
+                        "user_id": message.get("user_id") if isinstance(message, dict) else None,
+                        "ts": created + datetime.timedelta(milliseconds=i),
+                        "message": json.dumps(message),
+                    }
+                },
+                upsert=True,
+            )
+            for i, message in enumerate(history)
+        ]
+        if updates:
+            await db.chat_messages.bulk_write(updates, ordered=False)
+        # Not a version bump, the group reads the same before and after
+        await db.groups.update_one({"_id": group["_id"]}, {"$unset": {"chat_messages": ""}})
+    _migrated.add(str(group_id))
+
+
+def as_json(message: str) -> str:
+    """Messages are JSON sent by the clients, any other text is stored as a JSON string."""
+    try:
+        json.loads(message)
+    except ValueError:
+        return json.dumps(message)
+    return message
+
+
+async def append(db, group_id, user_id, message: str) -> dict:
+    await migrate(db, group_id)
+    document = {
+        "group_id": ObjectId(group_id),
+        "user_id": str(user_id),
+        "ts": datetime.datetime.now(datetime.UTC),
+        "message": as_json(message),
+    }
+    # The group's last_activity orders the group cards
+    await asyncio.gather(
+        db.chat_messages.insert_one(document),
+        db.groups.update_one({"_id": ObjectId(group_id)}, versions.bump({}, activity=True)),
+    )
+    return document
+
+
+async def history(db, group_id, before: cursors.Cursor | None = None, limit: int | None = None) -> list[dict]:
+    """Messages older than the `before` cursor, the latest `limit` of them, oldest first."""
+    await migrate(db, group_id)
+    query = {"group_id": ObjectId(group_id)}
+    if before is not None:
+        query = {"$and": [query, cursors.older("ts", before)]}
+    # _id orders messages sent within the same millisecond
+    cursor = db.chat_messages.find(query).sort([("ts", -1), ("_id", -1)])
+    if limit is not None:
+        cursor = cursor.limit(limit)
+    messages = await cursor.to_list(limit)
+    messages.reverse()
+    return messages
+
+
+async def latest(db, group_ids: list) -> dict[str, datetime.datetime]:
+    """Time of the last message of each group, groups without messages are left out."""
+    last = db.chat_messages.aggregate(
+        [
+            {"$match": {"group_id": {"$in": [ObjectId(i) for i in group_ids]}}},
+            # Same order as the (group_id, ts) index read backwards
+            {"$sort": {"group_id": -1, "ts": -1, "_id": -1}},
+            {"$group": {"_id": "$group_id", "ts": {"$first": "$ts"}}},
+        ]
+    )
+    return {str(group["_id"]): group["ts"] async for group in last}
+
+
+async def delete_from(db, group_id, user_id):
+    await migrate(db, group_id)
+    await db.chat_messages.delete_many({"group_id": ObjectId(group_id), "user_id": str(user_id)})
+
+
+async def delete_group(db, group_id):
+    await db.chat_messages.delete_many({"group_id": ObjectId(group_id)})
+    _migrated.discard(str(group_id))
+
+
+# Messages stored before `append` checked them may not be JSON, reads wrap them too
+
+
+def to_json(messages: list[dict]) -> list:
+    return [json.loads(as_json(m["message"])) for m in messages]
+
+
+def to_array(messages: list[dict]) -> str:
+    """The messages as one JSON array string, the format groups stored them in."""
+    return "[" + ",".join(as_json(m["message"]) for m in messages) + "]"
+
+
+async def _backfill_batch(db) -> int:
+    groups = await db.groups.find({"last_activity": {"$exists": False}}, {"_id": 1}).limit(
+        BACKFILL_BATCH_SIZE
+    ).to_list(BACKFILL_BATCH_SIZE)
+    if not groups:
+        return 0
+
+    last_messages = await latest(db, [group["_id"] for group in groups])
+    await db.groups.bulk_write(
+        [
+            UpdateOne(
+                {"_id": group["_id"], "last_activity": {"$exists": False}},
+                {"$set": {"last_activity": last_messages.get(str(group["_id"]), group["_id"].generation_time)}},
+            )
+            for group in groups
+        ],
+        ordered=False,
+    )
+    return len(groups)
+
+
+async def backfill_last_activity(db):
+    """Groups created before they had a `last_activity` get their last message time, or their creation time."""
+    converted = 0
+    while count := await _backfill_batch(db):
+        converted += count
+        metrics.incr("groups.last_activity_backfilled", count)
+    if converted:
+        print(f"Added last activity to {converted} groups")
@@ -0,0 +1,54 @@
+""" Opaque page cursors for lists ordered newest first by a time field.
+
+    Times have millisecond precision and are not unique, so a cursor holds the
+    time and `_id` of the last document of a page, and the next page continues
+    after that pair in (time, _id) order. The cursor itself is URL safe base64,
+    clients pass it back as it is.
+"""
+import base64
+import datetime
+
+from bson import ObjectId
+
+
+Cursor = tuple[datetime.datetime | None, ObjectId]
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.UTC)
+MILLISECOND = datetime.timedelta(milliseconds=1)
+
+
+def encode(time: datetime.datetime | None, _id) -> str:
+    # BSON datetimes are read back without a timezone, they are UTC
+    millis = "" if time is None else str((time.replace(tzinfo=time.tzinfo or datetime.UTC) - EPOCH) // MILLISECOND)
+    return base64.urlsafe_b64encode(f"{millis}:{_id}".encode()).decode().rstrip("=")
+
+
+def decode(cursor: str) -> Cursor:
+    """Raises ValueError for cursors that weren't returned by `encode`."""
+    try:
+        millis, _id = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode().split(":")
+        time = None if millis == "" else EPOCH + int(millis) * MILLISECOND
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"invalid cursor {cursor}") from e
+    if not ObjectId.is_valid(_id):
+        raise ValueError(f"invalid cursor {cursor}")
+    return time, ObjectId(_id)
+
+
+def older(field: str, cursor: Cursor, nullable: bool = False) -> dict:
+    """ Query for documents after the cursor in (`field`, _id) descending order.
+        With `nullable`, documents without the field sort after all others.
+    """
+    time, _id = cursor
+    if time is None:
+        return {field: None, "_id": {"$lt": _id}}
+    branches = [{field: {"$lt": time}}, {field: time, "_id": {"$lt": _id}}]
+    if nullable:
+        branches.append({field: None})
+    return {"$or": branches}
+
+
+def next_cursor(page: list[dict], limit: int, field: str) -> str | None:
+    if len(page) < limit:
+        return None
+    return encode(page[-1].get(field), page[-1]["_id"])
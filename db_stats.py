@@ -0,0 +1,82 @@
+import os
+import threading
+from contextvars import ContextVar
+
+import bson
+from dotenv import load_dotenv
+from pymongo import monitoring
+
+
+load_dotenv()
+
+DEBUG_DB_STATS = os.environ.get("DEBUG_DB_STATS", "0") == "1"
+
+READ_COMMANDS = {"find", "getMore", "aggregate", "count", "countDocuments", "distinct"}
+WRITE_COMMANDS = {"insert", "update", "delete", "findAndModify"}
+
+
+class DBStats:
+    """Database commands issued while serving a single request."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reads = 0
+        self.writes = 0
+        self.bytes_written = 0
+
+    def record(self, command_name: str, command: dict):
+        with self.lock:
+            if command_name in READ_COMMANDS:
+                self.reads += 1
+            elif command_name in WRITE_COMMANDS:
+                self.writes += 1
+                self.bytes_written += len(bson.encode(command))
+
+
+request_stats: ContextVar[DBStats | None] = ContextVar("request_stats", default=None)
+
+
+class CommandCounter(monitoring.CommandListener):
+    """ Attributes every command sent by the client to the request that issued it.
+        Motor copies the context into its executor threads, so the request's
+        DBStats is visible here.
+    """
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        stats = request_stats.get()
+        if stats is not None:
+            stats.record(event.command_name, event.command)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        pass
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        pass
+
+
+class DBStatsMiddleware:
+    """Reports database reads, writes and bytes sent by write commands of a request in debug headers."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not DEBUG_DB_STATS:
+            return await self.app(scope, receive, send)
+
+        stats = DBStats()
+        token = request_stats.set(stats)
+
+        async def send_with_stats(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-reads", str(stats.reads).encode()))
+                headers.append((b"x-db-writes", str(stats.writes).encode()))
+                headers.append((b"x-db-bytes-written", str(stats.bytes_written).encode()))
+                message["headers"] = headers
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_stats)
+        finally:
+            request_stats.reset(token)
@@ -0,0 +1,105 @@
+from bson import ObjectId
+from fastapi import HTTPException
+
+
+class EntityLoader:
+    """ Per-request identity map over the entity collections.
+        Every document is read from the database at most once per request,
+        repeated lookups of the same id return the same dict.
+
+        Lookups take the list of top-level fields the caller uses (None for the
+        whole document, [] for just the id). Fields that are not loaded yet are
+        fetched and merged into the cached dict.
+    """
+
+    def __init__(self, users_collection, meetings_collection, groups_collection, time_slots_collection):
+        self.collections = {
+            "user": users_collection,
+            "meeting": meetings_collection,
+            "group": groups_collection,
+            "time slot": time_slots_collection,
+        }
+        self.documents: dict[tuple[str, str], tuple[set[str] | None, dict]] = {}
+
+    async def user(self, user_id, fields: list[str] | None = None) -> dict:
+        return await self._load("user", user_id, fields)
+
+    async def meeting(self, meeting_id, fields: list[str] | None = None) -> dict:
+        return await self._load("meeting", meeting_id, fields)
+
+    async def group(self, group_id, fields: list[str] | None = None) -> dict:
+        return await self._load("group", group_id, fields)
+
+    async def time_slot(self, time_slot_id, fields: list[str] | None = None) -> dict:
+        return await self._load("time slot", time_slot_id, fields)
+
+    def remember(self, kind: str, document: dict, fields: list[str] | None = None) -> dict:
+        """Adds a document fetched by another query to the identity map."""
+        self.documents[(kind, str(document["_id"]))] = (
+            None if fields is None else set(fields),
+            document,
+        )
+        return document
+
+    def forget(self, kind: str, entity_id):
+        """Drops a document from the identity map after it was changed in the database."""
+        self.documents.pop((kind, str(entity_id)), None)
+
+    async def users(self, user_ids, fields: list[str] | None = None) -> dict[str, dict]:
+        """Loads several users with one query, keyed by string id. Missing users are left out."""
+        return await self._load_many("user", user_ids, fields)
+
+    async def meetings(self, meeting_ids, fields: list[str] | None = None) -> dict[str, dict]:
+        """Loads several meetings with one query, keyed by string id. Missing meetings are left out."""
+        return await self._load_many("meeting", meeting_ids, fields)
+
+    async def _load(self, kind: str, entity_id, fields: list[str] | None) -> dict:
+        key = (kind, str(entity_id))
+        if (document := self._cached(key, fields)) is not None:
+            return document
+
+        loaded, _ = self.documents.get(key, (set(), None))
+        wanted = None if fields is None else set(fields) - loaded
+        found = await self.collections[kind].find_one({"_id": ObjectId(entity_id)}, self._projection(wanted))
+        if found is None:
+            raise HTTPException(status_code=404, detail=f"{kind} {entity_id} not found")
+        return self._merge(key, found, wanted)
+
+    async def _load_many(self, kind: str, entity_ids, fields: list[str] | None) -> dict[str, dict]:
+        documents = {}
+        missing = []
+        for entity_id in dict.fromkeys(str(i) for i in entity_ids):
+            if (document := self._cached((kind, entity_id), fields)) is not None:
+                documents[entity_id] = document
+            else:
+                missing.append(ObjectId(entity_id))
+
+        if missing:
+            async for found in self.collections[kind].find(
+                {"_id": {"$in": missing}}, self._projection(fields)
+            ):
+                key = (kind, str(found["_id"]))
+                documents[key[1]] = self._merge(key, found, None if fields is None else set(fields))
+        return documents
+
+    def _cached(self, key: tuple[str, str], fields: list[str] | None) -> dict | None:
+        loaded, document = self.documents.get(key, (set(), None))
+        if document is not None and (
+            loaded is None or (fields is not None and loaded.issuperset(fields))
+        ):
+            return document
+        return None
+
+    @staticmethod
+    def _projection(fields) -> dict | None:
+        return None if fields is None else {"_id": 1, **{f: 1 for f in fields}}
+
+    def _merge(self, key: tuple[str, str], found: dict, fetched: set[str] | None) -> dict:
+        loaded, document = self.documents.get(key, (set(), None))
+        if document is None:
+            document = found
+        else:
+            # Keep changes the request already made to the fields loaded before
+            document.update({k: v for k, v in found.items() if k not in loaded})
+        self.documents[key] = (None if fetched is None else loaded | fetched, document)
+        return document
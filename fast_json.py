@@ -0,0 +1,41 @@
+""" Fast JSON responses for large payloads.
+
+    Returning a model or dict from a handler makes FastAPI validate it against
+    `response_model` a second time, run it through `jsonable_encoder` and encode
+    the result with the stdlib `json`. Handlers that opt in build their model
+    once and return `FastJSONResponse(model)` instead: models are serialized by
+    pydantic-core directly, plain data by orjson when it is installed.
+"""
+import json
+from typing import Any
+
+from bson import ObjectId
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    if isinstance(content, BaseModel):
+        # Same output as FastAPI with response_model_by_alias=False
+        return content.__pydantic_serializer__.to_json(content, by_alias=False)
+    if orjson is not None:
+        return orjson.dumps(content, default=_default)
+    return json.dumps(content, default=_default, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
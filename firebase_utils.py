@@ -1,10 +1,11 @@
+import asyncio
 import datetime
 
-from firebase_admin import messaging
+from firebase_admin import exceptions, messaging
 
 
-def notify_single_user(fcm_token, title, body, link=""):
-    message = messaging.Message(
+def build_message(fcm_token, title, body, link=""):
+    return messaging.Message(
         notification=messaging.Notification(
             title=title,
             body=body,
@@ -26,8 +27,23 @@ def notify_single_user(fcm_token, title, body, link=""):
         # Use token to target a specific user
         token=fcm_token,
     )
-    try:
-        response = messaging.send(message)
-        print(response)
-    except:
-        print("Couldn't notify user, fcm_token not valid")
+
+
+class FirebaseTransport:
+    """Sends notification batches through FCM, up to 500 messages per call."""
+
+    max_batch_size = 500
+    retryable_errors = (
+        exceptions.UnavailableError,
+        exceptions.InternalError,
+        exceptions.DeadlineExceededError,
+        messaging.QuotaExceededError,
+    )
+
+    async def send(self, messages: list[messaging.Message]) -> list[Exception | None]:
+        # send_each blocks on HTTP requests, keep it off the event loop
+        batch = await asyncio.to_thread(messaging.send_each, messages)
+        return [None if r.success else r.exception for r in batch.responses]
+
+    def retryable(self, error: Exception) -> bool:
+        return isinstance(error, self.retryable_errors)
@@ -0,0 +1,156 @@
+""" Declared MongoDB indexes for every collection.
+
+    The API ensures them in the background on startup. On deploy run
+        python indexes.py           # build missing indexes, drop retired ones, report progress
+        python indexes.py --check   # exit with 1 if the database differs from the declaration
+"""
+import os
+import sys
+import asyncio
+
+import motor.motor_asyncio
+from dotenv import load_dotenv
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, IndexModel
+from pymongo.errors import OperationFailure
+
+
+INDEXES: dict[str, list[IndexModel]] = {
+    "users": [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        IndexModel([("meetings.meeting_id", ASCENDING)], name="meetings_meeting_id"),
+        IndexModel([("groups._id", ASCENDING)], name="groups_id"),
+        IndexModel([("location", GEOSPHERE)], name="location_2dsphere"),
+    ],
+    "meetings": [
+        IndexModel([("group_id", ASCENDING), ("start", ASCENDING)], name="group_id_start"),
+        IndexModel([("start", ASCENDING)], name="start"),
+        IndexModel([("is_finished", ASCENDING), ("end", ASCENDING)], name="is_finished_end"),
+        IndexModel([("participants.user_id", ASCENDING)], name="participants_user_id"),
+    ],
+    # Card projections find the documents embedding a card by its id
+    "groups": [
+        IndexModel([("meetings._id", ASCENDING)], name="meetings_id"),
+        IndexModel([("users._id", ASCENDING)], name="users_id"),
+        IndexModel([("admin._id", ASCENDING)], name="admin_id"),
+        # Group cards are listed by activity, newest first
+        IndexModel([("last_activity", DESCENDING), ("_id", DESCENDING)], name="last_activity_id"),
+    ],
+    "chat_messages": [
+        IndexModel([("group_id", ASCENDING), ("ts", ASCENDING), ("_id", ASCENDING)], name="group_id_ts_id"),
+        # Makes migrating a group's chat history idempotent
+        IndexModel(
+            [("group_id", ASCENDING), ("legacy_index", ASCENDING)],
+            name="group_id_legacy_index",
+            unique=True,
+            partialFilterExpression={"legacy_index": {"$exists": True}},
+        ),
+    ],
+    "time_slots": [
+        IndexModel([("is_meeting", ASCENDING), ("start", ASCENDING)], name="is_meeting_start"),
+    ],
+}
+
+# Indexes that were replaced by a declared one, dropped when the declared ones are built
+RETIRED_INDEXES: dict[str, list[str]] = {
+    # Prefix of group_id_start
+    "meetings": ["group_id"],
+}
+
+PROGRESS_INTERVAL = 2
+
+
+def _spec(key, unique) -> tuple:
+    items = key.items() if isinstance(key, dict) else key
+    return (tuple((field, direction) for field, direction in items), bool(unique))
+
+
+async def diff_indexes(db) -> list[str]:
+    """Lists differences between the declared indexes and the ones in the database."""
+    problems = []
+    for collection_name, declared in INDEXES.items():
+        existing = await db[collection_name].index_information()
+        for index in declared:
+            document = index.document
+            name = document["name"]
+            if name not in existing:
+                problems.append(f"{collection_name}.{name}: missing")
+            elif _spec(document["key"], document.get("unique")) != _spec(
+                existing[name]["key"], existing[name].get("unique")
+            ):
+                problems.append(f"{collection_name}.{name}: differs from declaration")
+        declared_names = {index.document["name"] for index in declared} | {"_id_"}
+        for name in sorted(set(existing) - declared_names):
+            problems.append(f"{collection_name}.{name}: not declared")
+    return problems
+
+
+async def _report_progress(db, collection_name: str):
+    while True:
+        await asyncio.sleep(PROGRESS_INTERVAL)
+        try:
+            ops = await db.client.admin.command(
+                "currentOp", {"command.createIndexes": collection_name}
+            )
+        except OperationFailure:
+            return
+        for op in ops.get("inprog", []):
+            progress = op.get("progress")
+            if progress:
+                print(f"Building indexes on {collection_name}: {progress['done']}/{progress['total']}")
+
+
+async def ensure_indexes(db):
+    """ Creates missing declared indexes, then drops retired ones they replace.
+        Existing declared indexes are left untouched, so this is safe to rerun.
+    """
+    for collection_name, declared in INDEXES.items():
+        existing = await db[collection_name].index_information()
+        missing = [index for index in declared if index.document["name"] not in existing]
+        if not missing:
+            continue
+
+        names = ", ".join(index.document["name"] for index in missing)
+        print(f"Building indexes on {collection_name}: {names}")
+        progress = asyncio.create_task(_report_progress(db, collection_name))
+        try:
+            await db[collection_name].create_indexes(missing)
+            print(f"Built indexes on {collection_name}: {names}")
+        except OperationFailure as e:
+            print(f"Failed to build indexes on {collection_name}: {e}")
+        finally:
+            progress.cancel()
+
+    for collection_name, retired in RETIRED_INDEXES.items():
+        existing = await db[collection_name].index_information()
+        if any(index.document["name"] not in existing for index in INDEXES[collection_name]):
+            # Keep serving queries from the old indexes until the new ones are built
+            continue
+        for name in [name for name in retired if name in existing]:
+            try:
+                await db[collection_name].drop_index(name)
+                print(f"Dropped retired index {collection_name}.{name}")
+            except OperationFailure as e:
+                print(f"Failed to drop index {collection_name}.{name}: {e}")
+
+
+async def bootstrap(db):
+    """Startup hook: builds missing indexes and logs any drift from the declaration."""
+    await ensure_indexes(db)
+    for problem in await diff_indexes(db):
+        print(f"Index mismatch: {problem}")
+
+
+async def main(check: bool) -> int:
+    load_dotenv()
+    client = motor.motor_asyncio.AsyncIOMotorClient(os.environ["MONGODB_URL"])
+    db = client.coordimate
+    if not check:
+        await ensure_indexes(db)
+    problems = await diff_indexes(db)
+    for problem in problems:
+        print(f"Index mismatch: {problem}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(check="--check" in sys.argv)))
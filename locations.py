@@ -0,0 +1,86 @@
+""" User locations are stored as GeoJSON points in `location`, with a 2dsphere index.
+
+    Clients still send and read `last_location` as a "lat,lon" string, updates
+    write both fields. Users saved before `location` existed are converted by
+    `backfill` after startup.
+"""
+import math
+
+from pymongo import UpdateOne
+
+from metrics import metrics
+
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def parse(value: str) -> dict:
+    """Turns a "lat,lon" string into a GeoJSON point, raises ValueError for invalid ones."""
+    lat, lon = map(float, value.split(","))
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError(f"{value!r} is not a valid location")
+    # GeoJSON orders coordinates as longitude, latitude
+    return {"type": "Point", "coordinates": [lon, lat]}
+
+
+def point_of(user: dict) -> dict | None:
+    if user.get("location") is not None:
+        return user["location"]
+    try:
+        return parse(user["last_location"]) if user.get("last_location") else None
+    except ValueError:
+        return None
+
+
+def centroid(points: list[dict]) -> tuple[float, float]:
+    """ Spherical centroid (lat, lon) of GeoJSON points.
+        The points are averaged as unit vectors, so locations on both sides of the
+        antimeridian or around a pole are not pulled to the other side of the globe.
+    """
+    x = y = z = 0.0
+    for point in points:
+        lon, lat = map(math.radians, point["coordinates"])
+        x += math.cos(lat) * math.cos(lon)
+        y += math.cos(lat) * math.sin(lon)
+        z += math.sin(lat)
+    if math.isclose(math.hypot(x, y, z), 0, abs_tol=1e-9):
+        # Points evenly spread around the globe have no centroid, fall back to the first one
+        lon, lat = points[0]["coordinates"]
+        return lat, lon
+    return math.degrees(math.atan2(z, math.hypot(x, y))), math.degrees(math.atan2(y, x))
+
+
+async def _backfill_batch(users) -> int:
+    documents = await users.find(
+        {"last_location": {"$type": "string"}, "location": {"$exists": False}},
+        {"last_location": 1},
+    ).limit(BACKFILL_BATCH_SIZE).to_list(BACKFILL_BATCH_SIZE)
+    if not documents:
+        return 0
+
+    updates = []
+    for document in documents:
+        try:
+            location = parse(document["last_location"])
+        except ValueError:
+            # Not picked up again, the next location update from the client replaces it
+            print(f"user {document['_id']} has an invalid location {document['last_location']!r}")
+            location = None
+        updates.append(
+            UpdateOne(
+                {"_id": document["_id"], "last_location": document["last_location"]},
+                {"$set": {"location": location}},
+            )
+        )
+    await users.bulk_write(updates, ordered=False)
+    return len(documents)
+
+
+async def backfill(db):
+    """Adds GeoJSON points to users that only have a "lat,lon" string."""
+    converted = 0
+    while count := await _backfill_batch(db.users):
+        converted += count
+        metrics.incr("locations.backfilled", count)
+    if converted:
+        print(f"Converted locations of {converted} users")
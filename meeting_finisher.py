@@ -0,0 +1,59 @@
+""" Marks meetings as finished once they are over.
+
+    Runs periodically inside the API process, so reading meetings never writes.
+    Finishing declines every invitation nobody answered, in the meeting and in the users.
+"""
+import os
+import asyncio
+import datetime
+
+from dotenv import load_dotenv
+
+import models
+import versions
+from metrics import metrics
+
+
+load_dotenv()
+
+MEETING_FINISHER_INTERVAL = int(os.environ.get("MEETING_FINISHER_INTERVAL", 60))
+
+PENDING = models.MeetingStatus.needs_acceptance.value
+DECLINED = models.MeetingStatus.declined.value
+
+
+async def finish_meetings(db, now: datetime.datetime | None = None) -> int:
+    """Finishes all meetings that ended before `now`, returns how many."""
+    now = now or datetime.datetime.now(datetime.UTC)
+    over = await db.meetings.find(
+        {"is_finished": False, "end": {"$lt": now}}, {"_id": 1}
+    ).to_list(None)
+    if not over:
+        return 0
+
+    meeting_ids = [m["_id"] for m in over]
+    invite_ids = [str(meeting_id) for meeting_id in meeting_ids]
+    await db.meetings.update_many(
+        {"_id": {"$in": meeting_ids}},
+        versions.bump({"$set": {"is_finished": True, "participants.$[pending].status": DECLINED}}),
+        array_filters=[{"pending.status": PENDING}],
+    )
+    await db.users.update_many(
+        {"meetings": {"$elemMatch": {"meeting_id": {"$in": invite_ids}, "status": PENDING}}},
+        {"$set": {"meetings.$[invite].status": DECLINED}},
+        array_filters=[{"invite.meeting_id": {"$in": invite_ids}, "invite.status": PENDING}],
+    )
+    return len(meeting_ids)
+
+
+async def run(db, interval: float = MEETING_FINISHER_INTERVAL):
+    """Finishes meetings every `interval` seconds until cancelled."""
+    while True:
+        try:
+            with metrics.timer("meeting_finisher"):
+                finished = await finish_meetings(db)
+            metrics.incr("meeting_finisher.finished", finished)
+        except Exception as e:
+            metrics.incr("meeting_finisher.failed")
+            print(f"Meeting finisher failed: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,111 @@
+""" Meeting times are stored as BSON datetimes in UTC, with a stored `end`.
+
+    Older meetings and meeting time slots store `start` as an ISO string.
+    Reads accept both forms, and `backfill` rewrites the old documents
+    in batches after startup.
+"""
+import datetime
+
+from pymongo import UpdateOne
+
+import versions
+from metrics import metrics
+
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def to_utc(value: str | datetime.datetime) -> datetime.datetime:
+    """Parses a start time, values without an offset (and BSON datetimes) are taken as UTC."""
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        return value.replace(tzinfo=datetime.UTC)
+    return value.astimezone(datetime.UTC)
+
+
+def to_bson(value: str | datetime.datetime) -> datetime.datetime:
+    """Like `to_utc`, truncated to the millisecond precision BSON datetimes are stored with."""
+    value = to_utc(value)
+    return value.replace(microsecond=value.microsecond // 1000 * 1000)
+
+
+def meeting_end(start: str | datetime.datetime, length: int) -> datetime.datetime:
+    return to_utc(start) + datetime.timedelta(minutes=length)
+
+
+def start_range(start_from: datetime.datetime | None = None, start_to: datetime.datetime | None = None) -> dict:
+    """ Query for documents starting in [start_from, start_to).
+        Documents still storing `start` as a string are compared after conversion,
+        they are matched through the string part of the `start` index. Strings that
+        are not dates never match instead of failing the whole query.
+    """
+    # null sorts before every date, so unconvertible starts are excluded explicitly
+    legacy_start = {"$convert": {"input": "$start", "to": "date", "onError": None}}
+    bounds = {}
+    legacy_bounds: list[dict] = [{"$ne": [legacy_start, None]}]
+    if start_from is not None:
+        bounds["$gte"] = start_from
+        legacy_bounds.append({"$gte": [legacy_start, start_from]})
+    if start_to is not None:
+        bounds["$lt"] = start_to
+        legacy_bounds.append({"$lt": [legacy_start, start_to]})
+    if not bounds:
+        return {}
+    return {
+        "$or": [
+            {"start": bounds},
+            {
+                "start": {"$type": "string"},
+                "invalid_start": {"$exists": False},
+                "$expr": {"$and": legacy_bounds},
+            },
+        ]
+    }
+
+
+async def _backfill_batch(collection, query: dict, versioned: bool) -> int:
+    documents = await collection.find(query, {"start": 1, "length": 1}).limit(
+        BACKFILL_BATCH_SIZE
+    ).to_list(BACKFILL_BATCH_SIZE)
+    if not documents:
+        return 0
+
+    updates = []
+    for document in documents:
+        try:
+            start = to_utc(document["start"])
+            update = {"start": start, "end": meeting_end(start, document.get("length", 60))}
+        except ValueError:
+            # Left for a human to fix, but not picked up again
+            print(f"{collection.name} {document['_id']} has an invalid start time {document['start']!r}")
+            update = {"invalid_start": True}
+        update = {"$set": update}
+        updates.append(
+            UpdateOne(
+                {"_id": document["_id"], "start": document["start"]},
+                # Meetings are served with ETags and read back differently once converted
+                versions.bump(update) if versioned else update,
+            )
+        )
+    await collection.bulk_write(updates, ordered=False)
+    return len(documents)
+
+
+async def backfill(db):
+    """Converts string start times of meetings and meeting time slots until none are left."""
+    targets = [
+        (db.meetings, {"start": {"$type": "string"}, "invalid_start": {"$exists": False}}, True),
+        (
+            db.time_slots,
+            {"is_meeting": True, "start": {"$type": "string"}, "invalid_start": {"$exists": False}},
+            False,
+        ),
+    ]
+    for collection, query, versioned in targets:
+        converted = 0
+        while count := await _backfill_batch(collection, query, versioned):
+            converted += count
+            metrics.incr(f"meeting_times.backfilled.{collection.name}", count)
+        if converted:
+            print(f"Converted start times of {converted} {collection.name}")
@@ -0,0 +1,69 @@
+import time
+from collections import defaultdict, deque
+
+
+class Metrics:
+    """In-process counters, gauges, latency and value samples, exposed on GET /metrics."""
+
+    def __init__(self, samples: int = 1024):
+        self.samples = samples
+        self.counters: dict[str, int] = defaultdict(int)
+        self.gauges: dict[str, float] = {}
+        self.timings: dict[str, deque] = defaultdict(lambda: deque(maxlen=self.samples))
+        self.values: dict[str, deque] = defaultdict(lambda: deque(maxlen=self.samples))
+
+    def incr(self, name: str, value: int = 1):
+        self.counters[name] += value
+
+    def gauge(self, name: str, value: float):
+        self.gauges[name] = value
+
+    def observe(self, name: str, seconds: float):
+        self.timings[name].append(seconds)
+
+    def sample(self, name: str, value: float):
+        """Records a value that is not a duration, e.g. a batch size."""
+        self.values[name].append(value)
+
+    def timer(self, name: str):
+        return _Timer(self, name)
+
+    def snapshot(self) -> dict:
+        return {
+            "counters": dict(self.counters),
+            "gauges": dict(self.gauges),
+            "timings": _summarize(self.timings, scale=1000, suffix="_ms"),
+            "samples": _summarize(self.values),
+        }
+
+
+def _summarize(series: dict[str, deque], scale: float = 1, suffix: str = "") -> dict:
+    summary = {}
+    for name, values in series.items():
+        ordered = sorted(values)
+        if not ordered:
+            continue
+        summary[name] = {
+            "count": len(ordered),
+            f"avg{suffix}": scale * sum(ordered) / len(ordered),
+            f"p50{suffix}": scale * ordered[len(ordered) // 2],
+            f"p99{suffix}": scale * ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+            f"max{suffix}": scale * ordered[-1],
+        }
+    return summary
+
+
+class _Timer:
+    def __init__(self, metrics: Metrics, name: str):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.start)
+
+
+metrics = Metrics()
@@ -1,16 +1,39 @@
+import datetime
 from typing import Any, Optional, List
 from typing_extensions import Annotated
 
 from pydantic import ConfigDict, BaseModel, Field, EmailStr
-from pydantic.functional_validators import BeforeValidator
+from pydantic.functional_validators import AfterValidator, BeforeValidator
 
 # from pymongo.objectid import ObjectId
 from bson import ObjectId
 from enum import Enum
 
+import locations
+
 PyObjectId = Annotated[str, BeforeValidator(str)]
 
 
+def _isoformat(value):
+    # BSON datetimes are read back without a timezone, they are stored in UTC
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=datetime.UTC)
+        return value.isoformat()
+    return value
+
+
+IsoDatetime = Annotated[str, BeforeValidator(_isoformat)]
+
+
+def _location(value: str) -> str:
+    locations.parse(value)
+    return value
+
+
+LatLon = Annotated[str, AfterValidator(_location)]
+
+
 class MeetingStatus(str, Enum):
     accepted = "accepted"
     declined = "declined"
@@ -20,7 +43,7 @@ class MeetingStatus(str, Enum):
 class MeetingTile(BaseModel):
     id: str
     title: str
-    start: str
+    start: IsoDatetime
     length: int  # Length of the meeting in minutes
     group: "GroupCardModel"
     status: MeetingStatus
@@ -37,6 +60,7 @@ class Participant(BaseModel):  # TODO: user_id as PyObjectId
 
 
 class AgendaPoint(BaseModel):
+    id: Optional[PyObjectId] = Field(alias="_id", default=None)
     text: str = Field(...)
     level: int = Field(
         ..., description="Level of indentation of the agenda point in the list"
@@ -46,7 +70,7 @@ class AgendaPoint(BaseModel):
 class MeetingCardModel(BaseModel):
     id: Optional[PyObjectId] = Field(alias="_id", default=None)
     title: str = Field(...)
-    start: str = Field(...)
+    start: IsoDatetime = Field(...)
     length: int = Field(...)
 
 
@@ -60,7 +84,7 @@ class MeetingModel(BaseModel):
     )
     is_finished: bool = Field(False, description="Marks the meeting as compeleted")
     title: str = Field(..., description="Title of the meeting")
-    start: str = Field(..., description="Start date and time of the meeting")
+    start: IsoDatetime = Field(..., description="Start date and time of the meeting")
     length: int = Field(default=60, description="Length of the meeting in minutes")
     time_slot_id: Optional[PyObjectId] = Field(...)
     description: Optional[str] = Field(None, description="Description of the meeting")
@@ -89,7 +113,7 @@ class MeetingModel(BaseModel):
 class TimeSlot(BaseModel):
     id: Optional[PyObjectId] = Field(alias="_id", default=None)
     day: int = Field(...)
-    start: str = Field(..., description="Start date and time of the timeSlot" )
+    start: IsoDatetime = Field(..., description="Start date and time of the timeSlot" )
     length: int = Field(..., description="Duration of the timeSlot in minutes")
     is_meeting: bool = Field(False)
 
@@ -139,12 +163,15 @@ class UpdateUserModel(BaseModel):
     username: Optional[str] = None
     email: Optional[EmailStr] = None
     password: Optional[str] = None
-    last_location: Optional[str] = None
+    last_location: Optional[LatLon] = Field(default=None, description='"lat,lon" in degrees')
     random_coffee: Optional[RandomCoffee] = None
 
 
 class UserCollection(BaseModel):
     users: List[UserModel]
+    next_cursor: Optional[str] = Field(
+        default=None, description="Pass as `after` to fetch the next page, empty on the last page"
+    )
 
 
 class GroupCardModel(BaseModel):
@@ -173,7 +200,9 @@ class GroupModel(BaseModel):
     schedule: List[PyObjectId] = Field(
         [], description="List of busy time slots in the group's schedule"
     )
-    chat_messages: str = Field(default='[]')
+    chat_messages: str = Field(
+        default='[]', description="JSON array of all chat messages, GET /groups/{id}/messages pages through them"
+    )
     poll: Optional[GroupPoll] = Field(default=None)
     meeting_link: Optional[str] = Field(default=None)
 
@@ -182,6 +211,30 @@ class GroupCollection(BaseModel):
     groups: List[GroupModel]
 
 
+class GroupSummaryModel(BaseModel):
+    id: Optional[PyObjectId] = Field(alias="_id", default=None)
+    name: str = Field(...)
+    avatar_extension: Optional[str] = Field(default=None)
+    member_count: int = Field(...)
+    last_activity: Optional[IsoDatetime] = Field(
+        default=None, description="Last chat message, new meeting or new member"
+    )
+
+
+class ChatMessageCollection(BaseModel):
+    messages: List[Any] = Field(..., description="Messages as sent by the clients, oldest first")
+    next_cursor: Optional[str] = Field(
+        default=None, description="Pass as `before` to fetch older messages, empty when there are none"
+    )
+
+
+class GroupSummaryCollection(BaseModel):
+    groups: List[GroupSummaryModel]
+    next_cursor: Optional[str] = Field(
+        default=None, description="Pass as `after` to fetch the next page, empty on the last page"
+    )
+
+
 class UpdateGroupModel(BaseModel):
     name: Optional[str] = None
     description: Optional[str] = None
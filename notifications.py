@@ -0,0 +1,141 @@
+import os
+import time
+import asyncio
+from collections import deque
+from dataclasses import dataclass
+
+from dotenv import load_dotenv
+
+from firebase_utils import FirebaseTransport, build_message
+from metrics import metrics
+
+
+load_dotenv()
+
+# "firebase" sends through FCM, "fake" only records messages, e.g. for offline load tests
+NOTIFICATION_TRANSPORT = os.environ.get("NOTIFICATION_TRANSPORT", "firebase")
+NOTIFICATION_WORKERS = int(os.environ.get("NOTIFICATION_WORKERS", 2))
+NOTIFICATION_MAX_QUEUE = int(os.environ.get("NOTIFICATION_MAX_QUEUE", 10000))
+NOTIFICATION_MAX_RETRIES = int(os.environ.get("NOTIFICATION_MAX_RETRIES", 3))
+
+# Stored for users without a device, `register` writes the first, UserModel defaults to the second
+NO_FCM_TOKEN = "notoken"
+PLACEHOLDER_FCM_TOKENS = {NO_FCM_TOKEN, "no_token"}
+
+
+class FakeTransport:
+    """Keeps the last `keep` sent messages in memory instead of delivering them."""
+
+    max_batch_size = 500
+
+    def __init__(self, latency: float = 0, keep: int = 1000):
+        self.latency = latency
+        self.sent = deque(maxlen=keep)
+
+    async def send(self, messages) -> list[Exception | None]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.sent += messages
+        return [None] * len(messages)
+
+    def retryable(self, error: Exception) -> bool:
+        return False
+
+
+@dataclass
+class _Notification:
+    message: object
+    attempt: int = 0
+    queued: float = 0
+
+
+class NotificationDispatcher:
+    """ Sends push notifications from a bounded in-process queue.
+        Handlers enqueue with `notify` and don't wait for delivery. Worker tasks
+        send whatever is queued in batches, messages that fail with a retryable
+        error are queued again with exponential backoff, at most `max_retries` times.
+    """
+
+    def __init__(self, transport, workers: int, max_queue: int, max_retries: int, retry_delay: float = 1):
+        self.transport = transport
+        self.workers = workers
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.queue: asyncio.Queue[_Notification] = asyncio.Queue(maxsize=max_queue)
+        self.tasks: set[asyncio.Task] = set()
+
+    def start(self):
+        for _ in range(self.workers - len(self.tasks)):
+            task = asyncio.create_task(self._work())
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def stop(self):
+        for task in list(self.tasks):
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    def notify(self, fcm_token, title, body, link="") -> bool:
+        """Queues a notification, returns False if it was dropped."""
+        if not fcm_token or fcm_token in PLACEHOLDER_FCM_TOKENS:
+            return False
+        return self._put(_Notification(build_message(fcm_token, title, body, link)))
+
+    def _put(self, notification: _Notification) -> bool:
+        notification.queued = time.perf_counter()
+        try:
+            self.queue.put_nowait(notification)
+        except asyncio.QueueFull:
+            metrics.incr("notifications.dropped")
+            return False
+        metrics.gauge("notifications.queue_depth", self.queue.qsize())
+        return True
+
+    async def _work(self):
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.transport.max_batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            metrics.gauge("notifications.queue_depth", self.queue.qsize())
+            await self._send(batch)
+
+    async def _send(self, batch: list[_Notification]):
+        metrics.sample("notifications.batch_size", len(batch))
+        started = time.perf_counter()
+        for notification in batch:
+            metrics.observe("notifications.queue_wait", started - notification.queued)
+        try:
+            with metrics.timer("notifications.send"):
+                errors = await self.transport.send([n.message for n in batch])
+        except Exception as e:
+            # The whole batch failed, e.g. the connection dropped
+            errors = [e] * len(batch)
+
+        for notification, error in zip(batch, errors):
+            if error is None:
+                metrics.incr("notifications.sent")
+            elif self.transport.retryable(error) and notification.attempt < self.max_retries:
+                metrics.incr("notifications.retried")
+                self._retry(notification)
+            else:
+                metrics.incr("notifications.failed")
+                print(f"Couldn't send notification: {error}")
+
+    def _retry(self, notification: _Notification):
+        notification.attempt += 1
+        delay = self.retry_delay * 2 ** (notification.attempt - 1)
+        asyncio.get_running_loop().call_later(delay, self._put, notification)
+
+
+def create_transport(name: str):
+    if name == "fake":
+        return FakeTransport()
+    return FirebaseTransport()
+
+
+notifications = NotificationDispatcher(
+    create_transport(NOTIFICATION_TRANSPORT),
+    workers=NOTIFICATION_WORKERS,
+    max_queue=NOTIFICATION_MAX_QUEUE,
+    max_retries=NOTIFICATION_MAX_RETRIES,
+)
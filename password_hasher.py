@@ -0,0 +1,62 @@
+import os
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+from dotenv import load_dotenv
+from fastapi import HTTPException
+
+from metrics import metrics
+
+
+load_dotenv()
+
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", os.cpu_count() or 1))
+PASSWORD_HASH_MAX_QUEUE = int(os.environ.get("PASSWORD_HASH_MAX_QUEUE", 64))
+
+
+class PasswordHasher:
+    """ Runs bcrypt off the event loop in a bounded thread pool.
+        bcrypt releases the GIL while hashing, so threads use all cores.
+        At most `max_workers` hashes run at once and at most `max_queue` wait,
+        further requests are rejected with 503 instead of piling up.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bcrypt")
+
+    async def hash(self, password: str) -> bytes:
+        return await self._run("hash", bcrypt.hashpw, password.encode("utf-8"), bcrypt.gensalt())
+
+    async def check(self, password: str, hashed: bytes) -> bool:
+        return await self._run("check", bcrypt.checkpw, password.encode("utf-8"), hashed)
+
+    async def _run(self, op: str, fn, *args):
+        if self.in_flight >= self.max_workers + self.max_queue:
+            metrics.incr("password_hasher.rejected")
+            raise HTTPException(status_code=503, detail="Too many authentication requests, try again later")
+
+        self.in_flight += 1
+        metrics.gauge("password_hasher.queue_depth", max(0, self.in_flight - self.max_workers))
+        submitted = time.perf_counter()
+
+        def job():
+            started = time.perf_counter()
+            metrics.observe("password_hasher.queue_wait", started - submitted)
+            try:
+                return fn(*args)
+            finally:
+                metrics.observe(f"password_hasher.{op}", time.perf_counter() - started)
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, job)
+        finally:
+            self.in_flight -= 1
+            metrics.gauge("password_hasher.queue_depth", max(0, self.in_flight - self.max_workers))
+
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_QUEUE)
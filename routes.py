@@ -1,15 +1,16 @@
 import os
-import json
 import random
+import asyncio
 import datetime
 from pathlib import Path
-from typing import Any
+from typing import Optional
 
 import motor.motor_asyncio
-from fastapi import FastAPI, HTTPException, Body, status, Depends, UploadFile, WebSocket, WebSocketDisconnect
-from fastapi.responses import Response
+from fastapi import FastAPI, HTTPException, Body, Header, Query, status, Depends, UploadFile, WebSocket, WebSocketDisconnect
+from fastapi.responses import Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pymongo import ReturnDocument  # , ObjectId
+from pymongo import ReturnDocument, UpdateMany, UpdateOne  # , ObjectId
+from pymongo.errors import DuplicateKeyError
 from dotenv import load_dotenv
 from bson import ObjectId
 
@@ -17,10 +18,24 @@ import models
 import schemas
 import firebase_admin
 
-import bcrypt
+import agendas
 import auth
+import card_projector
+import chat_messages
+import cursors
+import indexes
+import locations
+import meeting_finisher
+import meeting_times
+import versions
 from auth import JWTBearer
-from firebase_utils import notify_single_user
+from background_jobs import DebouncedJobs
+from db_stats import CommandCounter, DBStatsMiddleware
+from entity_loader import EntityLoader
+from fast_json import FastJSONResponse
+from metrics import metrics
+from notifications import NO_FCM_TOKEN, notifications
+from password_hasher import password_hasher
 from src.group_schedule_manager import GroupsScheduleManager
 from ws_manager import ConnectionManager
 
@@ -44,13 +59,98 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-client = motor.motor_asyncio.AsyncIOMotorClient(os.environ["MONGODB_URL"])
+app.add_middleware(DBStatsMiddleware)
+client = motor.motor_asyncio.AsyncIOMotorClient(
+    os.environ["MONGODB_URL"], event_listeners=[CommandCounter()]
+)
 db = client.coordimate
 users_collection = db.get_collection("users")
 meetings_collection = db.get_collection("meetings")
 groups_collection = db.get_collection("groups")
 time_slots_collection = db.get_collection("time_slots")
 
+# Fields of the user document read by /login
+LOGIN_FIELDS = ["password"]
+LOGIN_PROJECTION = {field: 1 for field in LOGIN_FIELDS}
+MEETING_CARD_FIELDS = ["title", "start", "length"]
+# Fields of a meeting read to build its tile
+MEETING_TILE_FIELDS = ["title", "start", "length", "group_id", "is_finished"]
+MEETING_TILE_PROJECTION = {field: 1 for field in MEETING_TILE_FIELDS}
+# Group list entries, members are only counted
+GROUP_SUMMARY_PROJECTION = {
+    "name": 1,
+    "avatar_extension": 1,
+    "last_activity": 1,
+    "member_count": {"$size": {"$ifNull": ["$users", []]}},
+}
+# Fields of a group shown by GET /groups/{id}, chat messages are stored separately
+GROUP_FIELDS = [
+    "admin", "name", "description", "avatar_extension", "users", "meetings", "schedule", "poll", "meeting_link",
+]
+
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 100
+# Batched agenda edits are retried this often when the meeting changes in between
+AGENDA_UPDATE_ATTEMPTS = 3
+
+# A login starts random coffee matching for the user at most once per this many seconds
+RANDOM_COFFEE_DEBOUNCE = int(os.environ.get("RANDOM_COFFEE_DEBOUNCE", 300))
+random_coffee_jobs = DebouncedJobs("random_coffee", RANDOM_COFFEE_DEBOUNCE)
+
+
+def get_loader() -> EntityLoader:
+    return EntityLoader(
+        users_collection, meetings_collection, groups_collection, time_slots_collection
+    )
+
+
+# ********** Startup **********
+
+
+startup_tasks = set()
+
+
+@app.on_event("startup")
+async def bootstrap_indexes():
+    # Index builds can take a while on big collections, serve requests meanwhile
+    startup_tasks.add(asyncio.create_task(indexes.bootstrap(db)))
+
+
+@app.on_event("startup")
+async def start_meeting_finisher():
+    startup_tasks.add(asyncio.create_task(meeting_finisher.run(db)))
+
+
+@app.on_event("startup")
+async def start_card_projector():
+    startup_tasks.add(asyncio.create_task(card_projector.run(db)))
+
+
+@app.on_event("startup")
+async def start_notifications():
+    notifications.start()
+
+
+@app.on_event("startup")
+async def backfill_meeting_times():
+    startup_tasks.add(asyncio.create_task(meeting_times.backfill(db)))
+
+
+@app.on_event("startup")
+async def backfill_locations():
+    startup_tasks.add(asyncio.create_task(locations.backfill(db)))
+
+
+@app.on_event("startup")
+async def backfill_agenda_ids():
+    startup_tasks.add(asyncio.create_task(agendas.backfill(db)))
+
+
+@app.on_event("startup")
+async def backfill_group_activity():
+    startup_tasks.add(asyncio.create_task(chat_messages.backfill_last_activity(db)))
+
 
 # ********** Authentification **********
 
@@ -61,6 +161,18 @@ def cmp_ids(l, r):
     return ObjectId(l) == ObjectId(r)
 
 
+def object_id(value: str, kind: str) -> ObjectId:
+    """Parses an id from the path, ids that can't exist are reported as not found."""
+    if not ObjectId.is_valid(value):
+        raise HTTPException(status_code=404, detail=f"{kind} {value} not found")
+    return ObjectId(value)
+
+
+def any_id(*values) -> dict:
+    """Matches any of the ids, whether it is stored as a string or as an ObjectId."""
+    return {"$in": [str(v) for v in values] + [ObjectId(v) for v in values]}
+
+
 @app.post(
     "/login",
     response_description="Authentificate a user",
@@ -68,40 +180,47 @@ def cmp_ids(l, r):
     status_code=status.HTTP_200_OK,
     response_model_by_alias=False,
 )
-async def login(user: schemas.LoginUserSchema = Body(...)):
-    if (user.auth_type == 'google'):
-        if (user_found := await users_collection.find_one({"email": user.email.lower()})) is None:
-            new_user = await users_collection.insert_one({'username': user.email.lower().split('@')[0], 'email': user.email})
-            user_found = await get_user(new_user.inserted_id)
-        token = auth.generateToken(schemas.AccountOut(id=str(user_found['_id']), email=user.email))
-        await random_coffee(user_found["_id"])
-        return token
-    if (
-        user_found := await users_collection.find_one({"email": user.email.lower()})
-    ) is not None:
-        user_found["id"] = user_found.pop("_id")
-        await random_coffee(user_found["id"])
-        if user.auth_type == "email":
-            if user_found.get("password") is None:
-                raise HTTPException(
-                    status_code=409, detail=f"user regisered through external service"
-                )
-            if user.password is not None:
-                if bcrypt.checkpw(user.password.encode("utf-8"), user_found["password"]):
-                    token = auth.generateToken(schemas.AccountOut(id=str(user_found['id']), email=user.email.lower()))
-                    return token
+async def login(
+    user: schemas.LoginUserSchema = Body(...),
+    loader: EntityLoader = Depends(get_loader),
+):
+    # login latency no longer includes matching, compare with the "random_coffee" timing
+    with metrics.timer("login"):
+        if (user.auth_type == 'google'):
+            if (user_found := await users_collection.find_one({"email": user.email.lower()}, LOGIN_PROJECTION)) is None:
+                new_user = await users_collection.insert_one({'username': user.email.lower().split('@')[0], 'email': user.email})
+                user_found = await loader.user(new_user.inserted_id, LOGIN_FIELDS)
+            loader.remember("user", user_found, LOGIN_FIELDS)
+            token = auth.generateToken(schemas.AccountOut(id=str(user_found['_id']), email=user.email))
+            schedule_random_coffee(user_found["_id"])
+            return token
+        if (
+            user_found := await users_collection.find_one({"email": user.email.lower()}, LOGIN_PROJECTION)
+        ) is not None:
+            loader.remember("user", user_found, LOGIN_FIELDS)
+            if user.auth_type == "email":
+                if user_found.get("password") is None:
+                    raise HTTPException(
+                        status_code=409, detail=f"user regisered through external service"
+                    )
+                if user.password is not None:
+                    if await password_hasher.check(user.password, user_found["password"]):
+                        token = auth.generateToken(schemas.AccountOut(id=str(user_found['_id']), email=user.email.lower()))
+                        schedule_random_coffee(user_found["_id"])
+                        return token
+                    else:
+                        raise HTTPException(status_code=400, detail=f"password incorrect")
                 else:
-                    raise HTTPException(status_code=400, detail=f"password incorrect")
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"No password specified, our Google/Facebook Auth got us",
+                    )
             else:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"No password specified, our Google/Facebook Auth got us",
-                )
-        else:
-            token = auth.generateToken(schemas.AccountOut(id=str(user_found['id']), email=user.email.lower()))
-            return token
+                token = auth.generateToken(schemas.AccountOut(id=str(user_found['_id']), email=user.email.lower()))
+                schedule_random_coffee(user_found["_id"])
+                return token
 
-    raise HTTPException(status_code=404, detail=f"user {user.email.lower()} not found")
+        raise HTTPException(status_code=404, detail=f"user {user.email.lower()} not found")
 
 
 @app.post(
@@ -124,8 +243,11 @@ async def refresh_token(token: schemas.RefreshTokenSchema = Body(...)):
     response_description="Get account information",
     response_model=schemas.AccountOut,
 )
-async def me(user: schemas.AuthSchema = Depends(JWTBearer())):
-    user_found = await get_user(user.id)
+async def me(
+    user: schemas.AuthSchema = Depends(JWTBearer()),
+    loader: EntityLoader = Depends(get_loader),
+):
+    user_found = await loader.user(user.id, ["email"])
     return schemas.AccountOut(id=str(user_found["_id"]), email=user_found["email"])
 
 
@@ -138,14 +260,22 @@ async def enable_notifications(
     notifications: schemas.NotificationsSchema,
     user: schemas.AuthSchema = Depends(JWTBearer()),
 ):
-    user_found = await get_user(user.id)
-    user_found["fcm_token"] = notifications.fcm_token
-    await users_collection.find_one_and_update(
-        {"_id": user_found["_id"]}, {"$set": user_found}
+    update_result = await users_collection.update_one(
+        {"_id": ObjectId(user.id)}, {"$set": {"fcm_token": notifications.fcm_token}}
     )
+    if update_result.matched_count == 0:
+        raise HTTPException(status_code=404, detail=f"user {user.id} not found")
     return {"result": "ok"}
 
 
+# ********** Metrics **********
+
+
+@app.get("/metrics", response_description="Internal service metrics")
+async def get_metrics(user: schemas.AuthSchema = Depends(JWTBearer())):
+    return FastJSONResponse(metrics.snapshot())
+
+
 # ********** Users **********
 
 
@@ -157,14 +287,12 @@ async def enable_notifications(
     response_model_by_alias=False,
 )
 async def register(user: schemas.CreateUserSchema = Body(...)):
-    existing_user = await users_collection.find_one({"email": user.email})
+    existing_user = await users_collection.find_one({"email": user.email}, {"_id": 1})
     if existing_user:
         raise HTTPException(status_code=409, detail="User already exists")
     if user.auth_type == "email":
         if user.password is not None:
-            user.password = bcrypt.hashpw(
-                user.password.encode("utf-8"), bcrypt.gensalt()
-            )
+            user.password = await password_hasher.hash(user.password)
         else:
             raise HTTPException(
                 status_code=400,
@@ -172,8 +300,11 @@ async def register(user: schemas.CreateUserSchema = Body(...)):
             )
     user_dict = user.model_dump(by_alias=True, exclude={"id"})
     user_dict["email"] = user_dict["email"].lower()
-    user_dict["fcm_token"] = "notoken"
-    new_user = await users_collection.insert_one(user_dict)
+    user_dict["fcm_token"] = NO_FCM_TOKEN
+    try:
+        new_user = await users_collection.insert_one(user_dict)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="User already exists")
     created_user = await users_collection.find_one({"_id": new_user.inserted_id})
     return created_user
 
@@ -187,17 +318,16 @@ async def register(user: schemas.CreateUserSchema = Body(...)):
 async def change_password(
     request: schemas.ChangePasswordSchema,
     user: schemas.AuthSchema = Depends(JWTBearer()),
+    loader: EntityLoader = Depends(get_loader),
 ):
-    user_found = await get_user(user.id)
+    user_found = await loader.user(user.id, ["password"])
 
-    if not bcrypt.checkpw(request.old_password.encode("utf-8"), user_found["password"]):
+    if not await password_hasher.check(request.old_password, user_found["password"]):
         raise HTTPException(status_code=403, detail="Could not change password")
 
-    user_found["password"] = bcrypt.hashpw(
-        request.new_password.encode("utf-8"), bcrypt.gensalt()
-    )
-    await users_collection.find_one_and_update(
-        {"_id": user_found["_id"]}, {"$set": user_found}
+    new_password = await password_hasher.hash(request.new_password)
+    await users_collection.update_one(
+        {"_id": user_found["_id"]}, {"$set": {"password": new_password}}
     )
     return {"result": "ok"}
 
@@ -208,8 +338,24 @@ async def change_password(
     response_model=models.UserCollection,
     response_model_by_alias=False,
 )
-async def list_users():
-    return models.UserCollection(users=await users_collection.find().to_list(1000))
+async def list_users(
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    stream: bool = False,
+):
+    cursor = users_collection.find(keyset_query(after)).sort("_id", 1)
+    if stream:
+        if limit is not None:
+            cursor = cursor.limit(limit)
+        return StreamingResponse(
+            stream_ndjson(cursor, models.UserModel), media_type="application/x-ndjson"
+        )
+
+    limit = limit or PAGE_SIZE
+    users = await cursor.limit(limit).to_list(limit)
+    return FastJSONResponse(
+        models.UserCollection(users=users, next_cursor=next_cursor(users, limit))
+    )
 
 
 @app.get(
@@ -218,8 +364,8 @@ async def list_users():
     response_model=models.UserModel,
     response_model_by_alias=False,
 )
-async def show_user(id: str):
-    user = await get_user(id)
+async def show_user(id: str, loader: EntityLoader = Depends(get_loader)):
+    user = await loader.user(id)
     if 'password' not in user:
         user["password"] = ''
     return user
@@ -231,12 +377,18 @@ async def show_user(id: str):
     response_model=models.UserModel,
     response_model_by_alias=False,
 )
-async def update_user(id: str, user: models.UpdateUserModel = Body(...)):
+async def update_user(
+    id: str,
+    user: models.UpdateUserModel = Body(...),
+    loader: EntityLoader = Depends(get_loader),
+):
     user_dict = {
         k: v for k, v in user.model_dump(by_alias=True).items() if v is not None
     }
     if user.random_coffee == {}:
         user_dict['random_coffee'] = None
+    if user.last_location is not None:
+        user_dict["location"] = locations.parse(user.last_location)
 
     if len(user_dict) >= 1:
         update_result = await users_collection.find_one_and_update(
@@ -248,27 +400,29 @@ async def update_user(id: str, user: models.UpdateUserModel = Body(...)):
             return update_result
         else:
             raise HTTPException(status_code=404, detail=f"user {id} not found")
-    existing_user = await get_user(id)
+    existing_user = await loader.user(id)
     if "password" not in existing_user:
         existing_user["password"] = ""
     return existing_user
 
 
 @app.delete("/users/{id}", response_description="Delete a user")
-async def delete_user(id: str):
-    user = await get_user(id)
-
-    user_meetings = user.get("meetings", [])
-    for meeting in user_meetings:
-        await meetings_collection.update_one(
-            {"_id": ObjectId(meeting["meeting_id"])},
-            {"$pull": {"participants": {"user_id": str(user["_id"])}}},
+async def delete_user(id: str, loader: EntityLoader = Depends(get_loader)):
+    user = await loader.user(id, ["meetings", "groups"])
+
+    # One update per collection, however many meetings and groups the user has
+    meeting_ids = [ObjectId(m["meeting_id"]) for m in user.get("meetings", [])]
+    if meeting_ids:
+        await meetings_collection.update_many(
+            {"_id": {"$in": meeting_ids}},
+            versions.bump({"$pull": {"participants": {"user_id": str(user["_id"])}}}),
         )
 
-    for group in user.get("groups", []):
-        await groups_collection.update_one(
-            {"_id": ObjectId(group["_id"])},
-            {"$pull": {"users": {"_id": str(user["_id"])}}}
+    group_ids = [ObjectId(g["_id"]) for g in user.get("groups", [])]
+    if group_ids:
+        await groups_collection.update_many(
+            {"_id": {"$in": group_ids}},
+            versions.bump({"$pull": {"users": {"_id": any_id(user["_id"])}}}),
         )
 
     await users_collection.delete_one({"_id": ObjectId(id)})
@@ -284,8 +438,11 @@ async def delete_user(id: str):
     response_model=schemas.TimeSlotCollection,
     response_model_by_alias=False,
 )
-async def list_time_slots(user: schemas.AuthSchema = Depends(JWTBearer())):
-    user_found = await get_user(user.id)
+async def list_time_slots(
+    user: schemas.AuthSchema = Depends(JWTBearer()),
+    loader: EntityLoader = Depends(get_loader),
+):
+    user_found = await loader.user(user.id, ["schedule"])
     schedule = user_found.get("schedule")
     if schedule is None:
         return schemas.TimeSlotCollection(time_slots=[])
@@ -302,8 +459,9 @@ async def list_time_slots(user: schemas.AuthSchema = Depends(JWTBearer())):
 async def create_time_slot(
     time_slot: models.TimeSlot = Body(...),
     user: schemas.AuthSchema = Depends(JWTBearer()),
+    loader: EntityLoader = Depends(get_loader),
 ):
-    user_found = await get_user(user.id)
+    user_found = await loader.user(user.id, ["schedule"])
     if not user_found.get("schedule"):
         user_found["schedule"] = []
 
@@ -327,13 +485,14 @@ async def update_time_slot(
     slot_id: str,
     time_slot: schemas.UpdateTimeSlot = Body(...),
     user: schemas.AuthSchema = Depends(JWTBearer()),
+    loader: EntityLoader = Depends(get_loader),
 ):
-    _ = await get_user(user.id)
+    _ = await loader.user(user.id, [])
     time_slot_dict = {
         k: v for k, v in time_slot.model_dump(by_alias=True, exclude={"_id"}).items() if v is not None
     }
 
-    updated_time_slot = await get_time_slot(slot_id)
+    updated_time_slot = await loader.time_slot(slot_id)
     updated_time_slot.update(time_slot_dict)
     await time_slots_collection.update_one(
         {"_id": ObjectId(slot_id)}, {"$set": updated_time_slot}
@@ -343,9 +502,11 @@ async def update_time_slot(
 
 @app.delete("/time_slots/{slot_id}", response_description="Delete a time slot")
 async def delete_time_slot(
-    slot_id: str, user: schemas.AuthSchema = Depends(JWTBearer())
+    slot_id: str,
+    user: schemas.AuthSchema = Depends(JWTBearer()),
+    loader: EntityLoader = Depends(get_loader),
 ):
-    user_found = await get_user(user.id)
+    user_found = await loader.user(user.id, [])
 
     await time_slots_collection.delete_one({"_id": ObjectId(slot_id)})
 
@@ -368,67 +529,67 @@ async def delete_time_slot(
 async def create_meeting(
     meeting: schemas.CreateMeeting = Body(...),
     user: schemas.AuthSchema = Depends(JWTBearer()),
+    loader: EntityLoader = Depends(get_loader),
 ):
-    user_found = await get_user(user.id)
+    user_found = await loader.user(user.id, [])
+    group = await loader.group(meeting.group_id, ["name", "users"])
+
     meeting_dict = meeting.model_dump(by_alias=True, exclude={"id"})
     meeting_dict["admin_id"] = str(user_found["_id"])
     meeting_dict["is_finished"] = False
     length = meeting.length if meeting.length is not None else 60
-    meeting_dict["time_slot_id"] = await isoformat_to_timeslot(meeting.start, length)
-    new_meeting = await meetings_collection.insert_one(meeting_dict)
-    created_meeting = await meetings_collection.find_one(
-        {"_id": new_meeting.inserted_id}
-    )
-    if created_meeting is None:
-        raise HTTPException(status_code=500, detail="Error creating a meeting")
-
-    group = await get_group(meeting.group_id)
-    if "meetings" not in group:
-        group["meetings"] = []
-    group["meetings"].append(get_meeting_card(created_meeting))
-    await groups_collection.find_one_and_update({"_id": group["_id"]}, {"$set": group})
-
-    created_meeting["participants"] = []
-    for group_user in group["users"]:
-        user_found = await get_user(group_user["_id"])
-        if user_found.get("meetings") is None:
-            user_found["meetings"] = []
-        user_found["meetings"].append(
+    meeting_dict["start"] = meeting_times.to_utc(meeting.start)
+    meeting_dict["end"] = meeting_times.meeting_end(meeting_dict["start"], length)
+    meeting_dict["time_slot_id"] = await create_meeting_time_slot(meeting_dict["start"], length)
+
+    # Every member is invited, the admin has accepted already
+    member_ids = [str(u["_id"]) for u in group["users"]]
+    members = await loader.users(member_ids, ["username", "fcm_token"])
+    meeting_dict["participants"] = []
+    for member_id in member_ids:
+        if member_id not in members:
+            continue
+        meeting_dict["participants"].append(
             {
-                "meeting_id": str(created_meeting["_id"]),
+                "user_id": member_id,
+                "username": members[member_id]["username"],
                 "status": (
-                    models.MeetingStatus.needs_acceptance.value
-                    if str(user_found["_id"]) != user.id
-                    else models.MeetingStatus.accepted.value
+                    models.MeetingStatus.accepted.value
+                    if member_id == user.id
+                    else models.MeetingStatus.needs_acceptance.value
                 ),
             }
         )
-        await users_collection.update_one(
-            {"_id": user_found["_id"]}, {"$set": {"meetings": user_found["meetings"]}}
-        )
+    await meetings_collection.insert_one(meeting_dict)
+    meeting_id = str(meeting_dict["_id"])
 
-        created_meeting["participants"].append(
-            {
-                "user_id": str(user_found["_id"]),
-                "username": user_found["username"],
-                "status": (
-                    models.MeetingStatus.needs_acceptance.value
-                    if str(user_found["_id"]) != user.id
-                    else models.MeetingStatus.accepted.value
-                ),
-            }
+    await groups_collection.update_one(
+        {"_id": group["_id"]},
+        versions.bump({"$push": {"meetings": get_meeting_card(meeting_dict)}}, activity=True),
+    )
+    invites = [
+        UpdateMany(
+            {"_id": {"$in": [m["_id"] for m in members.values() if str(m["_id"]) != user.id]}},
+            {"$push": {"meetings": {"meeting_id": meeting_id, "status": models.MeetingStatus.needs_acceptance.value}}},
+        )
+    ]
+    if user.id in members:
+        invites.append(
+            UpdateOne(
+                {"_id": members[user.id]["_id"]},
+                {"$push": {"meetings": {"meeting_id": meeting_id, "status": models.MeetingStatus.accepted.value}}},
+            )
         )
-        notify_single_user(
-            user_found["fcm_token"],
+    await users_collection.bulk_write(invites, ordered=False)
+
+    for member in members.values():
+        notifications.notify(
+            member.get("fcm_token"),
             "Meeting Invitation",
-            f"Join the meeting {created_meeting['title']} with group {group['name']}, time: {created_meeting['start']}",
+            f"Join the meeting {meeting_dict['title']} with group {group['name']}, time: {meeting_dict['start']}",
         )
 
-    await meetings_collection.update_one(
-        {"_id": created_meeting["_id"]},
-        {"$set": {"participants": created_meeting["participants"]}},
-    )
-    return created_meeting
+    return meeting_dict
 
 
 @app.get(
@@ -437,23 +598,31 @@ async def create_meeting(
     response_model=schemas.MeetingCollection,
     response_model_by_alias=False,
 )
-async def list_meetings():
-    meetings = await meetings_collection.find().to_list(1000)
+async def list_meetings(
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    stream: bool = False,
+    loader: EntityLoader = Depends(get_loader),
+):
+    cursor = meetings_collection.find(keyset_query(after)).sort("_id", 1)
+    if stream:
+        if limit is not None:
+            cursor = cursor.limit(limit)
+        return StreamingResponse(
+            # A loader per batch, so users seen in earlier batches are not kept in memory
+            stream_ndjson(cursor, models.MeetingModel, lambda batch: hydrate_participants(batch, get_loader())),
+            media_type="application/x-ndjson",
+        )
 
-    updated_meetings = []
-    for meeting in meetings:
-        participants = []
-        for meeting_participant in meeting["participants"]:
-            participant_user = await get_user(str(meeting_participant["user_id"]))
-            participant = models.Participant(
-                user_id=str(participant_user["_id"]),
-                username=participant_user["username"],
-                status=meeting_participant["status"],
-            )
-            participants.append(participant)
-        meeting["participants"] = participants
-        updated_meetings.append(meeting)
-    return schemas.MeetingCollection(meetings=updated_meetings)
+    limit = limit or PAGE_SIZE
+    meetings = await cursor.limit(limit).to_list(limit)
+    await hydrate_participants(meetings, loader)
+    return FastJSONResponse(
+        schemas.MeetingCollection(
+            meetings=meetings,
+            next_cursor=next_cursor(meetings, limit),
+        )
+    )
 
 
 @app.get(
@@ -462,27 +631,63 @@ async def list_meetings():
     response_model=schemas.MeetingTileCollection,
     response_model_by_alias=False,
 )
-async def list_user_meetings(user: schemas.AuthSchema = Depends(JWTBearer())):
-    user_found = await get_user(user.id)
-    meeting_invites = user_found.get("meetings", [])
+async def list_user_meetings(
+    invite_status: Optional[models.MeetingStatus] = Query(None, alias="status"),
+    start_from: Optional[datetime.datetime] = Query(None, alias="from"),
+    start_to: Optional[datetime.datetime] = Query(None, alias="to"),
+    upcoming: bool = False,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    user: schemas.AuthSchema = Depends(JWTBearer()),
+    loader: EntityLoader = Depends(get_loader),
+):
+    user_found = await loader.user(user.id, ["meetings"])
+    statuses = {
+        invite["meeting_id"]: invite["status"]
+        for invite in user_found.get("meetings", [])
+        if invite_status is None or invite["status"] == invite_status.value
+    }
+    if not statuses:
+        return schemas.MeetingTileCollection(meetings=[])
+
+    match = {
+        "_id": {"$in": [ObjectId(meeting_id) for meeting_id in statuses]},
+        **meeting_times.start_range(start_from, start_to),
+    }
+    if upcoming:
+        match["end"] = {"$gt": datetime.datetime.now(datetime.UTC)}
+
+    pipeline = [{"$match": match}, {"$sort": {"start": 1}}]
+    if limit is not None:
+        pipeline.append({"$limit": limit})
+    pipeline += [
+        {
+            "$lookup": {
+                "from": groups_collection.name,
+                "let": {"group_id": {"$toObjectId": "$group_id"}},
+                "pipeline": [
+                    {"$match": {"$expr": {"$eq": ["$_id", "$$group_id"]}}},
+                    {"$project": {"name": 1}},
+                ],
+                "as": "group",
+            }
+        },
+        {"$unwind": "$group"},
+        {"$project": {**MEETING_TILE_PROJECTION, "group": 1}},
+    ]
+
     meetings = []
-    for invite in meeting_invites:
-        meeting = await meetings_collection.find_one(
-            {"_id": ObjectId(invite["meeting_id"])}
-        )
-        if meeting is not None:
-            group = await get_group(meeting["group_id"])
-            meeting_tile = models.MeetingTile(
+    async for meeting in meetings_collection.aggregate(pipeline):
+        meetings.append(
+            models.MeetingTile(
                 id=str(meeting["_id"]),
                 title=meeting["title"],
                 start=meeting["start"],
                 length=meeting["length"],
-                group=models.GroupCardModel(_id=group["_id"], name=group["name"]),
-                status=invite["status"],
+                group=models.GroupCardModel(_id=meeting["group"]["_id"], name=meeting["group"]["name"]),
+                status=statuses[str(meeting["_id"])],
                 is_finished=meeting["is_finished"],
             )
-            meetings.append(meeting_tile)
-            await try_finish_meeting(meeting)
+        )
 
     return schemas.MeetingTileCollection(meetings=meetings)
 
@@ -493,24 +698,10 @@ async def list_user_meetings(user: schemas.AuthSchema = Depends(JWTBearer())):
     response_model=models.MeetingModel,
     response_model_by_alias=False,
 )
-async def show_meeting(id: str):
-    if (
-        meeting := await meetings_collection.find_one({"_id": ObjectId(id)})
-    ) is not None:
-
-        participants = []
-        for meeting_participant in meeting["participants"]:
-            participant_user = await get_user(str(meeting_participant["user_id"]))
-            participant = models.Participant(
-                user_id=str(participant_user["_id"]),
-                username=participant_user["username"],
-                status=meeting_participant["status"],
-            )
-            participants.append(participant)
-        meeting["participants"] = participants
-        return meeting
-
-    raise HTTPException(status_code=404, detail=f"meeting {id} not found")
+async def show_meeting(id: str, loader: EntityLoader = Depends(get_loader)):
+    meeting = await loader.meeting(id)
+    await hydrate_participants([meeting], loader)
+    return meeting
 
 
 @app.get(
@@ -520,30 +711,45 @@ async def show_meeting(id: str):
     response_model_by_alias=False,
 )
 async def show_meeting_details(
-    id: str, user: schemas.AuthSchema = Depends(JWTBearer())
+    id: str,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    user: schemas.AuthSchema = Depends(JWTBearer()),
+    loader: EntityLoader = Depends(get_loader),
 ):
-    user_found = await get_user(user.id)
-    meeting = await get_meeting(id)
-
-    meeting_participants = meeting.get("participants", [])
-    participants = []
-    for meeting_participant in meeting_participants:
-        participant_user = await get_user(str(meeting_participant["user_id"]))
-        participant = schemas.ParticipantSchema(
-            user_id=str(participant_user["_id"]),
-            user_username=participant_user["username"],
-            status=meeting_participant["status"],
+    # Participant statuses are part of the meeting, the user's status too. Names are read
+    # from the users and the group, the tag covers the fields shown instead of their versions.
+    meeting = await loader.meeting(id, ["group_id", "admin_id", "participants", "version"])
+    group, users = await asyncio.gather(
+        loader.group(meeting["group_id"], ["name"]),
+        loader.users([p["user_id"] for p in meeting["participants"]] + [meeting["admin_id"]], ["username"]),
+    )
+    tag = versions.etag(
+        user.id, versions.version(meeting), group["name"], sorted((i, u["username"]) for i, u in users.items())
+    )
+    if versions.matches(if_none_match, tag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": tag})
+    response.headers["ETag"] = tag
+
+    user_found = await loader.user(user.id, ["meetings"])
+    meeting = await loader.meeting(id)
+    # The users are loaded already
+    users = await hydrate_participants([meeting], loader)
+    participants = [
+        schemas.ParticipantSchema(
+            user_id=p.user_id, user_username=p.username, status=p.status.value
         )
-        participants.append(participant)
+        for p in meeting["participants"]
+    ]
 
-    admin_user = await get_user(str(meeting["admin_id"]))
+    if (admin_user := users.get(str(meeting["admin_id"]))) is None:
+        raise HTTPException(status_code=404, detail=f"user {meeting['admin_id']} not found")
     admin = schemas.ParticipantSchema(
         user_id=str(admin_user["_id"]),
         user_username=admin_user["username"],
         status=models.MeetingStatus.accepted.value,
     )
 
-    group = await get_group(meeting["group_id"])
     meeting_invites = user_found.get("meetings", [])
     for invite in meeting_invites:
         if invite["meeting_id"] == id:
@@ -576,14 +782,15 @@ async def change_participant_status(
     id: str,
     participant: schemas.UpdateParticipantStatus = Body(...),
     user: schemas.AuthSchema = Depends(JWTBearer()),
+    loader: EntityLoader = Depends(get_loader),
 ):
-    _ = await get_user(user.id)
-    await get_user(participant.user_id)
-    await get_meeting(id)
+    _ = await loader.user(user.id, [])
+    await loader.user(participant.user_id, [])
+    await loader.meeting(id, [])
 
     check_status(participant.status)
-    await meeting_in_user(participant.user_id, id, participant.status)
-    await participant_in_meeting(participant.user_id, id, participant.status)
+    await meeting_in_user(participant.user_id, id, participant.status, loader)
+    await participant_in_meeting(participant.user_id, id, participant.status, loader)
     return schemas.ParticipantInviteSchema(
         meeting_id=id, user_id=participant.user_id, status=participant.status
     )
@@ -595,13 +802,19 @@ async def change_participant_status(
     response_model=schemas.ParticipantInviteSchema,
     response_model_by_alias=False,
 )
-async def invite(id: str, user: schemas.AuthSchema = Depends(JWTBearer())):
-    await get_user(user.id)
-    await get_meeting(id)
+async def invite(
+    id: str,
+    user: schemas.AuthSchema = Depends(JWTBearer()),
+    loader: EntityLoader = Depends(get_loader),
+):
+    await loader.user(user.id, [])
+    await loader.meeting(id, [])
     await participant_in_meeting(
-        user.id, id, models.MeetingStatus.needs_acceptance.value
+        user.id, id, models.MeetingStatus.needs_acceptance.value, loader
+    )
+    await meeting_in_user(
+        user.id, id, models.MeetingStatus.needs_acceptance.value, loader
     )
-    await meeting_in_user(user.id, id, models.MeetingStatus.needs_acceptance.value)
     return schemas.ParticipantInviteSchema(
         meeting_id=id,
         user_id=user.id,
@@ -619,12 +832,13 @@ async def change_invite_status(
     id: str,
     status: schemas.UpdateMeetingStatus = Body(...),
     user: schemas.AuthSchema = Depends(JWTBearer()),
+    loader: EntityLoader = Depends(get_loader),
 ):
     check_status(status.status)
-    await get_user(user.id)
-    await get_meeting(id)
-    await meeting_in_user(user.id, id, status.status)
-    await participant_in_meeting(user.id, id, status.status)
+    await loader.user(user.id, [])
+    await loader.meeting(id, [])
+    await meeting_in_user(user.id, id, status.status, loader)
+    await participant_in_meeting(user.id, id, status.status, loader)
     return models.MeetingInvite(meeting_id=id, status=status.status)
 
 
@@ -634,54 +848,80 @@ async def change_invite_status(
     response_model=models.MeetingModel,
     response_model_by_alias=False,
 )
-async def update_meeting(id: str, meeting: schemas.UpdateMeeting = Body(...)):
+async def update_meeting(
+    id: str,
+    meeting: schemas.UpdateMeeting = Body(...),
+    loader: EntityLoader = Depends(get_loader),
+):
     meeting_dict = {
         k: v for k, v in meeting.model_dump(by_alias=True).items() if v is not None
     }
 
     if len(meeting_dict) >= 1:
-        meeting_found = await get_meeting(id)
-        group = await get_group(meeting_found["group_id"])
-        for i, invite in enumerate(group["meetings"]):
-            if invite["_id"] == id:
-                invite.update(meeting_dict)
-                group["meetings"][i] = invite
-                break
-        await groups_collection.find_one_and_update(
-            {"_id": group["_id"]}, {"$set": group}
+        meeting_found = await loader.meeting(
+            id, ["group_id", "title", "start", "length", "participants", "time_slot_id"]
         )
-
-        updated_meeting = meeting_found.copy()
-        updated_meeting.update(meeting_dict)
-        for i, u in enumerate(meeting_found["participants"]):
-            user = await get_user(u["user_id"])
-            for j, invite in enumerate(user["meetings"]):
-                if cmp_ids(invite["meeting_id"], id):
-                    invite.update(meeting_dict)
-                    user["meetings"][j] = invite
-                    if meeting_dict.get('is_finished', False) and meeting_found["participants"][i]["status"] == models.MeetingStatus.needs_acceptance:
-                        user["meetings"][j]["status"] = models.MeetingStatus.declined
-                    break
-            await users_collection.find_one_and_update(
-                {"_id": user["_id"]}, {"$set": user}
-            )
-
-            if meeting_dict.get('is_finished', False) and meeting_found["participants"][i]["status"] == models.MeetingStatus.needs_acceptance:
-                updated_meeting["participants"][i]["status"] = models.MeetingStatus.declined
-            notify_single_user(
-                user["fcm_token"],
+        group = await loader.group(meeting_found["group_id"], ["name"])
+
+        if "start" in meeting_dict:
+            # Compared with the stored start below, so with the same precision
+            meeting_dict["start"] = meeting_times.to_bson(meeting_dict["start"])
+        try:
+            stored_start = meeting_times.to_utc(meeting_found["start"])
+        except ValueError:
+            # Legacy start the backfill couldn't convert, only a new start fixes the meeting
+            if "start" not in meeting_dict:
+                raise HTTPException(
+                    status_code=409,
+                    detail=f"meeting {id} has an invalid start time {meeting_found['start']!r}, send a new start",
+                )
+            stored_start = None
+        # The group's meeting card is updated by the card projector
+
+        meeting_update = dict(meeting_dict)
+        array_filters = None
+        if meeting_dict.get("is_finished", False):
+            # Invitations nobody answered are declined once the meeting is over
+            pending_ids = [
+                ObjectId(p["user_id"])
+                for p in meeting_found["participants"]
+                if p["status"] == models.MeetingStatus.needs_acceptance.value
+            ]
+            if pending_ids:
+                await users_collection.update_many(
+                    {"_id": {"$in": pending_ids}},
+                    {"$set": {"meetings.$[invite].status": models.MeetingStatus.declined.value}},
+                    array_filters=[
+                        {
+                            "invite.meeting_id": any_id(id),
+                            "invite.status": models.MeetingStatus.needs_acceptance.value,
+                        }
+                    ],
+                )
+            meeting_update["participants.$[pending].status"] = models.MeetingStatus.declined.value
+            array_filters = [{"pending.status": models.MeetingStatus.needs_acceptance.value}]
+
+        title = meeting_dict.get("title", meeting_found["title"])
+        start = meeting_dict.get("start", stored_start)
+        length = meeting_dict.get("length", meeting_found["length"])
+        participants = await loader.users([p["user_id"] for p in meeting_found["participants"]], ["fcm_token"])
+        for participant in participants.values():
+            notifications.notify(
+                participant.get("fcm_token"),
                 "Meeting Update",
-                f"The meeting {updated_meeting['title']} with group {group['name']}, time: {updated_meeting['start']}, just got updated.",
+                f"The meeting {title} with group {group['name']}, time: {start}, just got updated.",
             )
 
-        length = meeting.length if meeting.length is not None else meeting_found['length']
-        start = meeting.start if meeting.start else meeting_found['start']
-        await time_slots_collection.find_one_and_delete({"_id": ObjectId(meeting_found['time_slot_id'])})
-        updated_meeting["time_slot_id"] = await isoformat_to_timeslot(start, length)
+        if start != stored_start or length != meeting_found["length"]:
+            meeting_update["end"] = meeting_times.meeting_end(start, length)
+            meeting_update["time_slot_id"] = await move_meeting_time_slot(
+                meeting_found.get("time_slot_id"), start, length
+            )
 
         update_result = await meetings_collection.find_one_and_update(
             {"_id": ObjectId(id)},
-            {"$set": updated_meeting},
+            versions.bump({"$set": meeting_update}),
+            array_filters=array_filters,
             return_document=ReturnDocument.AFTER,
         )
         if update_result is not None:
@@ -689,62 +929,54 @@ async def update_meeting(id: str, meeting: schemas.UpdateMeeting = Body(...)):
         else:
             raise HTTPException(status_code=404, detail=f"meeting {id} not found")
 
-    if (
-        existing_meeting := await meetings_collection.find_one({"_id": id})
-    ) is not None:
-        return existing_meeting
-
-    raise HTTPException(status_code=404, detail=f"meeting {id} not found")
+    return await loader.meeting(id)
 
 
 @app.delete("/meetings/{id}", response_description="Delete a meeting")
-async def delete_meeting(id: str):
-    meeting = await get_meeting(id)
-    group = await get_group(meeting["group_id"])
+async def delete_meeting(id: str, loader: EntityLoader = Depends(get_loader)):
+    meeting = await loader.meeting(
+        id, ["group_id", "title", "start", "participants", "time_slot_id"]
+    )
+    group, participants = await asyncio.gather(
+        loader.group(meeting["group_id"], ["name"]),
+        loader.users([p["user_id"] for p in meeting["participants"]], ["fcm_token"]),
+    )
 
-    meetings = []
-    for m in group["meetings"]:
-        if m["_id"] != id:
-            meetings.append(m)
-    group["meetings"] = meetings
-    await groups_collection.find_one_and_update({"_id": group["_id"]}, {"$set": group})
-
-    for u in meeting["participants"]:
-        user = await get_user(u["user_id"])
-        meetings = []
-        for invite in user["meetings"]:
-            if invite["meeting_id"] != id:
-                meetings.append(invite)
-        user["meetings"] = meetings
-        await users_collection.find_one_and_update({"_id": user["_id"]}, {"$set": user})
-        notify_single_user(
-            user["fcm_token"],
+    # One write per collection, however many participants the meeting has
+    cascade = [
+        meetings_collection.delete_one({"_id": ObjectId(id)}),
+        groups_collection.update_one(
+            {"_id": group["_id"]}, versions.bump({"$pull": {"meetings": {"_id": any_id(id)}}})
+        ),
+        users_collection.update_many(
+            {"meetings.meeting_id": any_id(id)}, {"$pull": {"meetings": {"meeting_id": any_id(id)}}}
+        ),
+    ]
+    if meeting.get("time_slot_id") is not None:
+        cascade.append(time_slots_collection.delete_one({"_id": ObjectId(meeting["time_slot_id"])}))
+    delete_result, *_ = await asyncio.gather(*cascade)
+    if delete_result.deleted_count == 0:
+        raise HTTPException(status_code=404, detail=f"meeting {id} not found")
+
+    for participant in participants.values():
+        notifications.notify(
+            participant.get("fcm_token"),
             "Meeting Cancelled",
             f"The meeting {meeting['title']} with group {group['name']}, time: {meeting['start']}, was cancelled.",
         )
-
-    delete_result = await meetings_collection.delete_one({"_id": ObjectId(id)})
-    await time_slots_collection.find_one_and_delete({"_id": ObjectId(meeting["time_slot_id"])})
-
-    if delete_result.deleted_count == 1:
-        return Response(status_code=status.HTTP_204_NO_CONTENT)
-
-    raise HTTPException(status_code=404, detail=f"meeting {id} not found")
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
 @app.post("/meetings/{id}/suggest_location", response_description="Suggestion offline location for a meeting")
-async def suggest_meeting_location(id: str):
-    locations = []
-    meeting = await get_meeting(id)
-
-    for u in meeting["participants"]:
-        user = await get_user(u["user_id"])
-        if "last_location" in user:
-            lat, lon = map(float, user["last_location"].split(","))
-            locations.append((lat, lon))
-    if len(locations) == 0:
+async def suggest_meeting_location(id: str, loader: EntityLoader = Depends(get_loader)):
+    meeting = await loader.meeting(id, ["participants"])
+    users = await loader.users(
+        [p["user_id"] for p in meeting["participants"]], ["location", "last_location"]
+    )
+    points = [point for user in users.values() if (point := locations.point_of(user)) is not None]
+    if len(points) == 0:
         raise HTTPException(status_code=404, detail=f"No user locations available to pick a meeting spot")
-    point = ','.join(map(str, [sum(x)/len(x) for x in zip(*locations)]))
+    point = ','.join(map(str, locations.centroid(points)))
     return {"link": f"https://www.google.com/maps/search/cafe/@{point},16z"}
 
 
@@ -757,9 +989,13 @@ async def suggest_meeting_location(id: str):
     response_model=schemas.AgendaPointCollection,
     response_model_by_alias=False,
 )
-async def list_agenda(id: str, user: schemas.AuthSchema = Depends(JWTBearer())):
-    _ = await get_user(user.id)
-    meeting = await get_meeting(id)
+async def list_agenda(
+    id: str,
+    user: schemas.AuthSchema = Depends(JWTBearer()),
+    loader: EntityLoader = Depends(get_loader),
+):
+    _ = await loader.user(user.id, [])
+    meeting = await loader.meeting(id, ["agenda"])
 
     if "agenda" not in meeting:
         return schemas.AgendaPointCollection(agenda=[])
@@ -777,19 +1013,19 @@ async def create_agenda_point(
     id: str,
     agenda_point: schemas.CreateAgendaPoint = Body(...),
     user: schemas.AuthSchema = Depends(JWTBearer()),
+    loader: EntityLoader = Depends(get_loader),
 ):
-    _ = await get_user(user.id)
-    meeting = await get_meeting(id)
-
-    if "agenda" not in meeting:
-        meeting["agenda"] = []
-
-    new_agenda_point = agenda_point.model_dump(by_alias=True)
-    meeting["agenda"].append(new_agenda_point)
-
-    await meetings_collection.update_one(
-        {"_id": meeting["_id"]}, {"$set": {"agenda": meeting["agenda"]}}
+    _ = await loader.user(user.id, [])
+
+    new_agenda_point = agendas.new_point(agenda_point.text, agenda_point.level)
+    push = {"$each": [new_agenda_point]}
+    if agenda_point.position is not None:
+        push["$position"] = agenda_point.position
+    result = await meetings_collection.update_one(
+        {"_id": ObjectId(id)}, versions.bump({"$push": {"agenda": push}})
     )
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail=f"meeting {id} not found")
     return new_agenda_point
 
 
@@ -801,38 +1037,100 @@ async def create_agenda_point(
 )
 async def update_agenda(
     id: str,
-    agenda: schemas.AgendaPointCollection = Body(...),
+    update: schemas.UpdateAgenda = Body(...),
     user: schemas.AuthSchema = Depends(JWTBearer()),
+    loader: EntityLoader = Depends(get_loader),
 ):
-    _ = await get_user(user.id)
-    meeting = await get_meeting(id)
+    _ = await loader.user(user.id, [])
 
-    _ = await meetings_collection.update_one(
-        {"_id": ObjectId(meeting["_id"])},
-        {"$set": {"agenda": agenda.model_dump()["agenda"]}},
-    )
+    if update.ops is None:
+        agenda = [p.model_dump(by_alias=True) for p in update.agenda]
+        meeting = await meetings_collection.find_one_and_update(
+            {"_id": ObjectId(id)},
+            versions.bump({"$set": {"agenda": agendas.with_ids(agenda)}}),
+            projection={"agenda": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        if meeting is None:
+            raise HTTPException(status_code=404, detail=f"meeting {id} not found")
+        return schemas.AgendaPointCollection(agenda=meeting["agenda"])
+
+    ops = [op.model_dump() for op in update.ops]
+    for _ in range(AGENDA_UPDATE_ATTEMPTS):
+        meeting = await loader.meeting(id, ["agenda", "version"])
+        try:
+            agenda = agendas.apply_ops(meeting.get("agenda", []), ops)
+        except KeyError as e:
+            raise HTTPException(status_code=404, detail=f"agenda point {e.args[0]} not found")
+
+        # Only applies if nobody changed the meeting since it was read
+        meeting = await meetings_collection.find_one_and_update(
+            {"_id": meeting["_id"], "version": meeting.get("version", {"$exists": False})},
+            versions.bump({"$set": {"agenda": agenda}}),
+            projection={"agenda": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        if meeting is not None:
+            return schemas.AgendaPointCollection(agenda=meeting["agenda"])
+        loader.forget("meeting", id)
+        metrics.incr("agenda.conflicts")
 
-    meeting = await get_meeting(id)
-    return schemas.AgendaPointCollection(agenda=meeting["agenda"])
+    raise HTTPException(status_code=409, detail=f"meeting {id} is changing too often, try again")
+
+
+@app.patch(
+    "/meetings/{id}/agenda/{point_id}",
+    response_description="Update an agenda point",
+    response_model=models.AgendaPoint,
+    response_model_by_alias=False,
+)
+async def update_agenda_point(
+    id: str,
+    point_id: str,
+    agenda_point: schemas.UpdateAgendaPoint = Body(...),
+    user: schemas.AuthSchema = Depends(JWTBearer()),
+    loader: EntityLoader = Depends(get_loader),
+):
+    _ = await loader.user(user.id, [])
+    point_update = {
+        f"agenda.$.{k}": v for k, v in agenda_point.model_dump().items() if v is not None
+    }
+
+    point_oid = object_id(point_id, "agenda point")
+    query = {"_id": object_id(id, "meeting"), "agenda._id": point_oid}
+    projection = {"agenda": {"$elemMatch": {"_id": point_oid}}}
+    if point_update:
+        meeting = await meetings_collection.find_one_and_update(
+            query,
+            versions.bump({"$set": point_update}),
+            projection=projection,
+            return_document=ReturnDocument.AFTER,
+        )
+    else:
+        meeting = await meetings_collection.find_one(query, projection)
+    if meeting is None:
+        raise HTTPException(status_code=404, detail=f"agenda point {point_id} not found")
+    return meeting["agenda"][0]
 
 
 @app.delete(
     "/meetings/{id}/agenda/{point_id}", response_description="Delete an agenda point"
 )
 async def delete_agenda_point(
-    id: str, point_id: int, user: schemas.AuthSchema = Depends(JWTBearer())
+    id: str,
+    point_id: str,
+    user: schemas.AuthSchema = Depends(JWTBearer()),
+    loader: EntityLoader = Depends(get_loader),
 ):
-    _ = await get_user(user.id)
-    meeting = await get_meeting(id)
+    _ = await loader.user(user.id, [])
 
-    if point_id < 0 or point_id >= len(meeting["agenda"]):
-        raise HTTPException(status_code=404, detail=f"agenda_point {id} not found")
-    agenda = meeting["agenda"]
-    agenda.pop(point_id)
-
-    _ = await meetings_collection.update_one(
-        {"_id": ObjectId(meeting["_id"])}, {"$set": {"agenda": agenda}}
+    point_oid = object_id(point_id, "agenda point")
+    result = await meetings_collection.update_one(
+        {"_id": object_id(id, "meeting"), "agenda._id": point_oid},
+        versions.bump({"$pull": {"agenda": {"_id": point_oid}}}),
     )
+    if result.modified_count == 0:
+        raise HTTPException(status_code=404, detail=f"agenda point {point_id} not found")
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
@@ -849,25 +1147,22 @@ async def delete_agenda_point(
 async def create_group(
     group: schemas.CreateGroupSchema = Body(...),
     user: schemas.AuthSchema = Depends(JWTBearer()),
+    loader: EntityLoader = Depends(get_loader),
 ):
-    user_found = await get_user(user.id)
+    user_found = await loader.user(user.id, ["username"])
     user_card = get_user_card(user_found)
 
     group_dict = group.model_dump(by_alias=True, exclude={"id"})
     group_dict["admin"] = user_card
     group_dict["users"] = [user_card]
-    group_dict["chat_messages"] = "[]"
-
-    new_group = await groups_collection.insert_one(group_dict)
-    created_group = await groups_collection.find_one({"_id": new_group.inserted_id})
-
-    group_card = get_group_card(created_group)
-    if "groups" not in user_found:
-        user_found["groups"] = []
-    user_found["groups"].append(group_card)
+    group_dict["last_activity"] = datetime.datetime.now(datetime.UTC)
 
-    await users_collection.update_one({"_id": user_found["_id"]}, {"$set": user_found})
-    return created_group
+    # insert_one sets the generated _id on group_dict
+    await groups_collection.insert_one(group_dict)
+    await users_collection.update_one(
+        {"_id": user_found["_id"]}, {"$push": {"groups": get_group_card(group_dict)}}
+    )
+    return group_dict
 
 
 @app.get(
@@ -876,15 +1171,57 @@ async def create_group(
     response_model=models.GroupCollection,
     response_model_by_alias=False,
 )
-async def list_groups(user: schemas.AuthSchema = Depends(JWTBearer())):
-    user_found = await get_user(user.id)
+async def list_groups(
+    user: schemas.AuthSchema = Depends(JWTBearer()),
+    loader: EntityLoader = Depends(get_loader),
+):
+    user_found = await loader.user(user.id, ["groups"])
     user_groups = user_found.get("groups", [])
     if not user_groups:
         return models.GroupCollection(groups=[])
 
     group_ids = [ObjectId(group["_id"]) for group in user_groups]
-    return models.GroupCollection(
-        groups=await groups_collection.find({"_id": {"$in": group_ids}}).to_list(100)
+    return FastJSONResponse(
+        models.GroupCollection(
+            # Chat histories are read through GET /groups/{id}/messages
+            groups=await groups_collection.find({"_id": {"$in": group_ids}}, {"chat_messages": 0}).to_list(None)
+        )
+    )
+
+
+@app.get(
+    "/groups/cards",
+    response_description="List the groups of the user without their content",
+    response_model=models.GroupSummaryCollection,
+    response_model_by_alias=False,
+)
+async def list_group_cards(
+    after: Optional[str] = Query(None, description="Cursor returned by the previous page"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    user: schemas.AuthSchema = Depends(JWTBearer()),
+    loader: EntityLoader = Depends(get_loader),
+):
+    user_found = await loader.user(user.id, ["groups"])
+    group_ids = [ObjectId(group["_id"]) for group in user_found.get("groups", [])]
+    if not group_ids:
+        return models.GroupSummaryCollection(groups=[])
+
+    limit = limit or PAGE_SIZE
+    query = {"_id": {"$in": group_ids}}
+    if after is not None:
+        query = {"$and": [query, cursors.older("last_activity", decode_cursor(after), nullable=True)]}
+    groups = await groups_collection.aggregate(
+        [
+            {"$match": query},
+            {"$sort": {"last_activity": -1, "_id": -1}},
+            {"$limit": limit},
+            {"$project": GROUP_SUMMARY_PROJECTION},
+        ]
+    ).to_list(limit)
+    return FastJSONResponse(
+        models.GroupSummaryCollection(
+            groups=groups, next_cursor=cursors.next_cursor(groups, limit, "last_activity")
+        )
     )
 
 
@@ -894,15 +1231,39 @@ async def list_groups(user: schemas.AuthSchema = Depends(JWTBearer())):
     response_model=models.GroupModel,
     response_model_by_alias=False,
 )
-async def show_group(id: str, user: schemas.AuthSchema = Depends(JWTBearer())):
-    _ = await get_user(user.id)
-    if (group := await groups_collection.find_one({"_id": ObjectId(id)})) is not None:
-        group["admin"] = get_user_card(await get_user(group["admin"]["_id"]))
-        group["users"] = [get_user_card(await get_user(u["_id"])) for u in group["users"]]
-        group["meetings"] = [get_meeting_card(await get_meeting(m["_id"])) for m in group.get("meetings", [])]
-        return group
-
-    raise HTTPException(status_code=404, detail=f"group {id} not found")
+async def show_group(
+    id: str,
+    chat: bool = Query(True, description="Include chat_messages, the history can be large"),
+    if_none_match: Optional[str] = Header(None),
+    user: schemas.AuthSchema = Depends(JWTBearer()),
+    loader: EntityLoader = Depends(get_loader),
+):
+    _ = await loader.user(user.id, [])
+    group = await loader.group(id, GROUP_FIELDS + ["version"])
+    # Names are read from the members and meetings themselves, the stored cards may lag behind
+    members, meetings = await asyncio.gather(
+        loader.users([group["admin"]["_id"]] + [u["_id"] for u in group["users"]], ["username"]),
+        loader.meetings([m["_id"] for m in group.get("meetings", [])], MEETING_CARD_FIELDS + ["version"]),
+    )
+    # Sending a chat message bumps the group version too
+    tag = versions.etag(
+        versions.version(group),
+        chat,
+        sorted((i, u["username"]) for i, u in members.items()),
+        sorted((i, versions.version(m)) for i, m in meetings.items()),
+    )
+    if versions.matches(if_none_match, tag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": tag})
+
+    if chat:
+        # Migrates a legacy history on its first full read
+        group["chat_messages"] = chat_messages.to_array(await chat_messages.history(db, id))
+    group["admin"] = get_user_card(members.get(str(group["admin"]["_id"]), group["admin"]))
+    group["users"] = [get_user_card(members.get(str(u["_id"]), u)) for u in group["users"]]
+    group["meetings"] = [
+        get_meeting_card(meetings[str(m["_id"])]) for m in group.get("meetings", []) if str(m["_id"]) in meetings
+    ]
+    return FastJSONResponse(models.GroupModel.model_validate(group), headers={"ETag": tag})
 
 
 @app.patch(
@@ -915,8 +1276,9 @@ async def update_group(
     id: str,
     group: models.UpdateGroupModel = Body(...),
     user: schemas.AuthSchema = Depends(JWTBearer()),
+    loader: EntityLoader = Depends(get_loader),
 ):
-    _ = await get_user(user.id)
+    _ = await loader.user(user.id, [])
     group_dict = {
         k: v for k, v in group.model_dump(by_alias=True).items() if v is not None
     }
@@ -924,7 +1286,7 @@ async def update_group(
     if len(group_dict) >= 1:
         update_result = await groups_collection.find_one_and_update(
             {"_id": ObjectId(id)},
-            {"$set": group_dict},
+            versions.bump({"$set": group_dict}),
             return_document=ReturnDocument.AFTER,
         )
         if update_result is not None:
@@ -939,32 +1301,23 @@ async def update_group(
 
 
 @app.delete("/groups/{id}", response_description="Delete a group")
-async def delete_group(id: str, user: schemas.AuthSchema = Depends(JWTBearer())):
-    _ = await get_user(user.id)
-    group = await get_group(id)
-
-    if "meetings" in group:
-        meeting_ids_to_delete = [m["_id"] for m in await meetings_collection.find({"group_id": id}, {"_id"}).to_list(1000)]
-        await meetings_collection.delete_many({"_id": {"$in": meeting_ids_to_delete}})
-
-        meeting_ids_to_delete = set(meeting_ids_to_delete)
-        for u in group["users"]:
-            found_user = await get_user(u["_id"])
-            new_meetings = []
-            for invite in found_user["meetings"]:
-                if ObjectId(invite["meeting_id"]) in meeting_ids_to_delete:
-                    continue
-                new_meetings.append(invite)
-            found_user["meetings"] = new_meetings
-            await users_collection.find_one_and_update({"_id": found_user["_id"]}, {"$set": found_user})
-
-    user_ids_to_cleanup = [ObjectId(u["_id"]) for u in group["users"]]
-    for user_id in user_ids_to_cleanup:
-        user_found = await get_user(str(user_id))
-        user_found["groups"] = [g for g in user_found["groups"] if g["_id"] != id]
-        await users_collection.find_one_and_update(
-            {"_id": user_id}, {"$set": user_found}
-        )
+async def delete_group(
+    id: str,
+    user: schemas.AuthSchema = Depends(JWTBearer()),
+    loader: EntityLoader = Depends(get_loader),
+):
+    _ = await loader.user(user.id, [])
+    group = await loader.group(id, ["users"])
+
+    meeting_ids = [m["_id"] for m in await meetings_collection.find({"group_id": id}, {"_id": 1}).to_list(None)]
+    pull = {"groups": {"_id": any_id(id)}}
+    if meeting_ids:
+        await meetings_collection.delete_many({"_id": {"$in": meeting_ids}})
+        pull["meetings"] = {"meeting_id": any_id(*meeting_ids)}
+
+    member_ids = [ObjectId(u["_id"]) for u in group["users"]]
+    await users_collection.update_many({"_id": {"$in": member_ids}}, {"$pull": pull})
+    await chat_messages.delete_group(db, id)
 
     delete_result = await groups_collection.delete_one({"_id": ObjectId(id)})
     if delete_result.deleted_count == 1:
@@ -974,53 +1327,53 @@ async def delete_group(id: str, user: schemas.AuthSchema = Depends(JWTBearer()))
 
 
 @app.post("/groups/{id}/leave", response_description="Leave the group as a user")
-async def leave_group(id: str, user: schemas.AuthSchema = Depends(JWTBearer())):
-    user_found = await get_user(user.id)
-    group_found = await get_group(id)
+async def leave_group(
+    id: str,
+    user: schemas.AuthSchema = Depends(JWTBearer()),
+    loader: EntityLoader = Depends(get_loader),
+):
+    user_found = await loader.user(user.id, [])
+    group_found = await loader.group(id, ["admin", "poll"])
     if ObjectId(group_found["admin"]["_id"]) == user_found["_id"]:
         raise HTTPException(status_code=400, detail="Can't leave group as the group admin")
 
-    user_found['groups'] = [
-        group_card for group_card in user_found['groups']
-        if ObjectId(group_card['_id']) != group_found['_id']
-    ]
-    group_found['users'] = [
-        user_card for user_card in group_found['users']
-        if ObjectId(user_card['_id']) != user_found['_id']
-    ]
+    await users_collection.update_one(
+        {"_id": user_found["_id"]}, {"$pull": {"groups": {"_id": any_id(id)}}}
+    )
 
-    chat = group_found.get("chat_messages")
-    cleaned_chat = []
-    if chat is not None:
-        msgs = json.loads(chat)
-        for msg in msgs:
-            if ObjectId(msg['user_id']) != user_found['_id']:
-                cleaned_chat.append(msg)
-        group_found['chat_messages'] = json.dumps(cleaned_chat)
+    group_update: dict = {"$pull": {"users": {"_id": any_id(user.id)}}}
+    await chat_messages.delete_from(db, id, user.id)
 
     poll = group_found.get("poll")
-    if poll is not None:
+    if poll is not None and poll.get("votes"):
         for opt in poll["votes"]:
-            if user.id in poll["votes"][opt]:
-                poll["votes"][opt].remove(user.id)
+            group_update["$pull"][f"poll.votes.{opt}"] = user.id
 
-    await users_collection.find_one_and_update({"_id": user_found["_id"]}, {"$set": user_found})
-    await groups_collection.find_one_and_update({"_id": group_found["_id"]}, {"$set": group_found})
+    await groups_collection.update_one({"_id": group_found["_id"]}, versions.bump(group_update))
     return "ok"
 
 
 @app.delete("/groups/{id}/poll", response_description="Delete a group poll")
-async def delete_poll(id: str, user: schemas.AuthSchema = Depends(JWTBearer())):
-    _ = await get_user(user.id)
-    _ = await get_group(id)
-    await groups_collection.find_one_and_update({"_id": ObjectId(id)}, {"$set": {"poll": None}})
+async def delete_poll(
+    id: str,
+    user: schemas.AuthSchema = Depends(JWTBearer()),
+    loader: EntityLoader = Depends(get_loader),
+):
+    _ = await loader.user(user.id, [])
+    _ = await loader.group(id, [])
+    await groups_collection.find_one_and_update({"_id": ObjectId(id)}, versions.bump({"$set": {"poll": None}}))
     return "ok"
 
 
 @app.post("/groups/{id}/poll/{option_index}", response_description="Vote on a group poll")
-async def vote_on_poll(id: str, option_index: str, user: schemas.AuthSchema = Depends(JWTBearer())):
-    _ = await get_user(user.id)
-    group_found = await get_group(id)
+async def vote_on_poll(
+    id: str,
+    option_index: str,
+    user: schemas.AuthSchema = Depends(JWTBearer()),
+    loader: EntityLoader = Depends(get_loader),
+):
+    _ = await loader.user(user.id, [])
+    group_found = await loader.group(id, ["poll"])
 
     poll = group_found["poll"]
     if "votes" not in poll or poll["votes"] is None:
@@ -1031,11 +1384,11 @@ async def vote_on_poll(id: str, option_index: str, user: schemas.AuthSchema = De
             poll["votes"][opt].remove(user.id)
     poll["votes"][option_index].append(user.id)
 
-    await groups_collection.find_one_and_update({"_id": ObjectId(id)}, {
+    await groups_collection.find_one_and_update({"_id": ObjectId(id)}, versions.bump({
         "$set": {
             "poll": poll
         }
-    })
+    }))
     return "ok"
 
 
@@ -1045,9 +1398,13 @@ async def vote_on_poll(id: str, option_index: str, user: schemas.AuthSchema = De
     response_model=schemas.GroupInviteResponse,
     response_model_by_alias=False,
 )
-async def group_invite(id: str, user: schemas.AuthSchema = Depends(JWTBearer())):
-    _ = await get_user(user.id)
-    _ = await get_group(id)
+async def group_invite(
+    id: str,
+    user: schemas.AuthSchema = Depends(JWTBearer()),
+    loader: EntityLoader = Depends(get_loader),
+):
+    _ = await loader.user(user.id, [])
+    _ = await loader.group(id, [])
 
     link = f"coordimate://coordimate.com/groups/{id}/join"
     return schemas.GroupInviteResponse(join_link=link)
@@ -1057,60 +1414,53 @@ async def group_invite(id: str, user: schemas.AuthSchema = Depends(JWTBearer()))
     "/groups/{id}/join",
     response_description="Join a group using the invite link",
 )
-async def join_group(id: str, user: schemas.AuthSchema = Depends(JWTBearer())):
-    user_found = await get_user(user.id)
-    group_found = await get_group(id)
-
-    for group_user in group_found["users"]:
-        if ObjectId(group_user["_id"]) == user_found["_id"]:
-            return {"result": "ok"}
-
-    user_card = get_user_card(user_found)
-    group_card = get_group_card(group_found)
-
-    group_found["users"].append(user_card)
-    if "groups" not in user_found:
-        user_found["groups"] = []
-    user_found["groups"].append(group_card)
-
-    if 'meetings' not in user_found:
-        user_found['meetings'] = []
-    if 'meetings' not in group_found:
-        group_found['meetings'] = []
-    for meeting in group_found['meetings']:
-        meeting_found = await meetings_collection.find_one({"_id": ObjectId(meeting["_id"])})
-        if meeting_found is None:
-            continue
+async def join_group(
+    id: str,
+    user: schemas.AuthSchema = Depends(JWTBearer()),
+    loader: EntityLoader = Depends(get_loader),
+):
+    user_found = await loader.user(user.id, ["username"])
+    group_found = await loader.group(id, ["name"])
 
-        now = datetime.datetime.now(datetime.UTC)
-        meeting_time = datetime.datetime.fromisoformat(meeting_found["start"])
-        if meeting_time + datetime.timedelta(minutes=meeting_found["length"]) < now:
-            continue
+    # The membership check and the insert are one update so concurrent joins can't add a user twice
+    join_result = await groups_collection.update_one(
+        {"_id": group_found["_id"], "users._id": {"$nin": [str(user_found["_id"]), user_found["_id"]]}},
+        versions.bump({"$push": {"users": get_user_card(user_found)}}, activity=True),
+    )
+    if join_result.modified_count == 0:
+        return {"result": "ok"}
 
-        user_found["meetings"].append(
-            {
-                "meeting_id": str(meeting["_id"]),
-                "status": models.MeetingStatus.needs_acceptance.value,
-            }
+    upcoming_meeting_ids = [
+        meeting_found["_id"]
+        async for meeting_found in meetings_collection.find(
+            {"group_id": any_id(id), "end": {"$gte": datetime.datetime.now(datetime.UTC)}}, {"_id": 1}
         )
-        meeting_found["participants"].append(
-            {
-                "user_id": str(user_found["_id"]),
-                "username": user_found["username"],
-                "status": models.MeetingStatus.needs_acceptance.value,
-            }
-        )
-        await meetings_collection.find_one_and_update(
-            {"_id": ObjectId(meeting["_id"])},
-            {"$set": meeting_found},
-            return_document=ReturnDocument.AFTER
+    ]
+
+    if upcoming_meeting_ids:
+        await meetings_collection.update_many(
+            {"_id": {"$in": upcoming_meeting_ids}, "participants.user_id": {"$ne": str(user_found["_id"])}},
+            versions.bump({
+                "$push": {
+                    "participants": {
+                        "user_id": str(user_found["_id"]),
+                        "username": user_found["username"],
+                        "status": models.MeetingStatus.needs_acceptance.value,
+                    }
+                }
+            }),
         )
 
-    await users_collection.find_one_and_update(
-        {"_id": user_found["_id"]}, {"$set": user_found}
-    )
-    await groups_collection.find_one_and_update(
-        {"_id": group_found["_id"]}, {"$set": group_found}
+    invites = [
+        {"meeting_id": str(meeting_id), "status": models.MeetingStatus.needs_acceptance.value}
+        for meeting_id in upcoming_meeting_ids
+    ]
+    await users_collection.update_one(
+        {"_id": user_found["_id"]},
+        {
+            "$addToSet": {"groups": get_group_card(group_found)},
+            "$push": {"meetings": {"$each": invites}},
+        },
     )
 
     return {"result": "ok"}
@@ -1122,13 +1472,17 @@ async def join_group(id: str, user: schemas.AuthSchema = Depends(JWTBearer())):
     response_model=schemas.TimeSlotCollection,
     response_model_by_alias=False,
 )
-async def group_schedule(id, user: schemas.AuthSchema = Depends(JWTBearer())):
-    _ = await get_user(user.id)
-    group = await get_group(id)
+async def group_schedule(
+    id,
+    user: schemas.AuthSchema = Depends(JWTBearer()),
+    loader: EntityLoader = Depends(get_loader),
+):
+    _ = await loader.user(user.id, [])
+    group = await loader.group(id, ["users"])
 
     schedule = []
     for user_card in group['users']:
-        user_found = await get_user(user_card['_id'])
+        user_found = await loader.user(user_card['_id'], ["schedule"])
         assert user_found is not None
         schedule += await time_slots_collection.find({"_id": {"$in": user_found.get("schedule", [])}}).to_list(1000)
 
@@ -1138,12 +1492,13 @@ async def group_schedule(id, user: schemas.AuthSchema = Depends(JWTBearer())):
     gsm = GroupsScheduleManager([schedule], schedule)
     group_schedule = [models.TimeSlot(**params) for params in gsm.compute_group_schedule()]
 
-    for meeting_card in group.get('meetings', []):
-        meeting = await get_meeting(meeting_card["_id"])
-        meeting_time_slot = await time_slots_collection.find_one({"_id": meeting["time_slot_id"]})
-        if meeting_time_slot is not None:
-            if (datetime.datetime.fromisoformat(meeting_time_slot['start']) >= datetime.datetime.now(datetime.UTC)):
-                group_schedule.append(meeting_time_slot)
+    upcoming_meetings = meetings_collection.find(
+        {"group_id": any_id(id), **meeting_times.start_range(datetime.datetime.now(datetime.UTC))},
+        {"time_slot_id": 1},
+    )
+    time_slot_ids = [m["time_slot_id"] async for m in upcoming_meetings if m.get("time_slot_id")]
+    if time_slot_ids:
+        group_schedule += await time_slots_collection.find({"_id": {"$in": time_slot_ids}}).to_list(None)
     return schemas.TimeSlotCollection(time_slots=group_schedule)
 
 
@@ -1155,31 +1510,117 @@ async def group_schedule(id, user: schemas.AuthSchema = Depends(JWTBearer())):
 )
 async def list_group_meetings(
     id: str,
+    response: Response,
+    start_from: Optional[datetime.datetime] = Query(None, alias="from"),
+    start_to: Optional[datetime.datetime] = Query(None, alias="to"),
+    if_none_match: Optional[str] = Header(None),
     user: schemas.AuthSchema = Depends(JWTBearer()),
+    loader: EntityLoader = Depends(get_loader),
 ):
-    _ = await get_user(user.id)
-    group = await get_group(id)
-    meetings = group.get("meetings", [])
+    _ = await loader.user(user.id, [])
+    query = {"group_id": any_id(id), **meeting_times.start_range(start_from, start_to)}
+
+    # Only the group name is shown, chat messages and new members don't change the list
+    group, meeting_versions = await asyncio.gather(
+        loader.group(id, ["name"]),
+        meetings_collection.find(query, versions.VERSION_PROJECTION).to_list(None),
+    )
+    tag = versions.etag(
+        group["name"], sorted((str(m["_id"]), versions.version(m)) for m in meeting_versions)
+    )
+    if versions.matches(if_none_match, tag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": tag})
+    response.headers["ETag"] = tag
+
+    group_card = models.GroupCardModel(_id=group["_id"], name=group["name"])
+
     response_meetings = []
-    for meeting in meetings:
-        meeting_found = await meetings_collection.find_one(
-            {"_id": ObjectId(meeting["_id"])}
+    async for meeting_found in meetings_collection.find(query, MEETING_TILE_PROJECTION).sort("start", 1):
+        meeting_tile = models.MeetingTile(
+            id=str(meeting_found["_id"]),
+            title=meeting_found["title"],
+            start=meeting_found["start"],
+            length=meeting_found["length"],
+            group=group_card,
+            status=models.MeetingStatus.accepted,
+            is_finished=meeting_found["is_finished"],
         )
-        if meeting_found is not None:
-            meeting_tile = models.MeetingTile(
-                id=str(meeting["_id"]),
-                title=meeting_found["title"],
-                start=meeting_found["start"],
-                length=meeting["length"],
-                group=models.GroupCardModel(_id=group["_id"], name=group["name"]),
-                status=models.MeetingStatus.accepted,
-                is_finished=meeting_found["is_finished"],
-            )
-            response_meetings.append(meeting_tile)
+        response_meetings.append(meeting_tile)
 
     return schemas.MeetingTileCollection(meetings=response_meetings)
 
 
+@app.get(
+    "/groups/{id}/nearby",
+    response_description="List group members near a location",
+    response_model=schemas.NearbyMemberCollection,
+)
+async def list_nearby_members(
+    id: str,
+    location: Optional[str] = Query(None, description='"lat,lon", defaults to the location of the user'),
+    radius: float = Query(5000, gt=0, description="Radius in meters"),
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    user: schemas.AuthSchema = Depends(JWTBearer()),
+    loader: EntityLoader = Depends(get_loader),
+):
+    user_found = await loader.user(user.id, ["location", "last_location"])
+    _ = await loader.group(id, [])
+    if location is not None:
+        try:
+            near = locations.parse(location)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"invalid location {location}")
+    elif (near := locations.point_of(user_found)) is None:
+        raise HTTPException(status_code=404, detail=f"user {user.id} has no location")
+
+    members = users_collection.aggregate(
+        [
+            {
+                "$geoNear": {
+                    "near": near,
+                    "key": "location",
+                    "distanceField": "distance",
+                    "maxDistance": radius,
+                    "spherical": True,
+                    "query": {"groups._id": any_id(id), "_id": {"$ne": user_found["_id"]}},
+                }
+            },
+            {"$limit": limit},
+            {"$project": {"username": 1, "distance": 1}},
+        ]
+    )
+    return schemas.NearbyMemberCollection(
+        users=[
+            schemas.NearbyMember(id=str(m["_id"]), username=m["username"], distance=m["distance"])
+            async for m in members
+        ]
+    )
+
+
+@app.get(
+    "/groups/{id}/messages",
+    response_description="List chat messages of the group, newest page first",
+    response_model=models.ChatMessageCollection,
+)
+async def list_chat_messages(
+    id: str,
+    before: Optional[str] = Query(None, description="Cursor returned by the previous page"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    user: schemas.AuthSchema = Depends(JWTBearer()),
+    loader: EntityLoader = Depends(get_loader),
+):
+    _ = await loader.user(user.id, [])
+    _ = await loader.group(id, [])
+
+    limit = limit or PAGE_SIZE
+    messages = await chat_messages.history(db, id, decode_cursor(before), limit)
+    # Pages are returned oldest first, the next one continues before the first message
+    cursor = cursors.encode(messages[0]["ts"], messages[0]["_id"]) if len(messages) == limit else None
+    return FastJSONResponse(
+        models.ChatMessageCollection(messages=chat_messages.to_json(messages), next_cursor=cursor)
+    )
+
+
 # ********** Share Schedule ***********
 
 
@@ -1189,8 +1630,11 @@ async def list_group_meetings(
     response_model=schemas.ShareScheduleResponse,
     response_model_by_alias=False,
 )
-async def share_personal_schedule(user: schemas.AuthSchema = Depends(JWTBearer())):
-    user_found = await get_user(user.id)
+async def share_personal_schedule(
+    user: schemas.AuthSchema = Depends(JWTBearer()),
+    loader: EntityLoader = Depends(get_loader),
+):
+    user_found = await loader.user(user.id, [])
     link = f"coordimate://coordimate.com/users/{user_found['_id']}/time_slots"
     return schemas.ShareScheduleResponse(schedule_link=link)
 
@@ -1201,9 +1645,13 @@ async def share_personal_schedule(user: schemas.AuthSchema = Depends(JWTBearer()
     response_model=schemas.TimeSlotCollection,
     response_model_by_alias=False,
 )
-async def list_user_time_slots(id, user: schemas.AuthSchema = Depends(JWTBearer())):
-    _ = await get_user(user.id)
-    other_user = await get_user(id)
+async def list_user_time_slots(
+    id,
+    user: schemas.AuthSchema = Depends(JWTBearer()),
+    loader: EntityLoader = Depends(get_loader),
+):
+    _ = await loader.user(user.id, [])
+    other_user = await loader.user(id, ["schedule"])
 
     schedule = await time_slots_collection.find({"_id": {"$in": other_user.get("schedule", [])}}).to_list(1000)
     for i in range(len(schedule)):
@@ -1215,32 +1663,60 @@ async def list_user_time_slots(id, user: schemas.AuthSchema = Depends(JWTBearer(
 # ********** Utils **********
 
 
-async def get_time_slot(time_slot_id: str) -> dict:
-    time_slot = await time_slots_collection.find_one({"_id": ObjectId(time_slot_id)})
-    if time_slot is None:
-        raise HTTPException(status_code=404, detail=f"time slot {time_slot_id} not found")
-    return time_slot
+def keyset_query(after: Optional[str]) -> dict:
+    """Filter for the page that follows the document with id `after`, pages are ordered by _id."""
+    if after is None:
+        return {}
+    if not ObjectId.is_valid(after):
+        raise HTTPException(status_code=400, detail=f"invalid cursor {after}")
+    return {"_id": {"$gt": ObjectId(after)}}
 
 
-async def get_user(user_id: str) -> dict:
-    user_found = await users_collection.find_one({"_id": ObjectId(user_id)})
-    if user_found is None:
-        raise HTTPException(status_code=404, detail=f"user {user_id} not found")
-    return user_found
+def decode_cursor(cursor: Optional[str]) -> cursors.Cursor | None:
+    if cursor is None:
+        return None
+    try:
+        return cursors.decode(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
-async def get_meeting(meeting_id: str) -> dict:
-    meeting_found = await meetings_collection.find_one({"_id": ObjectId(meeting_id)})
-    if meeting_found is None:
-        raise HTTPException(status_code=404, detail=f"meeting {meeting_id} not found")
-    return meeting_found
+def next_cursor(page: list[dict], limit: int) -> str | None:
+    if len(page) < limit:
+        return None
+    return str(page[-1]["_id"])
+
+
+async def stream_ndjson(cursor, model, hydrate=None):
+    """ Streams documents from a cursor as newline delimited JSON.
+        Only one batch of documents is held in memory at a time,
+        `hydrate` may fill in each batch in place before it is sent.
+    """
+    while batch := await cursor.to_list(STREAM_BATCH_SIZE):
+        if hydrate is not None:
+            await hydrate(batch)
+        yield "".join(model.model_validate(doc).model_dump_json() + "\n" for doc in batch)
 
 
-async def get_group(group_id: str) -> dict:
-    group_found = await groups_collection.find_one({"_id": ObjectId(group_id)})
-    if group_found is None:
-        raise HTTPException(status_code=404, detail=f"group {group_id} not found")
-    return group_found
+async def hydrate_participants(meetings: list[dict], loader: EntityLoader) -> dict[str, dict]:
+    """ Fills in participant usernames of all meetings with a single query.
+        Admins are loaded by the same query, the loaded users are returned by id.
+    """
+    user_ids = [p["user_id"] for meeting in meetings for p in meeting.get("participants", [])]
+    user_ids += [meeting["admin_id"] for meeting in meetings if "admin_id" in meeting]
+    users = await loader.users(user_ids, ["username"])
+
+    for meeting in meetings:
+        meeting["participants"] = [
+            models.Participant(
+                user_id=str(p["user_id"]),
+                username=users[str(p["user_id"])]["username"],
+                status=p["status"],
+            )
+            for p in meeting.get("participants", [])
+            if str(p["user_id"]) in users
+        ]
+    return users
 
 
 def get_user_card(user):
@@ -1261,40 +1737,35 @@ def get_meeting_card(meeting):
     ).model_dump(by_alias=True)
 
 
-async def meeting_in_user(user_id: str, meeting_id: str, status: str) -> dict:
-    user_found = await get_user(user_id)
-    await get_meeting(meeting_id)
-    if user_found.get("meetings") is None:
-        user_found["meetings"] = []
+async def meeting_in_user(
+    user_id: str, meeting_id: str, status: str, loader: EntityLoader
+) -> dict:
+    user_found = await loader.user(user_id, [])
+    await loader.meeting(meeting_id, [])
+    query: dict = {"_id": user_found["_id"]}
     if status == models.MeetingStatus.needs_acceptance.value:
-        user_found["meetings"].append({"meeting_id": meeting_id, "status": status})
+        update = {"$push": {"meetings": {"meeting_id": meeting_id, "status": status}}}
     else:
-        for meeting in user_found["meetings"]:
-            if meeting["meeting_id"] == meeting_id:
-                meeting["status"] = status
-                break
-    await users_collection.update_one(
-        {"_id": user_found["_id"]}, {"$set": {"meetings": user_found["meetings"]}}
-    )
+        query["meetings.meeting_id"] = any_id(meeting_id)
+        update = {"$set": {"meetings.$.status": status}}
+    await users_collection.update_one(query, update)
+    loader.forget("user", user_id)
     return user_found
 
 
-async def participant_in_meeting(user_id: str, meeting_id: str, status: str) -> dict:
-    meeting_found = await get_meeting(meeting_id)
-    await get_user(user_id)
-    if meeting_found.get("participants") is None:
-        meeting_found["participants"] = []
+async def participant_in_meeting(
+    user_id: str, meeting_id: str, status: str, loader: EntityLoader
+) -> dict:
+    meeting_found = await loader.meeting(meeting_id, [])
+    await loader.user(user_id, [])
+    query: dict = {"_id": meeting_found["_id"]}
     if status == models.MeetingStatus.needs_acceptance.value:
-        meeting_found["participants"].append({"user_id": user_id, "status": status})
+        update = {"$push": {"participants": {"user_id": user_id, "status": status}}}
     else:
-        for participant in meeting_found["participants"]:
-            if participant["user_id"] == user_id:
-                participant["status"] = status
-                break
-    await meetings_collection.update_one(
-        {"_id": meeting_found["_id"]},
-        {"$set": {"participants": meeting_found["participants"]}},
-    )
+        query["participants.user_id"] = any_id(user_id)
+        update = {"$set": {"participants.$.status": status}}
+    await meetings_collection.update_one(query, versions.bump(update))
+    loader.forget("meeting", meeting_id)
     return meeting_found
 
 
@@ -1304,34 +1775,30 @@ def check_status(status: str) -> bool:
     return True
 
 
-async def isoformat_to_timeslot(time_string: str, length: int):
-    date = datetime.datetime.fromisoformat(time_string)
-    time_slot = models.TimeSlot(day=date.weekday(), start=time_string, length=length, is_meeting=True).model_dump(by_alias=True, exclude={"id"})
-    res = await time_slots_collection.insert_one(time_slot)
-    return res.inserted_id
+def meeting_time_slot(start: datetime.datetime, length: int) -> dict:
+    return {
+        "day": start.weekday(),
+        "start": start,
+        "end": meeting_times.meeting_end(start, length),
+        "length": length,
+        "is_meeting": True,
+    }
 
 
-async def try_finish_meeting(meeting: Any):
-    """ Checks if the meeting is not yet marked as finished, but already passed.
-        Declines invitations for users who didn't accept. Marks the meeting as finished.
-    """
-    if meeting is None or meeting["is_finished"]:
-        return
+async def create_meeting_time_slot(start: datetime.datetime, length: int):
+    res = await time_slots_collection.insert_one(meeting_time_slot(start, length))
+    return res.inserted_id
 
-    now = datetime.datetime.now(datetime.UTC)
-    meeting_time = datetime.datetime.fromisoformat(meeting["start"])
-    if meeting_time + datetime.timedelta(minutes=meeting["length"]) < now:
-        await meetings_collection.find_one_and_update(
-            {"_id": meeting["_id"]},
-            {"$set": {"is_finished": True}},
-            return_document=ReturnDocument.AFTER
-        )
 
-        for participant in meeting["participants"]:
-            if participant["status"] != models.MeetingStatus.needs_acceptance.value:
-                continue
-            await meeting_in_user(participant["user_id"], meeting["_id"], models.MeetingStatus.declined.value)
-            await participant_in_meeting(participant["user_id"], meeting["_id"], models.MeetingStatus.declined.value)
+async def move_meeting_time_slot(time_slot_id, start: datetime.datetime, length: int):
+    """Updates the meeting's time slot in place, creates one for meetings that have none."""
+    if time_slot_id is not None:
+        result = await time_slots_collection.update_one(
+            {"_id": ObjectId(time_slot_id)}, {"$set": meeting_time_slot(start, length)}
+        )
+        if result.matched_count:
+            return time_slot_id
+    return await create_meeting_time_slot(start, length)
 
 
 @app.post("/upload_avatar/{avatar_id}")
@@ -1356,16 +1823,16 @@ async def create_upload_file(file: UploadFile, avatar_id: str):
     )
     await groups_collection.find_one_and_update(
         {"_id": ObjectId(avatar_id)},
-        {"$set": {
+        versions.bump({"$set": {
             "avatar_extension": file_extension
-        }}
+        }})
     )
     return {"ok": True}
 
 
 @app.get("/users/{user_id}/avatar")
-async def get_user_avatar(user_id: str):
-    user = await get_user(user_id)
+async def get_user_avatar(user_id: str, loader: EntityLoader = Depends(get_loader)):
+    user = await loader.user(user_id, ["avatar_extension"])
     if "avatar_extension" not in user or not user["avatar_extension"]:
         filepath = "avatars/user.png"
     else:
@@ -1377,8 +1844,8 @@ async def get_user_avatar(user_id: str):
 
 
 @app.get("/groups/{group_id}/avatar")
-async def get_group_avatar(group_id: str):
-    group = await get_group(group_id)
+async def get_group_avatar(group_id: str, loader: EntityLoader = Depends(get_loader)):
+    group = await loader.group(group_id, ["avatar_extension"])
     if "avatar_extension" not in group or not group["avatar_extension"]:
         filepath = "avatars/group.png"
     else:
@@ -1391,17 +1858,28 @@ async def get_group_avatar(group_id: str):
 
 @app.websocket("/websocket/{group_id}/{user_id}")
 async def websocket_endpoint(websocket: WebSocket, group_id: str, user_id: str):
-    await manager.connect(group_id, user_id, websocket)
+    if not await manager.connect(group_id, user_id, websocket):
+        return
     try:
         while True:
             data = await websocket.receive_text()
-            await manager.broadcast(group_id, data)
+            await manager.broadcast(group_id, user_id, data)
     except WebSocketDisconnect:
         manager.disconnect(group_id, user_id)
 
 
-async def create_random_coffee_meeting(user_id: str, mate_id: str, group_id: str, title: str, start: str, length: int):
-    user_found = await get_user(user_id)
+async def create_random_coffee_meeting(
+    user_id: str,
+    mate_id: str,
+    group_id: str,
+    title: str,
+    start: str,
+    length: int,
+    loader: EntityLoader,
+):
+    users = await loader.users([user_id, mate_id], ["username"])
+    if str(user_id) not in users or str(mate_id) not in users:
+        raise HTTPException(status_code=404, detail="user not found")
 
     meeting_dict = schemas.CreateMeeting(
         group_id=group_id,
@@ -1410,108 +1888,79 @@ async def create_random_coffee_meeting(user_id: str, mate_id: str, group_id: str
         start=start,
         length=length,
     ).model_dump(by_alias=True, exclude={"id"})
-    meeting_dict["admin_id"] = str(user_found["_id"])
+    meeting_dict["admin_id"] = str(user_id)
     meeting_dict["is_finished"] = False
+    meeting_dict["start"] = meeting_times.to_utc(start)
+    meeting_dict["end"] = meeting_times.meeting_end(meeting_dict["start"], length)
+    # Both participants are known up front, so the meeting is written once with them
+    meeting_dict["participants"] = [
+        {
+            "user_id": str(users[str(_id)]["_id"]),
+            "username": users[str(_id)]["username"],
+            "status": models.MeetingStatus.needs_acceptance.value,
+        }
+        for _id in [user_id, mate_id]
+    ]
     new_meeting = await meetings_collection.insert_one(meeting_dict)
-    created_meeting = await meetings_collection.find_one(
-        {"_id": new_meeting.inserted_id}
-    )
-    if created_meeting is None:
-        raise HTTPException(status_code=500, detail="Error creating a meeting")
+    meeting_dict["_id"] = new_meeting.inserted_id
 
-    created_meeting["participants"] = []
-    for _id in [user_id, mate_id]:
-        user_found = await get_user(_id)
-        if user_found.get("meetings") is None:
-            user_found["meetings"] = []
-        user_found["meetings"].append(
-            {
-                "meeting_id": str(created_meeting["_id"]),
-                "status": models.MeetingStatus.needs_acceptance.value,
-            }
-        )
-        await users_collection.update_one(
-            {"_id": user_found["_id"]}, {"$set": {"meetings": user_found["meetings"]}}
-        )
-
-        created_meeting["participants"].append(
-            {
-                "user_id": str(user_found["_id"]),
-                "username": user_found["username"],
-                "status": models.MeetingStatus.needs_acceptance.value,
+    await users_collection.update_many(
+        {"_id": {"$in": [users[str(_id)]["_id"] for _id in [user_id, mate_id]]}},
+        {
+            "$push": {
+                "meetings": {
+                    "meeting_id": str(new_meeting.inserted_id),
+                    "status": models.MeetingStatus.needs_acceptance.value,
+                }
             }
-        )
-        # notify_single_user(
-        #     user_found["fcm_token"],
-        #     "Meeting Invitation",
-        #     f"Join the meeting {created_meeting['title']} with group {group['name']}, time: {created_meeting['start']}",
-        # )
-
-    await meetings_collection.update_one(
-        {"_id": created_meeting["_id"]},
-        {"$set": {"participants": created_meeting["participants"]}},
+        },
     )
-    return created_meeting
+    for _id in [user_id, mate_id]:
+        loader.forget("user", _id)
+    return meeting_dict
 
 
 @app.delete("/groups/{group_id}/users/{user_id}")
-async def kick_user(group_id: str, user_id: str):
-    user_found = await get_user(user_id)
-    group_found = await get_group(group_id)
-
-    group_meeting_ids = set()
-    for meeting_card in group_found.get("meetings", []):
-        group_meeting_ids.add(meeting_card["_id"])
-        meeting = await get_meeting(meeting_card["_id"])
-
-        new_meeting_participants = []
-        for participant in meeting.get("participants", []):
-            assert type(ObjectId(participant["user_id"])) == type(ObjectId(user_id))
-            if ObjectId(participant["user_id"]) != ObjectId(user_id):
-                new_meeting_participants.append(participant)
-        meeting["participants"] = new_meeting_participants
-
-        await meetings_collection.find_one_and_update(
-            {"_id": ObjectId(meeting["_id"])},
-            {"$set": meeting},
-            return_document=ReturnDocument.AFTER
+async def kick_user(
+    group_id: str,
+    user_id: str,
+    loader: EntityLoader = Depends(get_loader),
+):
+    user_found = await loader.user(user_id, [])
+    group_found = await loader.group(group_id, ["meetings"])
+
+    group_meeting_ids = [m["_id"] for m in group_found.get("meetings", [])]
+    if group_meeting_ids:
+        await meetings_collection.update_many(
+            {"_id": {"$in": [ObjectId(m) for m in group_meeting_ids]}},
+            versions.bump({"$pull": {"participants": {"user_id": any_id(user_id)}}}),
         )
 
-    new_user_meetings = []
-    for meeting in user_found.get("meetings", []):
-        if group_meeting_ids:
-            assert type(meeting["meeting_id"]) == type(group_meeting_ids.copy().pop())
-        if meeting["meeting_id"] not in group_meeting_ids:
-            new_user_meetings.append(meeting)
-    user_found["meetings"] = new_user_meetings
-
-    new_user_groups = []
-    for group in user_found.get("groups", []):
-        if not cmp_ids(group["_id"], group_id):
-            new_user_groups.append(group)
-    user_found["groups"] = new_user_groups
-
-    await users_collection.find_one_and_update(
-        {"_id": user_found["_id"]}, {"$set": user_found}
+    await users_collection.update_one(
+        {"_id": user_found["_id"]},
+        {
+            "$pull": {
+                "meetings": {"meeting_id": any_id(*group_meeting_ids)},
+                "groups": {"_id": any_id(group_id)},
+            }
+        },
     )
-
-    new_group_users = []
-    for user in group_found.get("users", []):
-        if not cmp_ids(user["_id"], user_id):
-            new_group_users.append(user)
-    group_found["users"] = new_group_users
-
-    await groups_collection.find_one_and_update(
-        {"_id": group_found["_id"]}, {"$set": group_found}
+    await groups_collection.update_one(
+        {"_id": group_found["_id"]}, versions.bump({"$pull": {"users": {"_id": any_id(user_id)}}})
     )
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
-async def random_coffee(user_id: str):
+def schedule_random_coffee(user_id):
+    """Starts matching in the background, the logged in user sees the result on their next meetings fetch."""
+    random_coffee_jobs.submit(str(user_id), lambda: random_coffee(str(user_id), get_loader()))
+
+
+async def random_coffee(user_id: str, loader: EntityLoader):
     INVITE_COOLDOWN_DAYS = 3
     INVITE_IN_COUNT_DAYS = 2
 
-    user_found = await get_user(user_id)
+    user_found = await loader.user(user_id, ["username", "groups", "random_coffee"])
     if not user_found.get('random_coffee') or not user_found['random_coffee']['is_enabled']:
         print(f"Random coffee disabled for user {user_id}")
         return
@@ -1534,11 +1983,11 @@ async def random_coffee(user_id: str):
     mate_intervals = []
 
     for group in user_found["groups"]:
-        group_found = await get_group(group["_id"])
+        group_found = await loader.group(group["_id"], ["users"])
         mate_cards = [user for user in group_found["users"] if (user['username'] != user_found['username'])]
 
         for mate_card in mate_cards:
-            mate = await get_user(mate_card["_id"])
+            mate = await loader.user(mate_card["_id"], ["random_coffee", "fcm_token"])
             if not mate.get('random_coffee') or not mate['random_coffee']['is_enabled']:
                 continue
 
@@ -1578,13 +2027,14 @@ async def random_coffee(user_id: str):
         mate_groups[index]["_id"],
         "RandomCoffee event",
         start_date.isoformat(),
-        length
+        length,
+        loader,
     )
 
     # The user that just logged in will see the created event on their meeting page,
     # but the invited user may not be in the app, so we send a push
-    notify_single_user(
-        random_mate['fcm_token'],
+    notifications.notify(
+        random_mate.get('fcm_token'),
         'RandomCoffee event!',
         f"You matched with {user_found['username']}",
         link=f"coordimate://coordimate.com/meetings/{meeting['_id']}/join"
@@ -1,6 +1,7 @@
-from typing import List, Optional
+from typing import List, Literal, Optional
 
-from pydantic import BaseModel, EmailStr
+from bson import ObjectId
+from pydantic import BaseModel, ConfigDict, EmailStr, Field, field_validator, model_validator
 
 import models
 
@@ -24,6 +25,9 @@ class NotificationsSchema(BaseModel):
 
 
 class AuthSchema(BaseModel):
+    # Instances are shared between requests by the verified-token cache
+    model_config = ConfigDict(frozen=True)
+
     id: str
     is_access_token: bool
 
@@ -81,6 +85,7 @@ class ShareScheduleResponse(BaseModel):
 
 class MeetingCollection(BaseModel):
     meetings: List[models.MeetingModel]
+    next_cursor: Optional[str] = None
 
 
 class CreateMeeting(BaseModel):
@@ -127,7 +132,7 @@ class ParticipantSchema(BaseModel):
 class MeetingDetails(BaseModel):
     id: str
     title: str
-    start: str
+    start: models.IsoDatetime
     length: int
     is_finished: bool
     description: str
@@ -166,6 +171,50 @@ class AgendaPointCollection(BaseModel):
 class CreateAgendaPoint(BaseModel):
     text: str
     level: int
+    position: Optional[int] = Field(None, ge=0, description="Index to insert at, appended when missing")
+
+
+class UpdateAgendaPoint(BaseModel):
+    text: Optional[str] = None
+    level: Optional[int] = None
+
+
+class AgendaOp(BaseModel):
+    op: Literal["insert", "update", "move", "delete"]
+    id: Optional[str] = Field(None, description="Agenda point to update, move or delete")
+    text: Optional[str] = None
+    level: Optional[int] = None
+    position: Optional[int] = Field(None, ge=0, description="Index to insert or move to, the end when missing")
+
+    @model_validator(mode="after")
+    def check_fields(self):
+        if self.op == "insert" and (self.text is None or self.level is None):
+            raise ValueError("insert needs text and level")
+        if self.op != "insert" and self.id is None:
+            raise ValueError(f"{self.op} needs the id of an agenda point")
+        return self
+
+
+class UpdateAgenda(BaseModel):
+    """Either replaces the whole agenda or applies the ops in order, atomically."""
+    agenda: Optional[List[models.AgendaPoint]] = None
+    ops: Optional[List[AgendaOp]] = None
+
+    @field_validator("agenda")
+    @classmethod
+    def check_point_ids(cls, agenda):
+        # Points keep their ids, which must be ones agenda points can have
+        for point in agenda or []:
+            if point.id is not None and not ObjectId.is_valid(point.id):
+                raise ValueError(f"invalid agenda point id {point.id}")
+        return agenda
+
+    @model_validator(mode="after")
+    def check_fields(self):
+        # An empty body must not be taken as an empty agenda
+        if (self.agenda is None) == (self.ops is None):
+            raise ValueError("pass exactly one of agenda and ops")
+        return self
 
 
 # ********** Groups **********
@@ -178,3 +227,13 @@ class CreateGroupSchema(BaseModel):
 
 class GroupInviteResponse(BaseModel):
     join_link: str
+
+
+class NearbyMember(BaseModel):
+    id: str
+    username: str
+    distance: float = Field(..., description="Distance in meters")
+
+
+class NearbyMemberCollection(BaseModel):
+    users: List[NearbyMember]
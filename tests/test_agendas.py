@@ -0,0 +1,54 @@
+import pytest
+from bson import ObjectId
+
+import agendas
+import schemas
+
+
+def texts(agenda):
+    return [p["text"] for p in agenda]
+
+
+def test_ops_are_applied_in_order():
+    a, b = agendas.new_point("a", 0), agendas.new_point("b", 0)
+    agenda = agendas.apply_ops(
+        [a, b],
+        [
+            {"op": "insert", "text": "c", "level": 1, "position": 0},
+            {"op": "move", "id": str(b["_id"]), "position": 0},
+            {"op": "update", "id": str(a["_id"]), "text": "A", "level": None},
+            {"op": "insert", "text": "d", "level": 0},
+        ],
+    )
+    assert texts(agenda) == ["b", "c", "A", "d"]
+    assert agenda[2] == {"_id": a["_id"], "text": "A", "level": 0}
+
+
+def test_failed_ops_leave_the_agenda_unchanged():
+    agenda = [agendas.new_point("a", 0)]
+    with pytest.raises(KeyError):
+        agendas.apply_ops(agenda, [{"op": "delete", "id": str(agenda[0]["_id"])}, {"op": "delete", "id": str(ObjectId())}])
+    assert texts(agenda) == ["a"]
+
+
+def test_with_ids_keeps_existing_ids():
+    point = agendas.new_point("a", 0)
+    legacy = {"text": "b", "level": 0}
+    agenda = agendas.with_ids([{**point, "_id": str(point["_id"])}, legacy])
+    assert agenda[0]["_id"] == point["_id"]
+    assert isinstance(agenda[1]["_id"], ObjectId)
+
+
+@pytest.mark.parametrize("body", [{}, {"agenda": None}, {"agenda": [], "ops": []}])
+def test_agenda_update_needs_exactly_one_of_agenda_and_ops(body):
+    with pytest.raises(ValueError):
+        schemas.UpdateAgenda.model_validate(body)
+    assert schemas.UpdateAgenda.model_validate({"agenda": []}).agenda == []
+
+
+def test_replaced_agenda_points_need_valid_ids():
+    point = {"text": "a", "level": 0}
+    with pytest.raises(ValueError):
+        schemas.UpdateAgenda.model_validate({"agenda": [{**point, "_id": "not-an-id"}]})
+    agenda = schemas.UpdateAgenda.model_validate({"agenda": [point, {**point, "_id": str(ObjectId())}]}).agenda
+    assert [p.id is None for p in agenda] == [True, False]
@@ -0,0 +1,55 @@
+import asyncio
+
+from background_jobs import DebouncedJobs
+
+
+def test_jobs_for_the_same_key_are_debounced():
+    jobs = DebouncedJobs("test_jobs", interval=60)
+    calls = []
+
+    async def job(key):
+        calls.append(key)
+
+    async def main():
+        assert jobs.submit("a", lambda: job("a"))
+        assert not jobs.submit("a", lambda: job("a"))
+        assert jobs.submit("b", lambda: job("b"))
+        await asyncio.gather(*jobs.tasks)
+
+    asyncio.run(main())
+
+    assert calls == ["a", "b"]
+    assert jobs.running == set()
+
+
+def test_job_runs_again_after_interval():
+    jobs = DebouncedJobs("test_jobs", interval=0)
+    calls = []
+
+    async def job():
+        calls.append(1)
+
+    async def main():
+        jobs.submit("a", job)
+        await asyncio.gather(*jobs.tasks)
+        jobs.submit("a", job)
+        await asyncio.gather(*jobs.tasks)
+
+    asyncio.run(main())
+
+    assert len(calls) == 2
+
+
+def test_failing_job_does_not_block_the_key():
+    jobs = DebouncedJobs("test_jobs", interval=0)
+
+    async def job():
+        raise ValueError("boom")
+
+    async def main():
+        jobs.submit("a", job)
+        await asyncio.gather(*jobs.tasks)
+
+    asyncio.run(main())
+
+    assert jobs.running == set()
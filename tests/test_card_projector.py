@@ -0,0 +1,106 @@
+import asyncio
+import datetime
+from unittest import mock
+
+from bson import ObjectId, Timestamp
+
+import card_projector
+
+
+def fake_db():
+    db = mock.MagicMock()
+    for name in ["users", "groups", "meetings"]:
+        getattr(db, name).update_many = mock.AsyncMock()
+    return db
+
+
+def test_username_is_copied_into_groups_and_meetings():
+    db = fake_db()
+    user_id = ObjectId()
+    event = {"ns": {"coll": "users"}, "fullDocument": {"_id": user_id, "username": "new_name"}}
+
+    asyncio.run(card_projector.apply(db, event))
+
+    updates = [call.args[1]["$set"] for call in db.groups.update_many.call_args_list]
+    assert updates == [{"users.$[card].username": "new_name"}, {"admin.username": "new_name"}]
+    query, update = db.meetings.update_many.call_args.args
+    assert update["$set"] == {"participants.$[participant].username": "new_name"}
+    assert update["$inc"] == {"version": 1}
+    assert query == {"participants.user_id": {"$in": [str(user_id), user_id]}}
+
+
+def test_meeting_card_keeps_the_iso_start():
+    db = fake_db()
+    start = datetime.datetime(2024, 5, 1, 10, 30)
+    event = {
+        "ns": {"coll": "meetings"},
+        "fullDocument": {"_id": ObjectId(), "title": "t", "start": start, "length": 30},
+    }
+
+    asyncio.run(card_projector.apply(db, event))
+
+    update = db.groups.update_many.call_args.args[1]["$set"]
+    assert update["meetings.$[card].start"] == "2024-05-01T10:30:00+00:00"
+    assert update["meetings.$[card].title"] == "t"
+
+
+def test_projecting_twice_writes_the_same_state():
+    db = fake_db()
+    event = {"ns": {"coll": "groups"}, "fullDocument": {"_id": ObjectId(), "name": "g"}}
+
+    asyncio.run(card_projector.apply(db, event))
+    asyncio.run(card_projector.apply(db, event))
+
+    first, second = db.users.update_many.call_args_list
+    assert first == second
+
+
+def test_deleted_documents_are_skipped():
+    db = fake_db()
+    asyncio.run(card_projector.apply(db, {"ns": {"coll": "groups"}, "fullDocument": None}))
+    db.users.update_many.assert_not_called()
+
+
+def test_lag():
+    now = datetime.datetime(2024, 5, 1, 10, 0, 2, tzinfo=datetime.UTC)
+    wall_time = datetime.datetime(2024, 5, 1, 10, 0, 1, 500000)
+    assert card_projector.lag({"wallTime": wall_time}, now) == 0.5
+
+    cluster_time = Timestamp(datetime.datetime(2024, 5, 1, 10, 0, 0, tzinfo=datetime.UTC), 1)
+    assert card_projector.lag({"clusterTime": cluster_time}, now) == 2
+
+
+class FakeStream:
+    def __init__(self, events):
+        self.events = events
+        self.resume_token = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def __aiter__(self):
+        for i, event in enumerate(self.events):
+            self.resume_token = {"_data": str(i)}
+            yield event
+
+
+def test_malformed_documents_do_not_block_the_stream():
+    db = fake_db()
+    db.projector_state.find_one = mock.AsyncMock(return_value=None)
+    db.projector_state.update_one = mock.AsyncMock()
+    now = datetime.datetime.now(datetime.UTC)
+    events = [
+        # A meeting without a length
+        {"ns": {"coll": "meetings"}, "fullDocument": {"_id": ObjectId(), "title": "t", "start": now}, "wallTime": now},
+        {"ns": {"coll": "groups"}, "fullDocument": {"_id": ObjectId(), "name": "g"}, "wallTime": now},
+    ]
+    db.watch = mock.Mock(return_value=FakeStream(events))
+
+    asyncio.run(card_projector.follow(db))
+
+    assert db.users.update_many.call_args.args[1] == {"$set": {"groups.$[card].name": "g"}}
+    tokens = [call.args[1]["$set"]["resume_token"] for call in db.projector_state.update_one.call_args_list]
+    assert tokens == [{"_data": "0"}, {"_data": "1"}]
@@ -0,0 +1,96 @@
+import json
+import asyncio
+import datetime
+from unittest import mock
+
+from bson import ObjectId
+
+import chat_messages
+
+
+def fake_db(group=None):
+    db = mock.MagicMock()
+    db.groups.find_one = mock.AsyncMock(return_value=group)
+    db.groups.update_one = mock.AsyncMock()
+    db.chat_messages.bulk_write = mock.AsyncMock()
+    db.chat_messages.insert_one = mock.AsyncMock()
+    return db
+
+
+def test_messages_keep_the_json_the_clients_sent():
+    messages = [{"message": '{"user_id": "a", "text": "hi"}'}, {"message": '{"text": "ho"}'}]
+    assert chat_messages.to_json(messages) == [{"user_id": "a", "text": "hi"}, {"text": "ho"}]
+    assert chat_messages.to_array(messages) == '[{"user_id": "a", "text": "hi"},{"text": "ho"}]'
+    assert chat_messages.to_array([]) == "[]"
+
+
+def test_legacy_history_is_migrated_in_order():
+    group_id = ObjectId()
+    db = fake_db({"_id": group_id, "chat_messages": '[{"user_id": "a", "text": "1"}, {"text": "2"}]'})
+
+    asyncio.run(chat_messages.migrate(db, str(group_id)))
+
+    updates = db.chat_messages.bulk_write.call_args.args[0]
+    assert [u._filter for u in updates] == [
+        {"group_id": group_id, "legacy_index": 0},
+        {"group_id": group_id, "legacy_index": 1},
+    ]
+    first, second = [u._doc["$setOnInsert"] for u in updates]
+    assert first["user_id"] == "a" and second["user_id"] is None
+    assert first["ts"] < second["ts"]
+    assert db.groups.update_one.call_args.args[1]["$unset"] == {"chat_messages": ""}
+
+    # Groups are only looked up once per process
+    asyncio.run(chat_messages.migrate(db, str(group_id)))
+    assert db.groups.find_one.call_count == 1
+
+
+def test_append_is_one_insert_and_marks_group_activity():
+    group_id = ObjectId()
+    db = fake_db()
+
+    message = asyncio.run(chat_messages.append(db, str(group_id), "user", '{"text": "hi"}'))
+
+    db.chat_messages.insert_one.assert_called_once_with(message)
+    assert message["group_id"] == group_id
+    assert message["ts"] <= datetime.datetime.now(datetime.UTC)
+    query, update = db.groups.update_one.call_args.args
+    assert query == {"_id": group_id}
+    assert update["$currentDate"] == {"last_activity": True}
+
+
+def test_history_pages_continue_after_messages_sharing_a_timestamp():
+    group_id = ObjectId()
+    db = fake_db()
+    find = db.chat_messages.find.return_value.sort.return_value.limit.return_value
+    find.to_list = mock.AsyncMock(return_value=[{"message": "2"}, {"message": "1"}])
+    chat_messages._migrated.add(str(group_id))
+    before = (datetime.datetime(2030, 1, 1, tzinfo=datetime.UTC), ObjectId())
+
+    messages = asyncio.run(chat_messages.history(db, str(group_id), before, 2))
+
+    assert messages == [{"message": "1"}, {"message": "2"}]
+    query = db.chat_messages.find.call_args.args[0]
+    assert query["$and"][1] == {"$or": [{"ts": {"$lt": before[0]}}, {"ts": before[0], "_id": {"$lt": before[1]}}]}
+
+
+def test_messages_that_are_not_json_are_stored_as_json_strings():
+    db = fake_db()
+
+    message = asyncio.run(chat_messages.append(db, str(ObjectId()), "user", "plain text"))
+
+    assert message["message"] == '"plain text"'
+    # Stored before appends were checked
+    legacy = [{"message": "plain text"}, {"message": '{"text": "hi"}'}]
+    assert chat_messages.to_json(legacy) == ["plain text", {"text": "hi"}]
+    assert json.loads(chat_messages.to_array(legacy)) == ["plain text", {"text": "hi"}]
+
+
+def test_invalid_legacy_history_is_kept_as_one_message():
+    group_id = ObjectId()
+    db = fake_db({"_id": group_id, "chat_messages": '[{"text": "hi"},plain text]'})
+
+    asyncio.run(chat_messages.migrate(db, str(group_id)))
+
+    [update] = db.chat_messages.bulk_write.call_args.args[0]
+    assert json.loads(update._doc["$setOnInsert"]["message"]) == '[{"text": "hi"},plain text]'
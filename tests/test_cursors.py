@@ -0,0 +1,28 @@
+import datetime
+
+import pytest
+from bson import ObjectId
+
+import cursors
+
+
+def test_cursors_round_trip_at_millisecond_precision():
+    _id = ObjectId()
+    time = datetime.datetime(2030, 1, 1, 10, 0, 0, 123000)
+
+    assert cursors.decode(cursors.encode(time, _id)) == (time.replace(tzinfo=datetime.UTC), _id)
+    assert cursors.decode(cursors.encode(None, _id)) == (None, _id)
+
+
+@pytest.mark.parametrize("cursor", ["", "not a cursor", cursors.encode(None, "x" * 24)])
+def test_invalid_cursors_are_rejected(cursor):
+    with pytest.raises(ValueError):
+        cursors.decode(cursor)
+
+
+def test_next_page_continues_after_ties():
+    time, _id = datetime.datetime(2030, 1, 1, tzinfo=datetime.UTC), ObjectId()
+
+    assert cursors.older("ts", (time, _id)) == {"$or": [{"ts": {"$lt": time}}, {"ts": time, "_id": {"$lt": _id}}]}
+    assert cursors.older("ts", (time, _id), nullable=True)["$or"][-1] == {"ts": None}
+    assert cursors.older("ts", (None, _id)) == {"ts": None, "_id": {"$lt": _id}}
@@ -0,0 +1,33 @@
+import json
+
+from bson import ObjectId
+
+import models
+from fast_json import FastJSONResponse
+
+
+def test_model_is_serialized_without_aliases():
+    group_id = ObjectId()
+    group = models.GroupModel.model_validate(
+        {
+            "_id": group_id,
+            "admin": {"_id": "1", "username": "admin"},
+            "name": "name",
+            "description": "description",
+            "chat_messages": "[]",
+        }
+    )
+
+    body = json.loads(FastJSONResponse(group).body)
+
+    assert body["id"] == str(group_id)
+    assert body["admin"] == {"id": "1", "username": "admin"}
+    assert body == json.loads(group.model_dump_json())
+
+
+def test_plain_data_with_object_ids():
+    object_id = ObjectId()
+    response = FastJSONResponse({"ids": [object_id]})
+
+    assert response.media_type == "application/json"
+    assert json.loads(response.body) == {"ids": [str(object_id)]}
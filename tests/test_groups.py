@@ -1,4 +1,11 @@
-from conftest import auth_header, post, patch, delete, get
+import json
+import datetime
+
+import pytest
+import requests
+from websockets.sync.client import connect
+
+from conftest import BASE_URL, auth_header, post, patch, delete, get
 import crud_utils
 
 
@@ -52,3 +59,113 @@ def test_group_schedule_recomputed_when_new_user_joins():
     delete(f"/groups/{group['id']}", auth_header(admin_token))
     crud_utils.delete_user(user_id, user_token)
     crud_utils.delete_user(admin_id, admin_token)
+
+
+def test_nearby_members():
+    admin_id, admin_token = crud_utils.create_user(0)
+    near_id, near_token = crud_utils.create_user(1)
+    far_id, far_token = crud_utils.create_user(2)
+    group = crud_utils.create_group(admin_token)
+    for token in [near_token, far_token]:
+        post(f"/groups/{group['id']}/join", {}, auth_header(token), 200)
+
+    patch(f"/users/{admin_id}", {"last_location": "52.5200,13.4050"}, auth_header(admin_token))
+    patch(f"/users/{near_id}", {"last_location": "52.5210,13.4050"}, auth_header(near_token))
+    patch(f"/users/{far_id}", {"last_location": "48.1351,11.5820"}, auth_header(far_token))
+    patch(f"/users/{far_id}", {"last_location": "not a location"}, auth_header(far_token), 422)
+
+    nearby = get(f"/groups/{group['id']}/nearby?radius=1000", auth_header(admin_token))["users"]
+    assert [u["id"] for u in nearby] == [near_id]
+    assert 100 < nearby[0]["distance"] < 120
+
+    nearby = get(f"/groups/{group['id']}/nearby?location=48.1351,11.5820&radius=1000000", auth_header(admin_token))
+    assert [u["id"] for u in nearby["users"]] == [far_id, near_id]
+
+    crud_utils.delete_group(admin_token, group)
+    for u_id, token in [(admin_id, admin_token), (near_id, near_token), (far_id, far_token)]:
+        crud_utils.delete_user(u_id, token)
+
+
+def test_group_reads_do_not_grow_with_members():
+    admin_id, admin_token = crud_utils.create_user(0)
+    group = crud_utils.create_group(admin_token)
+    for _ in range(3):
+        crud_utils.create_meeting(admin_token, group)
+
+    def reads():
+        resp = requests.get(BASE_URL + f"/groups/{group['id']}", headers=auth_header(admin_token))
+        assert resp.status_code == 200
+        if "x-db-reads" not in resp.headers:
+            pytest.skip("server runs without DEBUG_DB_STATS=1")
+        return int(resp.headers["x-db-reads"])
+
+    alone = reads()
+    members = [crud_utils.create_user(i) for i in range(1, 6)]
+    for _, token in members:
+        post(f"/groups/{group['id']}/join", {}, auth_header(token), 200)
+    assert reads() == alone
+
+    shown = get(f"/groups/{group['id']}?chat=false", auth_header(admin_token))
+    assert len(shown["users"]) == 6
+    assert len(shown["meetings"]) == 3
+    assert shown["chat_messages"] == "[]"
+
+    crud_utils.delete_group(admin_token, group)
+    for u_id, token in [(admin_id, admin_token)] + members:
+        crud_utils.delete_user(u_id, token)
+
+
+def test_group_cards_are_paginated_without_content():
+    admin_id, admin_token = crud_utils.create_user(0)
+    member_id, member_token = crud_utils.create_user(1)
+    groups = [crud_utils.create_group(admin_token) for _ in range(3)]
+    post(f"/groups/{groups[1]['id']}/join", {}, auth_header(member_token), 200)
+
+    first = get("/groups/cards?limit=2", auth_header(admin_token))
+    rest = get(f"/groups/cards?limit=2&after={first['next_cursor']}", auth_header(admin_token))
+    assert rest["next_cursor"] is None
+    cards = first["groups"] + rest["groups"]
+    # Newest activity first, joining counts as activity
+    assert [c["id"] for c in cards] == [groups[1]["id"], groups[2]["id"], groups[0]["id"]]
+    assert [c["member_count"] for c in cards] == [2, 1, 1]
+    assert set(cards[0]) == {"id", "name", "avatar_extension", "member_count", "last_activity"}
+    activity = [datetime.datetime.fromisoformat(c["last_activity"]) for c in cards]
+    assert activity == sorted(activity, reverse=True)
+
+    for group in groups:
+        crud_utils.delete_group(admin_token, group)
+    crud_utils.delete_user(admin_id, admin_token)
+    crud_utils.delete_user(member_id, member_token)
+
+
+def test_chat_messages_are_read_from_their_own_collection():
+    admin_id, admin_token = crud_utils.create_user(0)
+    group = crud_utils.create_group(admin_token)
+
+    page = get(f"/groups/{group['id']}/messages?limit=10", auth_header(admin_token))
+    assert page == {"messages": [], "next_cursor": None}
+    shown = get(f"/groups/{group['id']}", auth_header(admin_token))
+    assert shown["chat_messages"] == "[]"
+
+    crud_utils.delete_group(admin_token, group)
+    get(f"/groups/{group['id']}/messages", auth_header(admin_token), 404)
+    crud_utils.delete_user(admin_id, admin_token)
+
+
+def test_chat_messages_that_are_not_json_are_returned_as_strings():
+    admin_id, admin_token = crud_utils.create_user(0)
+    group = crud_utils.create_group(admin_token)
+
+    with connect(BASE_URL.replace("http", "ws", 1) + f"/websocket/{group['id']}/{admin_id}") as ws:
+        ws.recv()
+        for message in ["plain text", '{"text": "hi"}']:
+            ws.send(message)
+            ws.recv()
+
+    page = get(f"/groups/{group['id']}/messages", auth_header(admin_token))
+    assert page["messages"] == ["plain text", {"text": "hi"}]
+    shown = get(f"/groups/{group['id']}", auth_header(admin_token))
+    assert json.loads(shown["chat_messages"]) == ["plain text", {"text": "hi"}]
+
+    crud_utils.delete_group(admin_token, group)
+    crud_utils.delete_user(admin_id, admin_token)
@@ -0,0 +1,32 @@
+import pytest
+
+import locations
+
+
+def point(lat, lon):
+    return {"type": "Point", "coordinates": [lon, lat]}
+
+
+def test_parse_orders_coordinates_as_geojson():
+    assert locations.parse("52.5, 13.4") == point(52.5, 13.4)
+    for invalid in ["91,0", "0,181", "52.5", "north,east"]:
+        with pytest.raises(ValueError):
+            locations.parse(invalid)
+
+
+def test_centroid_across_the_antimeridian():
+    lat, lon = locations.centroid([point(0, 179), point(0, -179)])
+    assert lat == pytest.approx(0, abs=1e-9)
+    assert abs(lon) == pytest.approx(180)
+
+
+def test_centroid_of_nearby_points():
+    lat, lon = locations.centroid([point(52.5, 13.4), point(52.5, 13.4)])
+    assert (lat, lon) == (pytest.approx(52.5), pytest.approx(13.4))
+
+
+def test_point_of_falls_back_to_the_string():
+    assert locations.point_of({"last_location": "1,2"}) == point(1, 2)
+    assert locations.point_of({"last_location": "invalid"}) is None
+    assert locations.point_of({"location": point(3, 4), "last_location": "1,2"}) == point(3, 4)
+    assert locations.point_of({}) is None
@@ -0,0 +1,42 @@
+import asyncio
+import datetime
+from unittest import mock
+
+from bson import ObjectId
+
+import meeting_times
+
+
+def test_unconvertible_legacy_starts_do_not_fail_range_queries():
+    start_to = datetime.datetime(2030, 1, 1, tzinfo=datetime.UTC)
+    modern, legacy = meeting_times.start_range(None, start_to)["$or"]
+
+    assert modern == {"start": {"$lt": start_to}}
+    assert legacy["invalid_start"] == {"$exists": False}
+    converted = {"$convert": {"input": "$start", "to": "date", "onError": None}}
+    assert legacy["$expr"]["$and"] == [{"$ne": [converted, None]}, {"$lt": [converted, start_to]}]
+
+
+def test_open_range_matches_everything():
+    assert meeting_times.start_range() == {}
+
+
+def test_starts_are_truncated_to_stored_precision():
+    start = meeting_times.to_bson("2030-01-01T10:00:00.123456+02:00")
+    assert start == datetime.datetime(2030, 1, 1, 8, 0, 0, 123000, tzinfo=datetime.UTC)
+
+
+def test_backfill_bumps_meeting_versions_only():
+    db = mock.MagicMock()
+    for collection, name in [(db.meetings, "meetings"), (db.time_slots, "time_slots")]:
+        collection.name = name
+        find = collection.find.return_value.limit.return_value
+        find.to_list = mock.AsyncMock(side_effect=[[{"_id": ObjectId(), "start": "2030-01-01T10:00:00"}], []])
+        collection.bulk_write = mock.AsyncMock()
+
+    asyncio.run(meeting_times.backfill(db))
+
+    [meeting_update] = db.meetings.bulk_write.call_args.args[0]
+    [slot_update] = db.time_slots.bulk_write.call_args.args[0]
+    assert meeting_update._doc["$inc"] == {"version": 1}
+    assert "$inc" not in slot_update._doc
@@ -1,9 +1,19 @@
+import os
+import time
 import datetime
+from urllib.parse import quote
 
-from conftest import auth_header, post, patch, delete, get
+import pytest
+import requests
+
+from conftest import BASE_URL, auth_header, post, patch, delete, get
 import crud_utils
 
 
+# Meetings are finished in the background, at most this long after they end
+FINISH_TIMEOUT = int(os.environ.get("MEETING_FINISHER_INTERVAL", 60)) + 5
+
+
 def test_meeting_is_not_finished_on_creation(token):
     group_data = {"name": "n", "description": "d"}
     group = post("/groups", group_data, auth_header(token))
@@ -61,6 +71,11 @@ def test_meeting_update_shows_up_in_user_and_groups():
         if k in ("is_finished", "group_id", "description"):
             continue
         assert k in updated_meeting
+        if k == "start":
+            # Stored as a UTC datetime, times without an offset are taken as UTC
+            sent = datetime.datetime.fromisoformat(meeting_data[k]).replace(tzinfo=datetime.UTC)
+            assert abs(datetime.datetime.fromisoformat(updated_meeting[k]) - sent) < datetime.timedelta(milliseconds=1)
+            continue
         assert updated_meeting[k] == meeting_data[k]
 
     group_data = {"name": "name", "description": "description"}
@@ -102,19 +117,24 @@ def test_meeting_is_set_to_finished_once_passed():
             else:
                 assert p["status"] == "needs acceptance"
 
-        get("/meetings", auth_header(alice_token))
-
-        alice_meeting = get(f"/meetings/{meeting['id']}", auth_header(alice_token))
-        bob_meeting = get(f"/meetings/{meeting['id']}", auth_header(bob_token))
-
-        assert alice_meeting["is_finished"]
-        assert bob_meeting["is_finished"]
+        # The meeting finisher runs periodically, wait until it picked the meeting up
+        deadline = time.monotonic() + FINISH_TIMEOUT
+        while True:
+            alice_meeting = get(f"/meetings/{meeting['id']}", auth_header(alice_token))
+            bob_meeting = get(f"/meetings/{meeting['id']}", auth_header(bob_token))
+            if alice_meeting["is_finished"] and bob_meeting["is_finished"]:
+                break
+            assert time.monotonic() < deadline, "meeting was not finished in time"
+            time.sleep(1)
 
         for p in bob_meeting['participants']:
             if p["user_id"] == alice_id:
                 assert p["status"] == "accepted"
             else:
                 assert p["status"] == "declined"
+
+        bob_invites = get("/meetings?status=declined", auth_header(bob_token))["meetings"]
+        assert meeting["id"] in [m["id"] for m in bob_invites]
     except Exception as e:
         print(e)
         thrown = e
@@ -128,3 +148,270 @@ def test_meeting_is_set_to_finished_once_passed():
     if thrown:
         raise thrown
 
+
+def db_reads(uri, token) -> int:
+    resp = requests.get(BASE_URL + uri, headers=auth_header(token))
+    assert resp.status_code == 200
+    if "x-db-reads" not in resp.headers:
+        pytest.skip("server runs without DEBUG_DB_STATS=1")
+    return int(resp.headers["x-db-reads"])
+
+
+def test_meeting_reads_do_not_grow_with_participants(token):
+    # Joining members are invited to the upcoming meetings of the group, so the small one is elsewhere
+    small_group = crud_utils.create_group(token)
+    small = crud_utils.create_meeting(token, small_group)
+
+    group = crud_utils.create_group(token)
+    members = [crud_utils.create_user(i) for i in range(5)]
+    for _, m_token in members:
+        post(f"/groups/{group['id']}/join", {}, auth_header(m_token), 200)
+    large = crud_utils.create_meeting(token, group)
+    assert len(get(f"/meetings/{small['id']}", auth_header(token))["participants"]) == 1
+    assert len(get(f"/meetings/{large['id']}", auth_header(token))["participants"]) == 6
+
+    for uri in ["/meetings/{}", "/meetings/{}/details"]:
+        assert db_reads(uri.format(large["id"]), token) == db_reads(uri.format(small["id"]), token)
+
+    crud_utils.delete_meeting(token, small)
+    crud_utils.delete_meeting(token, large)
+    crud_utils.delete_group(token, small_group)
+    crud_utils.delete_group(token, group)
+    for m_id, m_token in members:
+        crud_utils.delete_user(m_id, m_token)
+
+
+def test_user_meetings_are_filtered(token):
+    group = crud_utils.create_group(token)
+    now = datetime.datetime.now(datetime.UTC)
+    meetings = [
+        post(
+            "/meetings",
+            {
+                "group_id": group["id"],
+                "title": f"meeting in {days} days",
+                "start": (now + datetime.timedelta(days=days)).isoformat(),
+                "description": "test meeting",
+            },
+            auth_header(token),
+        )
+        for days in [1, 2, 3]
+    ]
+
+    def titles(query):
+        tiles = get(f"/meetings?{query}", auth_header(token))["meetings"]
+        return [m["title"] for m in tiles if m["group"]["id"] == group["id"]]
+
+    from_ = quote((now + datetime.timedelta(days=1, hours=12)).isoformat())
+    to = quote((now + datetime.timedelta(days=2, hours=12)).isoformat())
+    assert titles(f"from={from_}") == ["meeting in 2 days", "meeting in 3 days"]
+    assert titles(f"from={from_}&to={to}") == ["meeting in 2 days"]
+    assert titles(f"from={from_}&limit=1") == ["meeting in 2 days"]
+    assert titles("status=accepted") == [m["title"] for m in meetings]
+    assert titles(f"status={quote('needs acceptance')}") == []
+    assert titles("upcoming=true") == [m["title"] for m in meetings]
+
+    group_meetings = get(f"/groups/{group['id']}/meetings?from={from_}&to={to}", auth_header(token))
+    assert [m["title"] for m in group_meetings["meetings"]] == ["meeting in 2 days"]
+
+    for meeting in meetings:
+        crud_utils.delete_meeting(token, meeting)
+    crud_utils.delete_group(token, group)
+
+
+def db_round_trips(token, group) -> int:
+    meeting_data = {
+        "group_id": group["id"],
+        "title": "test meeting",
+        "start": datetime.datetime.now().isoformat(),
+        "description": "test meeting",
+    }
+    resp = requests.post(BASE_URL + "/meetings", json=meeting_data, headers=auth_header(token))
+    assert resp.status_code == 201
+    crud_utils.delete_meeting(token, resp.json())
+    if "x-db-reads" not in resp.headers:
+        pytest.skip("server runs without DEBUG_DB_STATS=1")
+    return int(resp.headers["x-db-reads"]) + int(resp.headers["x-db-writes"])
+
+
+def test_meeting_creation_round_trips_do_not_grow_with_members(token):
+    group = crud_utils.create_group(token)
+    alone = db_round_trips(token, group)
+
+    members = [crud_utils.create_user(i) for i in range(5)]
+    for _, m_token in members:
+        post(f"/groups/{group['id']}/join", {}, auth_header(m_token), 200)
+
+    assert db_round_trips(token, group) == alone
+
+    crud_utils.delete_group(token, group)
+    for m_id, m_token in members:
+        crud_utils.delete_user(m_id, m_token)
+
+
+def db_stats_of_patch(token, meeting, body) -> tuple[int, int]:
+    resp = requests.patch(BASE_URL + f"/meetings/{meeting['id']}", json=body, headers=auth_header(token))
+    assert resp.status_code == 200
+    if "x-db-reads" not in resp.headers:
+        pytest.skip("server runs without DEBUG_DB_STATS=1")
+    return int(resp.headers["x-db-reads"]), int(resp.headers["x-db-writes"])
+
+
+def test_meeting_update_round_trips_do_not_grow_with_participants(token):
+    # Joining members are invited to the upcoming meetings of the group, so the small one is elsewhere
+    small_group = crud_utils.create_group(token)
+    small = crud_utils.create_meeting(token, small_group)
+    members = [crud_utils.create_user(i) for i in range(6)]
+    post(f"/groups/{small_group['id']}/join", {}, auth_header(members[0][1]), 200)
+
+    group = crud_utils.create_group(token)
+    for _, m_token in members[1:]:
+        post(f"/groups/{group['id']}/join", {}, auth_header(m_token), 200)
+    large = crud_utils.create_meeting(token, group)
+    assert len(get(f"/meetings/{small['id']}", auth_header(token))["participants"]) == 2
+    assert len(get(f"/meetings/{large['id']}", auth_header(token))["participants"]) == 6
+
+    # Nobody answered, finishing declines 1 and 5 invitations at once
+    assert db_stats_of_patch(token, large, {"is_finished": True}) == db_stats_of_patch(
+        token, small, {"is_finished": True}
+    )
+    for m_id, m_token in members[1:]:
+        invites = get(f"/users/{m_id}", auth_header(m_token))["meetings"]
+        assert [i["status"] for i in invites if i["meeting_id"] == large["id"]] == ["declined"]
+
+    crud_utils.delete_meeting(token, small)
+    crud_utils.delete_meeting(token, large)
+    crud_utils.delete_group(token, small_group)
+    crud_utils.delete_group(token, group)
+    for m_id, m_token in members:
+        crud_utils.delete_user(m_id, m_token)
+
+
+def test_meeting_time_slot_is_only_moved_when_the_time_changes(token):
+    group = crud_utils.create_group(token)
+    meeting = crud_utils.create_meeting(token, group)
+
+    _, title_writes = db_stats_of_patch(token, meeting, {"title": "renamed"})
+    start = datetime.datetime.now(datetime.UTC) + datetime.timedelta(days=1)
+    _, start_writes = db_stats_of_patch(token, meeting, {"start": start.isoformat()})
+    assert start_writes == title_writes + 1
+
+    updated = get(f"/meetings/{meeting['id']}", auth_header(token))
+    assert updated["time_slot_id"] == meeting["time_slot_id"]
+    assert datetime.datetime.fromisoformat(updated["start"]) == start.replace(
+        microsecond=start.microsecond // 1000 * 1000
+    )
+
+    # Re-sending the same start with sub-millisecond precision is not a move
+    _, resent_writes = db_stats_of_patch(token, meeting, {"title": "renamed", "start": start.isoformat()})
+    assert resent_writes == title_writes
+
+    crud_utils.delete_meeting(token, meeting)
+    crud_utils.delete_group(token, group)
+
+
+def test_unchanged_meetings_and_groups_are_not_modified(token):
+    group = crud_utils.create_group(token)
+    meeting = crud_utils.create_meeting(token, group)
+    uris = [f"/meetings/{meeting['id']}/details", f"/groups/{group['id']}", f"/groups/{group['id']}/meetings"]
+
+    def conditional_get(uri, tag):
+        return requests.get(BASE_URL + uri, headers={**auth_header(token), "If-None-Match": tag})
+
+    tags = {}
+    for uri in uris:
+        resp = requests.get(BASE_URL + uri, headers=auth_header(token))
+        assert resp.status_code == 200
+        tags[uri] = resp.headers["etag"]
+
+        not_modified = conditional_get(uri, tags[uri])
+        assert not_modified.status_code == 304
+        assert not_modified.content == b""
+        if "x-db-reads" in resp.headers:
+            assert int(not_modified.headers["x-db-reads"]) < int(resp.headers["x-db-reads"])
+
+    patch(f"/meetings/{meeting['id']}", {"summary": "changed"}, auth_header(token))
+    assert conditional_get(uris[0], tags[uris[0]]).status_code == 200
+
+    def changed():
+        modified = [conditional_get(uri, tags[uri]).status_code == 200 for uri in uris]
+        for uri in uris:
+            tags[uri] = requests.get(BASE_URL + uri, headers=auth_header(token)).headers["etag"]
+        return modified
+
+    changed()
+    # Only the group itself shows its description
+    patch(f"/groups/{group['id']}", {"description": "changed"}, auth_header(token))
+    assert changed() == [False, True, False]
+    patch(f"/groups/{group['id']}", {"name": "renamed"}, auth_header(token))
+    assert changed() == [True, True, True]
+
+    # Users have no version, their names are part of the tags
+    member_id, member_token = crud_utils.create_user(0)
+    post(f"/groups/{group['id']}/join", {}, auth_header(member_token), 200)
+    changed()
+    patch(f"/users/{member_id}", {"username": "renamed_member"}, auth_header(member_token))
+    assert changed() == [True, True, False]
+
+    crud_utils.delete_meeting(token, meeting)
+    crud_utils.delete_group(token, group)
+    crud_utils.delete_user(member_id, member_token)
+
+
+def test_agenda_points_are_addressed_by_id(token):
+    group = crud_utils.create_group(token)
+    meeting = crud_utils.create_meeting(token, group)
+    uri = f"/meetings/{meeting['id']}/agenda"
+
+    second = post(uri, {"text": "second", "level": 0}, auth_header(token))
+    first = post(uri, {"text": "first", "level": 0, "position": 0}, auth_header(token))
+    assert patch(f"{uri}/{second['id']}", {"level": 1}, auth_header(token)) == {**second, "level": 1}
+
+    ops = [
+        {"op": "insert", "text": "third", "level": 0},
+        {"op": "move", "id": first["id"], "position": 2},
+        {"op": "delete", "id": second["id"]},
+    ]
+    agenda = patch(uri, {"ops": ops}, auth_header(token))["agenda"]
+    assert [p["text"] for p in agenda] == ["third", "first"]
+    assert get(uri, auth_header(token))["agenda"] == agenda
+
+    patch(uri, {"ops": [{"op": "delete", "id": second["id"]}]}, auth_header(token), 404)
+    delete(f"{uri}/{first['id']}", auth_header(token))
+    delete(f"{uri}/{first['id']}", auth_header(token), 404)
+    assert [p["text"] for p in get(uri, auth_header(token))["agenda"]] == ["third"]
+
+    # Neither an empty body nor a malformed point id touches the agenda
+    patch(uri, {}, auth_header(token), 422)
+    patch(uri, {"agenda": None}, auth_header(token), 422)
+    patch(uri, {"agenda": [{"_id": "not-an-id", "text": "x", "level": 0}]}, auth_header(token), 422)
+    patch(f"{uri}/not-an-id", {"level": 1}, auth_header(token), 404)
+    delete(f"{uri}/not-an-id", auth_header(token), 404)
+    assert [p["text"] for p in get(uri, auth_header(token))["agenda"]] == ["third"]
+
+    crud_utils.delete_meeting(token, meeting)
+    crud_utils.delete_group(token, group)
+
+
+def test_meeting_deletion_round_trips_do_not_grow_with_participants(token):
+    group = crud_utils.create_group(token)
+
+    def deletion_round_trips():
+        meeting = crud_utils.create_meeting(token, group)
+        resp = requests.delete(BASE_URL + f"/meetings/{meeting['id']}", headers=auth_header(token))
+        assert resp.status_code == 204
+        if "x-db-reads" not in resp.headers:
+            pytest.skip("server runs without DEBUG_DB_STATS=1")
+        return int(resp.headers["x-db-reads"]) + int(resp.headers["x-db-writes"])
+
+    alone = deletion_round_trips()
+    members = [crud_utils.create_user(i) for i in range(5)]
+    for _, m_token in members:
+        post(f"/groups/{group['id']}/join", {}, auth_header(m_token), 200)
+    assert deletion_round_trips() == alone
+
+    for m_id, m_token in members:
+        assert get(f"/users/{m_id}", auth_header(m_token))["meetings"] == []
+        crud_utils.delete_user(m_id, m_token)
+    assert get(f"/groups/{group['id']}", auth_header(token))["meetings"] == []
+    crud_utils.delete_group(token, group)
@@ -23,6 +23,7 @@ mock_meeting = {
     "is_finished": False,
     "title": "Mocked meeting",
     "start": datetime.datetime.now().isoformat(),
+    "time_slot_id": None,
     "participants": [],
     "agenda": []
 }
@@ -38,14 +39,11 @@ mock_user = {
 }
 
 
-async def mock_get_user(id):
-    if id == str(mock_user["_id"]):
-        return mock_user
-    else:
-        raise ValueError("Unknown meeting_id passed to mock_get_user")
+async def mock_get_users(ids, fields=None):
+    return {str(id): mock_user for id in ids if str(id) == str(mock_user["_id"])}
 
 
-async def mock_get_meeting(id):
+async def mock_get_meeting(id, fields=None):
     if id == str(nonexistent_meeting_id):
         raise HTTPException(status_code=404, detail=f"meeting {id} not found")
     elif id == str(mock_meeting["_id"]):
@@ -67,7 +65,8 @@ async def mock_meetings_collection_find_one(query):
 def test_existing_meeting_is_shown():
     with (
         patch("routes.meetings_collection.find_one", side_effect=mock_meetings_collection_find_one),
-        patch("routes.get_meeting", side_effect=mock_get_meeting),
+        patch("routes.EntityLoader.meeting", side_effect=mock_get_meeting),
+        patch("routes.EntityLoader.users", side_effect=mock_get_users),
     ):
         response = client.get(f"/meetings/{mock_meeting['_id']}")
     assert response.status_code == 200
@@ -78,8 +77,8 @@ def test_meeting_paricipants_are_returned():
     mock_meeting["participants"].append({"user_id": mock_user["_id"], "status": "needs acceptance"})
     with (
         patch("routes.meetings_collection.find_one", side_effect=mock_meetings_collection_find_one),
-        patch("routes.get_meeting", side_effect=mock_get_meeting),
-        patch("routes.get_user", side_effect=mock_get_user)
+        patch("routes.EntityLoader.meeting", side_effect=mock_get_meeting),
+        patch("routes.EntityLoader.users", side_effect=mock_get_users),
     ):
         response = client.get(f"/meetings/{mock_meeting['_id']}")
     assert response.status_code == 200
@@ -93,6 +92,10 @@ def test_meeting_paricipants_are_returned():
     mock_meeting["participants"].pop()
 
 
+def test_metrics_need_authentication():
+    assert client.get("/metrics").status_code == 403
+
+
 mock_certificate.stop()
 mock_firebase_app.stop()
 
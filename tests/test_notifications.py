@@ -0,0 +1,91 @@
+import asyncio
+
+from firebase_admin import exceptions
+
+from notifications import NO_FCM_TOKEN, FakeTransport, NotificationDispatcher
+
+
+class FlakyTransport(FakeTransport):
+    """Fails every message once with a retryable error."""
+
+    def __init__(self):
+        super().__init__()
+        self.failed = set()
+
+    async def send(self, messages):
+        errors = []
+        for message in messages:
+            if message.token in self.failed:
+                self.sent.append(message)
+                errors.append(None)
+            else:
+                self.failed.add(message.token)
+                errors.append(exceptions.UnavailableError("unavailable"))
+        return errors
+
+    def retryable(self, error):
+        return isinstance(error, exceptions.UnavailableError)
+
+
+def dispatch(dispatcher, tokens, wait=0.1):
+    async def main():
+        dispatcher.start()
+        for token in tokens:
+            dispatcher.notify(token, "title", "body")
+        await asyncio.sleep(wait)
+        await dispatcher.stop()
+
+    asyncio.run(main())
+
+
+def test_queued_notifications_are_sent_in_batches():
+    transport = FakeTransport()
+    dispatcher = NotificationDispatcher(transport, workers=1, max_queue=100, max_retries=0)
+
+    dispatch(dispatcher, [f"token{i}" for i in range(10)])
+
+    assert [m.token for m in transport.sent] == [f"token{i}" for i in range(10)]
+
+
+def test_users_without_token_are_skipped():
+    transport = FakeTransport()
+    dispatcher = NotificationDispatcher(transport, workers=1, max_queue=100, max_retries=0)
+
+    dispatch(dispatcher, [None, "no_token", "token"])
+
+    assert [m.token for m in transport.sent] == ["token"]
+
+
+def test_registered_users_without_device_are_skipped():
+    transport = FakeTransport()
+    dispatcher = NotificationDispatcher(transport, workers=1, max_queue=100, max_retries=0)
+
+    assert not dispatcher.notify(NO_FCM_TOKEN, "title", "body")
+    dispatch(dispatcher, [NO_FCM_TOKEN])
+
+    assert list(transport.sent) == []
+
+
+def test_full_queue_drops_notifications():
+    dispatcher = NotificationDispatcher(FakeTransport(), workers=1, max_queue=1, max_retries=0)
+
+    assert dispatcher.notify("a", "title", "body")
+    assert not dispatcher.notify("b", "title", "body")
+
+
+def test_retryable_failures_are_retried():
+    transport = FlakyTransport()
+    dispatcher = NotificationDispatcher(transport, workers=1, max_queue=100, max_retries=1, retry_delay=0.01)
+
+    dispatch(dispatcher, ["a", "b"])
+
+    assert sorted(m.token for m in transport.sent) == ["a", "b"]
+
+
+def test_retries_are_bounded():
+    transport = FlakyTransport()
+    dispatcher = NotificationDispatcher(transport, workers=1, max_queue=100, max_retries=0, retry_delay=0.01)
+
+    dispatch(dispatcher, ["a"])
+
+    assert list(transport.sent) == []
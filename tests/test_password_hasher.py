@@ -0,0 +1,81 @@
+import time
+import asyncio
+import threading
+from unittest import mock
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+mock_certificate = mock.patch('firebase_admin.credentials.Certificate').start()
+mock_firebase_app = mock.patch('firebase_admin.initialize_app').start()
+
+from routes import app
+from password_hasher import PasswordHasher
+
+
+client = TestClient(app)
+
+
+class SlowHasher(PasswordHasher):
+    """Hashes block until `release` is set."""
+
+    def __init__(self, max_workers, max_queue):
+        super().__init__(max_workers, max_queue)
+        self.release = threading.Event()
+
+    async def hash(self, password):
+        await self._run("hash", self.release.wait)
+        return b"hashed"
+
+    async def check(self, password, hashed):
+        return await self._run("check", self.release.wait)
+
+
+def fill(hasher: SlowHasher, count: int) -> threading.Thread:
+    """Starts `count` hashes in another thread and waits until all are in flight."""
+
+    async def hashes():
+        await asyncio.gather(*[hasher.hash("password") for _ in range(count)])
+
+    thread = threading.Thread(target=asyncio.run, args=(hashes(),))
+    thread.start()
+    deadline = time.monotonic() + 5
+    while hasher.in_flight < count:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    return thread
+
+
+def test_full_queue_is_rejected():
+    hasher = SlowHasher(max_workers=1, max_queue=1)
+    thread = fill(hasher, 2)
+
+    with pytest.raises(HTTPException) as rejected:
+        asyncio.run(hasher.check("password", b"hashed"))
+    assert rejected.value.status_code == 503
+
+    hasher.release.set()
+    thread.join()
+    assert hasher.in_flight == 0
+
+
+def test_register_answers_503_while_hashing_is_saturated():
+    hasher = SlowHasher(max_workers=2, max_queue=1)
+    thread = fill(hasher, 3)
+    user = {"username": "user", "email": "busy@mail.com", "password": "password", "auth_type": "email"}
+
+    with (
+        mock.patch("routes.password_hasher", hasher),
+        mock.patch("routes.users_collection.find_one", mock.AsyncMock(return_value=None)),
+    ):
+        response = client.post("/register", json=user)
+    assert response.status_code == 503
+
+    hasher.release.set()
+    thread.join()
+    assert hasher.in_flight == 0
+
+
+mock_certificate.stop()
+mock_firebase_app.stop()
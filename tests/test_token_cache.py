@@ -0,0 +1,39 @@
+import time
+
+import auth
+import schemas
+
+
+def test_decoded_token_is_cached():
+    token = auth.createToken(id="cached", valid_time=100, is_access_token=True)
+    hits = auth.token_cache.hits
+
+    first = auth.decodeJWT(token)
+    second = auth.decodeJWT(token)
+
+    assert isinstance(first, schemas.AuthSchema)
+    assert first.id == "cached"
+    assert first is second
+    assert auth.token_cache.hits == hits + 1
+
+
+def test_expired_entries_are_dropped():
+    cache = auth.VerifiedTokenCache(max_size=10)
+    decoded = schemas.AuthSchema(id="expired", is_access_token=True)
+    cache.put("token", time.time() - 1, decoded)
+
+    assert cache.get("token") is None
+    assert len(cache.entries) == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = auth.VerifiedTokenCache(max_size=2)
+    decoded = schemas.AuthSchema(id="user", is_access_token=True)
+    cache.put("a", time.time() + 100, decoded)
+    cache.put("b", time.time() + 100, decoded)
+    cache.get("a")
+    cache.put("c", time.time() + 100, decoded)
+
+    assert cache.get("a") is decoded
+    assert cache.get("b") is None
+    assert cache.get("c") is decoded
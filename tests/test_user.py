@@ -1,9 +1,15 @@
+import time
+
 import pytest
+import requests
 
-from conftest import auth_header, post, get, patch, delete
+from conftest import BASE_URL, auth_header, post, get, patch, delete
 import crud_utils
 
 
+PROJECTION_TIMEOUT = 5
+
+
 def test_username_updates_shows_in_groups_and_meetings(token):
     u_id, u_token = crud_utils.create_user(0)
     group = crud_utils.create_group(u_token)
@@ -11,12 +17,20 @@ def test_username_updates_shows_in_groups_and_meetings(token):
 
     patch(f"/users/{u_id}", {"username": "new_name"}, auth_header(u_token))
 
-    group = get(f"/groups/{group['id']}", auth_header(u_token))
-    meeting = get(f"/meetings/{meeting['id']}", auth_header(u_token))
-
-    assert "new_name" in [p["username"] for p in meeting["participants"]]
-    assert "new_name" in [u["username"] for u in group["users"]]
-    assert "new_name" == group["admin"]["username"]
+    # Cards are updated by the card projector shortly after the write
+    deadline = time.monotonic() + PROJECTION_TIMEOUT
+    while True:
+        group = get(f"/groups/{group['id']}", auth_header(u_token))
+        meeting = get(f"/meetings/{meeting['id']}", auth_header(u_token))
+        try:
+            assert "new_name" in [p["username"] for p in meeting["participants"]]
+            assert "new_name" in [u["username"] for u in group["users"]]
+            assert "new_name" == group["admin"]["username"]
+            break
+        except AssertionError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
 
     crud_utils.delete_meeting(token, meeting)
     crud_utils.delete_group(token, group)
@@ -70,3 +84,46 @@ def test_user_not_in_meetings_or_groups_after_deletion(token):
 
     crud_utils.delete_meeting(token, meeting)
     crud_utils.delete_group(token, group)
+
+
+def test_users_are_paginated_by_cursor(token):
+    ids = [crud_utils.create_user(i) for i in range(3)]
+
+    seen = []
+    page = get("/users?limit=1")
+    while page["next_cursor"] is not None:
+        assert len(page["users"]) == 1
+        seen += [u["id"] for u in page["users"]]
+        page = get(f"/users?limit=1&after={page['next_cursor']}")
+    seen += [u["id"] for u in page["users"]]
+
+    assert len(seen) == len(set(seen))
+    for u_id, _ in ids:
+        assert u_id in seen
+
+    for u_id, u_token in ids:
+        crud_utils.delete_user(u_id, u_token)
+
+
+def test_user_deletion_writes_do_not_grow_with_history(token):
+    u_id, u_token = crud_utils.create_user(0)
+    groups = [crud_utils.create_group(token) for _ in range(3)]
+    meetings = []
+    for group in groups:
+        post(f"/groups/{group['id']}/join", {}, auth_header(u_token), 200)
+        meetings.append(crud_utils.create_meeting(token, group))
+
+    resp = requests.delete(BASE_URL + f"/users/{u_id}", headers=auth_header(u_token))
+    assert resp.status_code == 204
+    if "x-db-writes" not in resp.headers:
+        pytest.skip("server runs without DEBUG_DB_STATS=1")
+
+    assert int(resp.headers["x-db-writes"]) == 3
+    for group in groups:
+        group = get(f"/groups/{group['id']}", auth_header(token))
+        assert u_id not in [u["id"] for u in group["users"]]
+
+    for meeting in meetings:
+        crud_utils.delete_meeting(token, meeting)
+    for group in groups:
+        crud_utils.delete_group(token, group)
@@ -0,0 +1,74 @@
+import pytest
+import requests
+
+from conftest import BASE_URL, auth_header, post
+import crud_utils
+
+
+def bytes_written(resp) -> int:
+    if "x-db-bytes-written" not in resp.headers:
+        pytest.skip("server runs without DEBUG_DB_STATS=1")
+    return int(resp.headers["x-db-bytes-written"])
+
+
+def test_enable_notifications_does_not_rewrite_user(token):
+    u_id, u_token = crud_utils.create_user(0)
+    body = {"fcm_token": "token"}
+    before = bytes_written(
+        requests.post(BASE_URL + "/enable_notifications", json=body, headers=auth_header(u_token))
+    )
+
+    groups = [crud_utils.create_group(u_token) for _ in range(5)]
+    after = bytes_written(
+        requests.post(BASE_URL + "/enable_notifications", json=body, headers=auth_header(u_token))
+    )
+
+    assert after == before
+
+    for group in groups:
+        crud_utils.delete_group(u_token, group)
+    crud_utils.delete_user(u_id, u_token)
+
+
+def test_join_group_writes_do_not_grow_with_members(token):
+    group = crud_utils.create_group(token)
+
+    u_id, u_token = crud_utils.create_user(0)
+    first = bytes_written(
+        requests.post(BASE_URL + f"/groups/{group['id']}/join", headers=auth_header(u_token))
+    )
+
+    members = [crud_utils.create_user(i) for i in range(1, 6)]
+    for _, m_token in members:
+        post(f"/groups/{group['id']}/join", {}, auth_header(m_token), 200)
+
+    v_id, v_token = crud_utils.create_user(6)
+    last = bytes_written(
+        requests.post(BASE_URL + f"/groups/{group['id']}/join", headers=auth_header(v_token))
+    )
+
+    assert last == first
+
+    crud_utils.delete_group(token, group)
+    for m_id, m_token in members + [(u_id, u_token), (v_id, v_token)]:
+        crud_utils.delete_user(m_id, m_token)
+
+
+def test_invite_answer_writes_do_not_grow_with_meetings(token):
+    group = crud_utils.create_group(token)
+    first_meeting = crud_utils.create_meeting(token, group)
+
+    def answer(meeting):
+        return bytes_written(
+            requests.patch(
+                BASE_URL + f"/invites/{meeting['id']}", json={"status": "accepted"}, headers=auth_header(token)
+            )
+        )
+
+    first = answer(first_meeting)
+    meetings = [crud_utils.create_meeting(token, group) for _ in range(5)]
+    assert answer(meetings[-1]) == first
+
+    for meeting in [first_meeting] + meetings:
+        crud_utils.delete_meeting(token, meeting)
+    crud_utils.delete_group(token, group)
@@ -0,0 +1,39 @@
+""" Document versions for conditional reads.
+
+    Meetings and groups carry a `version` counter that every update bumps with
+    `bump`, documents written before it existed count as version 0. Read
+    endpoints build an ETag from the versions of everything the response shows,
+    and answer 304 when it matches the client's If-None-Match header.
+"""
+import hashlib
+from typing import Optional
+
+
+VERSION_PROJECTION = {"version": 1}
+
+
+def bump(update: dict, activity: bool = False) -> dict:
+    """ Adds the version increment to an update document.
+        `activity` also sets a group's `last_activity` to the server time, for
+        writes members notice: chat messages, new meetings and members.
+    """
+    bumped = {**update, "$inc": {**update.get("$inc", {}), "version": 1}}
+    if activity:
+        bumped["$currentDate"] = {**update.get("$currentDate", {}), "last_activity": True}
+    return bumped
+
+
+def version(document: dict) -> int:
+    return document.get("version", 0)
+
+
+def etag(*parts) -> str:
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=8).hexdigest()
+    return f'"{digest}"'
+
+
+def matches(if_none_match: Optional[str], tag: str) -> bool:
+    if if_none_match is None:
+        return False
+    tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+    return "*" in tags or tag in tags
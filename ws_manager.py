@@ -3,9 +3,11 @@ import os
 from bson import ObjectId
 import motor.motor_asyncio
 from collections import defaultdict
-from fastapi import WebSocket
+from fastapi import WebSocket, status
 from dotenv import load_dotenv
 
+import chat_messages
+
 
 load_dotenv()
 client = motor.motor_asyncio.AsyncIOMotorClient(os.environ["MONGODB_URL"])
@@ -17,10 +19,14 @@ class ConnectionManager:
     def __init__(self):
         self.active_connections: dict[str, dict[str, WebSocket]] = defaultdict(dict)
 
-    async def connect(self, group_id: str, user_id: str, websocket: WebSocket):
+    async def connect(self, group_id: str, user_id: str, websocket: WebSocket) -> bool:
+        if await groups_collection.find_one({"_id": ObjectId(group_id)}, {"_id": 1}) is None:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return False
         await websocket.accept()
         self.active_connections[group_id][user_id] = websocket
         await websocket.send_text('{}')
+        return True
 
     def disconnect(self, group_id: str, user_id: str):
         try:
@@ -28,21 +34,9 @@ class ConnectionManager:
         except:
             pass
 
-    async def broadcast(self, group_id: str, message: str):
-        group_found = await groups_collection.find_one({"_id": ObjectId(group_id)})
-        if group_found is None:
-            return
-
-        msgs = group_found.get('chat_messages', None)
-        if not msgs or msgs == '[]':
-            msgs = f"[{message}]"
-        else:
-            msgs = f"{msgs[:-1]},{message}]"
-
-        await groups_collection.find_one_and_update(
-            {"_id": ObjectId(group_id)},
-            {"$set": {"chat_messages": msgs}},
-        )
+    async def broadcast(self, group_id: str, user_id: str, message: str):
+        stored = await chat_messages.append(db, group_id, user_id, message)
 
+        # Members see the message as it is read back from the history
         for connection in self.active_connections[group_id].values():
-            await connection.send_text(message)
+            await connection.send_text(stored["message"])